@@ -0,0 +1,346 @@
+import os
+import sys
+import csv
+import json
+import time
+import glob
+import random
+import argparse
+import tempfile
+import multiprocessing as mp
+from datetime import date, timedelta
+
+# Reports over the attendance archive (attendance/YYYY-MM-DD.csv).
+#
+# Each day file is read line by line in a worker process and reduced to one
+# row per person: presence intervals (Entry -> Exit pairs), total hours,
+# first in / last out and anomalies. Day files are processed in parallel and
+# their results consumed in date order, so only one day per worker is in
+# memory at a time; weekly rows are built on the fly from the ordered days.
+#
+# Anomalies:
+#   entry_without_exit  an Entry still open at the end of the day
+#   exit_without_entry  an Exit while the person was not in
+#   double_entry        an Entry while already in (the first one is kept)
+#   auto_exit           an Exit written by the system (on close), not seen
+#
+# Lines that cannot be parsed are skipped and reported on stderr.
+#
+# Output formats: csv, json (an array of row objects), npz (one NumPy array
+# per column) and parquet (needs pyarrow).
+
+_mp = mp.get_context("spawn")
+
+DAY_COLUMNS = ["date", "name", "first_in", "last_out", "hours", "intervals", "anomalies"]
+WEEK_COLUMNS = ["week", "name", "days_present", "hours", "earliest_in", "latest_out", "anomalies"]
+FORMATS = ("csv", "json", "npz", "parquet")
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+def _seconds(time_str):
+    h, m, s = time_str.split(":")
+    return int(h) * 3600 + int(m) * 60 + int(s)
+
+def _clock(seconds):
+    return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
+
+class _Person:
+    __slots__ = ("first_in", "last_out", "open_since", "intervals", "anomalies")
+
+    def __init__(self):
+        self.first_in = None
+        self.last_out = None
+        self.open_since = None
+        self.intervals = []
+        self.anomalies = []
+
+def summarize_day(path):
+    """Reduce one day file to (date, rows, malformed lines); rows are dicts with DAY_COLUMNS"""
+    day = os.path.splitext(os.path.basename(path))[0]
+    people = {}
+    malformed = 0
+
+    with open(path, newline="") as f:
+        reader = csv.reader(f)
+        next(reader, None)  # header
+        for row in reader:
+            try:
+                _, time_str, name, action, confidence = row[:5]
+                t = _seconds(time_str)
+                confidence = float(confidence)
+            except ValueError:
+                malformed += 1
+                continue
+            person = people.get(name)
+            if person is None:
+                person = people[name] = _Person()
+
+            if action == "Entry":
+                if person.open_since is not None:
+                    person.anomalies.append(f"double_entry@{time_str}")
+                    continue
+                person.open_since = t
+                if person.first_in is None:
+                    person.first_in = t
+            elif action == "Exit":
+                if person.open_since is None:
+                    person.anomalies.append(f"exit_without_entry@{time_str}")
+                    continue
+                if confidence == 0:
+                    person.anomalies.append(f"auto_exit@{time_str}")
+                person.intervals.append((person.open_since, t))
+                person.open_since = None
+                person.last_out = t
+            else:
+                malformed += 1
+
+    rows = []
+    for name in sorted(people):
+        person = people[name]
+        if person.open_since is not None:
+            person.anomalies.append(f"entry_without_exit@{_clock(person.open_since)}")
+        total = sum(end - start for start, end in person.intervals)
+        rows.append({
+            "date": day,
+            "name": name,
+            "first_in": _clock(person.first_in) if person.first_in is not None else "",
+            "last_out": _clock(person.last_out) if person.last_out is not None else "",
+            "hours": round(total / 3600.0, 3),
+            "intervals": ";".join(f"{_clock(a)}-{_clock(b)}" for a, b in person.intervals),
+            "anomalies": ";".join(person.anomalies),
+        })
+    return day, rows, malformed
+
+def day_files(archive="attendance", start=None, end=None):
+    """Day files in date order, optionally limited to [start, end]"""
+    paths = []
+    for path in sorted(glob.glob(os.path.join(archive, "*.csv"))):
+        day = os.path.splitext(os.path.basename(path))[0]
+        try:
+            date.fromisoformat(day)
+        except ValueError:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+        paths.append(path)
+    return paths
+
+def day_rows(paths, workers=None):
+    """Yield per-person day rows in date order, summarizing files in parallel"""
+    workers = workers or os.cpu_count() or 1
+    pool = None
+    if workers <= 1 or len(paths) < 2:
+        results = map(summarize_day, paths)
+    else:
+        pool = _mp.Pool(workers)
+        results = pool.imap(summarize_day, paths, chunksize=8)
+    try:
+        for day, rows, malformed in results:
+            if malformed:
+                print(f"[WARNING] {day}: skipped {malformed} malformed lines", file=sys.stderr)
+            yield from rows
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+def week_rows(rows):
+    """Fold ordered day rows into per-person ISO-week rows"""
+    current_week = None
+    weeks = {}
+
+    def flush():
+        for name in sorted(weeks):
+            yield weeks[name]
+
+    for row in rows:
+        year, week, _ = date.fromisoformat(row["date"]).isocalendar()
+        label = f"{year}-W{week:02d}"
+        if label != current_week:
+            yield from flush()
+            weeks = {}
+            current_week = label
+
+        agg = weeks.get(row["name"])
+        if agg is None:
+            agg = weeks[row["name"]] = {"week": label, "name": row["name"], "days_present": 0,
+                                        "hours": 0.0, "earliest_in": "", "latest_out": "",
+                                        "anomalies": 0}
+        agg["days_present"] += 1
+        agg["hours"] = round(agg["hours"] + row["hours"], 3)
+        if row["first_in"] and (not agg["earliest_in"] or row["first_in"] < agg["earliest_in"]):
+            agg["earliest_in"] = row["first_in"]
+        if row["last_out"] > agg["latest_out"]:
+            agg["latest_out"] = row["last_out"]
+        agg["anomalies"] += len(row["anomalies"].split(";")) if row["anomalies"] else 0
+    yield from flush()
+
+# Writers
+
+def write_csv(rows, columns, out):
+    writer = csv.DictWriter(out, fieldnames=columns)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    return count
+
+def write_json(rows, columns, out):
+    """A JSON array written one row at a time"""
+    count = 0
+    out.write("[")
+    for row in rows:
+        out.write(",\n" if count else "\n")
+        out.write(json.dumps(row))
+        count += 1
+    out.write("\n]\n")
+    return count
+
+def _collect_columns(rows, columns):
+    data = {c: [] for c in columns}
+    for row in rows:
+        for c in columns:
+            data[c].append(row[c])
+    return data
+
+def write_npz(rows, columns, path):
+    """One array per column; columnar formats need all rows before writing"""
+    import numpy as np
+    data = _collect_columns(rows, columns)
+    np.savez_compressed(path, **{c: np.asarray(v) for c, v in data.items()})
+    return len(data[columns[0]])
+
+def write_parquet(rows, columns, path):
+    data = _collect_columns(rows, columns)
+    pyarrow.parquet.write_table(pyarrow.table(data), path)
+    return len(data[columns[0]])
+
+def write_report(rows, columns, fmt, output=None):
+    """Write rows in fmt to output (stdout for csv/json if None); returns the row count"""
+    if fmt in ("npz", "parquet"):
+        if output is None:
+            raise ValueError(f"--output is required for {fmt}")
+        if fmt == "parquet" and not PARQUET_AVAILABLE:
+            raise ValueError("parquet output needs pyarrow (pip install pyarrow); try --format npz")
+        writer = write_npz if fmt == "npz" else write_parquet
+        return writer(rows, columns, output)
+
+    writer = write_csv if fmt == "csv" else write_json
+    if output is None:
+        return writer(rows, columns, sys.stdout)
+    tmp_path = output + ".tmp"
+    with open(tmp_path, "w", newline="") as out:
+        count = writer(rows, columns, out)
+    os.replace(tmp_path, output)
+    return count
+
+def report(archive="attendance", period="day", fmt="csv", output=None, workers=None,
+           start=None, end=None, names=None):
+    paths = day_files(archive, start, end)
+    rows = day_rows(paths, workers)
+    if names:
+        rows = (r for r in rows if r["name"] in names)
+    columns = DAY_COLUMNS
+    if period == "week":
+        rows = week_rows(rows)
+        columns = WEEK_COLUMNS
+    count = write_report(rows, columns, fmt, output)
+    return len(paths), count
+
+# Benchmark
+
+def generate_archive(archive, people=200, days=365, seed=0):
+    """Write a synthetic archive: weekday visits with lunch breaks and some anomalies"""
+    rng = random.Random(seed)
+    os.makedirs(archive, exist_ok=True)
+    names = [f"Person{i:03d}" for i in range(people)]
+    start = date.today() - timedelta(days=days)
+    rows = 0
+    for d in range(days):
+        day = start + timedelta(days=d)
+        if day.weekday() >= 5:
+            continue
+        events = []
+        for name in names:
+            if rng.random() < 0.1:
+                continue
+            t = rng.randint(7 * 3600, 10 * 3600)
+            for _ in range(rng.choice((1, 2, 2, 3))):
+                events.append((t, name, "Entry"))
+                t += rng.randint(1800, 4 * 3600)
+                if rng.random() < 0.02:
+                    break  # forgot to check out
+                events.append((t, name, "Exit"))
+                t += rng.randint(600, 3600)
+        events.sort()
+        with open(os.path.join(archive, f"{day.isoformat()}.csv"), "w") as f:
+            f.write("date,time,name,action,confidence\n")
+            for t, name, action in events:
+                f.write(f"{day.isoformat()},{_clock(min(t, 86399))},{name},{action},"
+                        f"{rng.uniform(25, 60):.2f}\n")
+        rows += len(events)
+    return rows
+
+def benchmark(people=200, days=365, max_workers=None):
+    max_workers = max_workers or os.cpu_count() or 1
+    with tempfile.TemporaryDirectory() as archive:
+        start = time.perf_counter()
+        events = generate_archive(archive, people, days)
+        print(f"Generated {events} events for {people} people over {days} days "
+              f"in {time.perf_counter() - start:.1f} s")
+
+        print(f"{'workers':>7} {'format':>7} {'period':>6} {'rows':>8} {'seconds':>8} {'events/s':>10}")
+        worker_counts = sorted({1, 2, max_workers} & set(range(1, max_workers + 1)))
+        runs = [(w, "csv", "day") for w in worker_counts]
+        runs += [(max_workers, "json", "day"), (max_workers, "npz", "day"),
+                 (max_workers, "csv", "week")]
+        for workers, fmt, period in runs:
+            output = os.path.join(archive, f"report.{fmt}")
+            start = time.perf_counter()
+            _, count = report(archive, period, fmt, output, workers)
+            elapsed = time.perf_counter() - start
+            print(f"{workers:>7} {fmt:>7} {period:>6} {count:>8} {elapsed:>8.2f} "
+                  f"{events / elapsed:>10.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Attendance reports and exports")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    rep = sub.add_parser("report", help="per-person daily or weekly report")
+    rep.add_argument("--archive", default="attendance", help="folder with YYYY-MM-DD.csv files")
+    rep.add_argument("--period", choices=("day", "week"), default="day")
+    rep.add_argument("--format", choices=FORMATS, default="csv")
+    rep.add_argument("--output", help="output file (csv/json default to stdout)")
+    rep.add_argument("--from", dest="start", metavar="YYYY-MM-DD")
+    rep.add_argument("--to", dest="end", metavar="YYYY-MM-DD")
+    rep.add_argument("--name", action="append", help="only this person (repeatable)")
+    rep.add_argument("--workers", type=int, help="parallel day-file workers (default: CPU count)")
+
+    bench = sub.add_parser("benchmark", help="time reports on a synthetic year")
+    bench.add_argument("--people", type=int, default=200)
+    bench.add_argument("--days", type=int, default=365)
+    bench.add_argument("--max-workers", type=int)
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        benchmark(args.people, args.days, args.max_workers)
+        return
+
+    if not os.path.isdir(args.archive):
+        print(f"[ERROR] Attendance folder not found: {args.archive}", file=sys.stderr)
+        sys.exit(1)
+    try:
+        files, count = report(args.archive, args.period, args.format, args.output,
+                              args.workers, args.start, args.end, set(args.name or ()))
+    except ValueError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"[OK] {count} rows from {files} day files", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
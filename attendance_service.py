@@ -0,0 +1,254 @@
+import os
+# Same Qt backend choice as recognize_attendance; must precede the cv2 import.
+os.environ.setdefault("QT_QPA_PLATFORM", "xcb")
+import cv2
+import json
+import queue
+import threading
+import socketserver
+
+from recognize_attendance import AttendanceTracker, load_model, open_camera, run_recognition
+from collect_faces import collect_samples
+from service_client import SOCKET_PATH, service_available
+from training_worker import TrainingJob, describe_progress
+from profiler import PROFILER
+from frame_ring import FrameRing, frame_shape
+from face_detectors import load_detector
+from zones import apply_zones
+from model_store import ModelWatcher, describe_version
+
+# Long-running attendance service. Keeps the camera, cascade and recognizer
+# warm between menu actions and accepts commands over a Unix socket, one JSON
+# object per line:
+#
+#   {"cmd": "status"}                 -> current state, person, FPS
+#   {"cmd": "start"}                  -> start recognition
+#   {"cmd": "stop"}                   -> stop the current job
+#   {"cmd": "enroll", "name": "..."}  -> collect face samples
+#   {"cmd": "train"}                  -> retrain in the background, then reload
+#   {"cmd": "cancel_training"}        -> cancel a running training job
+#   {"cmd": "profile"}                -> start/stop profiling the recognition loop
+#   {"cmd": "shutdown"}               -> stop the service
+#
+# OpenCV windows must be driven from the main thread, so socket handlers only
+# queue jobs and the main thread executes them.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+class AttendanceService:
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.jobs_lock = threading.Lock()    # submit() against the job loop
+        self.stop_event = threading.Event()
+        self.shutdown_event = threading.Event()
+        self.state = "idle"
+        self.status = {}
+        self.training_job = None
+        self.training_thread = None
+        self.last_error = None
+
+        self.detector = apply_zones(load_detector(), 0)
+        self.enroll_detector = load_detector(purpose="enrollment")
+        self.model = load_model("trainer.yml", "labels.json")
+        self.cap = None
+        self.ring = None
+        # Models installed by model_store.py sync are swapped in while running
+        self.watcher = ModelWatcher(self.reload_model).start()
+
+    def camera(self):
+        """Open the camera once and keep it open, with a frame ring to capture into"""
+        if self.cap is None or not self.cap.isOpened():
+            self.cap = open_camera(0)
+            if self.cap is not None and self.ring is None:
+                self.ring = FrameRing(frame_shape(self.cap))
+        return self.cap
+
+    def handle(self, request):
+        """Handle one request from a client and return the reply"""
+        cmd = request.get("cmd")
+
+        if cmd == "status":
+            return {"ok": True, "state": self.state, "training": self.training_status(),
+                    "model_loaded": self.model is not None,
+                    "model_version": describe_version(),
+                    "last_error": self.last_error, **self.status}
+        if cmd == "start":
+            if self.model is None:
+                return {"ok": False, "error": "No trained model. Train the system first."}
+            return self.submit(("recognize",))
+        if cmd == "enroll":
+            name = (request.get("name") or "").strip()
+            if not name or "_" in name or " " in name:
+                return {"ok": False, "error": "Invalid name (use NameSurname format)"}
+            return self.submit(("enroll", name))
+        if cmd == "stop":
+            self.stop_event.set()
+            return {"ok": True}
+        if cmd == "train":
+            if self.training_job is not None and not self.training_job.finished():
+                return {"ok": False, "error": "Training already running"}
+            self.training_job = TrainingJob().start()
+            self.training_thread = threading.Thread(target=self.train, args=(self.training_job,),
+                                                    daemon=True)
+            self.training_thread.start()
+            return {"ok": True}
+        if cmd == "cancel_training":
+            # Only signals the worker; the training thread reads the outcome
+            if self.training_job is not None:
+                self.training_job.cancel()
+            return {"ok": True}
+        if cmd == "profile":
+            PROFILER.request_toggle()
+            return {"ok": True, "profiling": not PROFILER.enabled}
+        if cmd == "shutdown":
+            self.shutdown_event.set()
+            self.stop_event.set()
+            return {"ok": True}
+        return {"ok": False, "error": f"Unknown command: {cmd}"}
+
+    def submit(self, job):
+        """Queue a job, stopping whatever is currently running.
+
+        Only the newest job waits: jobs still queued are superseded by it.
+        """
+        with self.jobs_lock:
+            while True:
+                try:
+                    self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+            if self.state == "idle":
+                self.state = "starting"
+            else:
+                self.stop_event.set()
+            self.jobs.put(job)
+        return {"ok": True}
+
+    def training_status(self):
+        """Progress of the current or last training job (None if never trained)"""
+        job = self.training_job
+        if job is None:
+            return None
+        text, fraction = describe_progress(job.last_event)
+        return {"running": not job.finished(), "text": text, "fraction": fraction,
+                "stage": job.last_event["stage"] if job.last_event else "starting"}
+
+    def train(self, job):
+        """Wait for a background training job, then swap the new model in.
+
+        Recognition keeps using the old model until the swap.
+        """
+        last = job.wait()
+        if last["stage"] == "done":
+            self.reload_model()
+            self.last_error = None
+            print("[OK] Reloaded model after training.")
+        elif last["stage"] == "error":
+            self.last_error = f"Training failed: {last.get('error')}"
+            print(f"[ERROR] {self.last_error}")
+
+    def reload_model(self):
+        model = load_model("trainer.yml", "labels.json")
+        if model is not None:
+            if self.model is None:
+                self.model = model
+            else:
+                self.model.swap(*model.current)
+
+    def run_job(self, job):
+        if self.detector is None:
+            self.last_error = "No face detector (see attendance_config.json)"
+            return
+        cap = self.camera()
+        if cap is None:
+            self.last_error = "Could not open camera"
+            return
+
+        if job[0] == "recognize":
+            self.state = "recognizing"
+            tracker = AttendanceTracker(enable_telegram=True)
+            run_recognition(cap, self.detector, self.model, tracker,
+                            stop_event=self.stop_event, status=self.status, ring=self.ring)
+            tracker.mark_all_exit_on_close()
+        elif job[0] == "enroll":
+            self.state = "enrolling"
+            self.status = {"person": job[1]}
+            count, skipped = collect_samples(cap, self.enroll_detector, job[1],
+                                             stop_event=self.stop_event, ring=self.ring)
+            print(f"[OK] Collected {count} images for {job[1]} (skipped {skipped} blurry)")
+
+    def serve_forever(self):
+        """Execute queued jobs on the main thread until shutdown"""
+        while not self.shutdown_event.is_set():
+            try:
+                job = self.jobs.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self.jobs_lock:
+                if not self.jobs.empty():
+                    # Superseded while being taken; the stop request is for this one
+                    continue
+                self.stop_event.clear()
+            try:
+                self.run_job(job)
+            except Exception as e:
+                self.last_error = str(e)
+                print(f"[ERROR] Job {job[0]} failed: {e}")
+            finally:
+                with self.jobs_lock:
+                    self.state = "idle" if self.jobs.empty() else "starting"
+                self.status = {}
+                cv2.destroyAllWindows()
+
+        self.watcher.stop()
+        if self.training_job is not None and not self.training_job.finished():
+            self.training_job.cancel(timeout=5.0)
+            self.training_thread.join(6.0)
+        if self.cap is not None:
+            self.cap.release()
+        if self.ring is not None:
+            self.ring.close()
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                reply = self.server.service.handle(json.loads(line))
+            except ValueError:
+                reply = {"ok": False, "error": "Invalid JSON"}
+            self.wfile.write((json.dumps(reply) + "\n").encode())
+
+def remove_stale_socket(path):
+    """Remove a socket file left behind by a service that is no longer running"""
+    if os.path.exists(path):
+        if service_available(path):
+            return False
+        os.unlink(path)
+    return True
+
+def main():
+    os.chdir(BASE_DIR)
+    if not remove_stale_socket(SOCKET_PATH):
+        print("[ERROR] Attendance service is already running.")
+        return
+
+    service = AttendanceService()
+    server = socketserver.ThreadingUnixStreamServer(SOCKET_PATH, RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[OK] Attendance service listening on {SOCKET_PATH}")
+
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        server.server_close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        print("Attendance service stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import os
+import sys
+import math
+import time
+import argparse
+import multiprocessing as mp
+from datetime import datetime, timedelta
+
+# Offline backfill: attendance recomputed from a recorded video.
+#
+#   python backfill.py recordings/door_2026-10-19.mp4 --start "2026-10-19 07:55:00"
+#
+# After a kiosk crash, or with an improved model, the day's recording is
+# run through the same pipeline as recognize_attendance.py, faster than
+# real time:
+#
+#   1. The video is cut into --segment-seconds segments. A process pool
+#      analyzes them with analyze_frames() (the live detection/recognition
+#      cadence, frame numbers as in the video). The identity cache's TTL
+#      runs on video time. Each worker starts a warm-up of at least
+#      WARMUP_FRAMES, and at least one identity TTL, before its segment and
+#      discards those frames. Reused boxes are then as in a continuous run,
+#      and cached identities have been re-verified on the same TTL
+#      schedule. Cache hit counts are not carried over, though, so a face
+#      that stays in view across a boundary may be re-verified a few frames
+#      earlier or later than in a continuous run.
+#   2. The results are replayed in order, in this process, through
+#      run_recognition(): temporal voting, presence and cooldowns
+#      (presence.py) and the Entry/Exit toggle. All of that state carries
+#      across segment boundaries unchanged, as in a live run. The tracker's
+#      clocks run on video time: frame / fps for presence, --start +
+#      frame / fps for the times written to the log.
+#
+# The log goes to --output/<date>.csv (attendance_backfill/ by default, so
+# the kiosk's own attendance/ is not touched) and ends with the close-time
+# Exits a live run writes when it stops. Telegram is not used.
+#
+# Unlike a camera, a video never drops frames, so a kiosk that was falling
+# behind live may have marked a little later than the backfill does.
+
+SEGMENT_SECONDS = 60.0
+WARMUP_FRAMES = 30       # ten detections at the live cadence (see warmup_frames)
+
+_mp = mp.get_context("spawn")
+_detector = None         # per worker process
+_model = None
+_identity_ttl = 10.0
+
+def _init_worker(backend, detector_model, shortlist, identity_ttl, zones):
+    global _detector, _model, _identity_ttl
+    from face_detectors import create_detector
+    from recognize_attendance import load_model
+    from zones import ZonedDetector
+    _detector = create_detector(backend, detector_model)
+    if zones:
+        _detector = ZonedDetector(_detector, zones)
+    _model = load_model("trainer.yml", "labels.json", shortlist)
+    _identity_ttl = identity_ttl
+
+def warmup_frames(fps, identity_ttl):
+    """Frames analyzed and discarded before each segment"""
+    return max(WARMUP_FRAMES, int(math.ceil(identity_ttl * fps)))
+
+def video_info(path):
+    """(fps, frame count) of a video file"""
+    import cv2
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            return None, 0
+        return cap.get(cv2.CAP_PROP_FPS) or 30.0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+
+def segments(n_frames, fps, segment_seconds=SEGMENT_SECONDS):
+    """(first, last) frame numbers per segment; frames first+1 .. last, last=None to the end"""
+    size = max(1, int(round(segment_seconds * fps)))
+    bounds = [(first, first + size) for first in range(0, n_frames, size)] or [(0, None)]
+    # The frame count in the header is an estimate: read the last segment to the end
+    bounds[-1] = (bounds[-1][0], None)
+    return bounds
+
+def analyze_segment(task):
+    """Analysis of one segment as (first, last, [(frame_id, boxes, prediction)])"""
+    import cv2
+    import capture
+    from identity_cache import IdentityCache
+    from recognize_attendance import analyze_frames
+    path, first, last, warmup, fps = task
+    results = []
+    cap = capture.open_camera(path)
+    if cap is None:
+        return first, last, results
+    offset = max(0, first - warmup)
+    if offset:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, offset)
+    # TTL on video time, as a kiosk running at the video's frame rate would see it
+    cache = IdentityCache(ttl=_identity_ttl,
+                          clock=lambda: cap.get(cv2.CAP_PROP_POS_FRAMES) / fps)
+    frames = analyze_frames(cap, _detector, _model, cache=cache,
+                            wants_frame=lambda: False, frame_offset=offset)
+    try:
+        for frame_id, _, faces, prediction in frames:
+            if last is not None and frame_id > last:
+                break
+            if frame_id > first:
+                boxes = [tuple(int(v) for v in f) for f in faces]
+                results.append((frame_id, boxes, tuple(prediction) if prediction else None))
+    finally:
+        frames.close()
+        cap.release()
+    return first, last, results
+
+def replay(results, fps, clock, progress=None):
+    """FrameAnalysis for run_recognition(), with clock set to each frame's video time"""
+    from recognize_attendance import FrameAnalysis, Prediction
+    for first, last, frames in results:
+        for frame_id, boxes, prediction in frames:
+            clock.set((frame_id - 1) / fps)
+            yield FrameAnalysis(frame_id, None, boxes,
+                                Prediction(*prediction) if prediction else None)
+        if progress is not None:
+            progress(first, last, len(frames))
+
+def backfill(video, start_time, output_dir="attendance_backfill", workers=None,
+             segment_seconds=SEGMENT_SECONDS, backend=None, detector_model=None,
+             shortlist=0, identity_ttl=10.0, threshold=None, zones=None):
+    """Recompute attendance for video; returns the number of frames analyzed.
+
+    zones (a list of zones.Zone) restricts detection as on the kiosk.
+    """
+    from presence import ManualClock
+    from recognize_attendance import AttendanceTracker, run_recognition
+
+    fps, n_frames = video_info(video)
+    if fps is None:
+        print(f"[ERROR] Could not open video {video}.")
+        return 0
+    bounds = segments(n_frames, fps, segment_seconds)
+    workers = min(workers or os.cpu_count() or 1, len(bounds))
+    duration = n_frames / fps
+    print(f"Backfilling {video}: {n_frames} frames ({duration / 60:.1f} min at {fps:.0f} fps) "
+          f"from {start_time:%Y-%m-%d %H:%M:%S}, {len(bounds)} segments, {workers} workers")
+
+    clock = ManualClock()
+    tracker = AttendanceTracker(enable_telegram=False, clock=clock,
+                                wall_clock=lambda: start_time + timedelta(seconds=clock()),
+                                log_dir=output_dir)
+    warmup = warmup_frames(fps, identity_ttl)
+    tasks = [(video, first, last, warmup, fps) for first, last in bounds]
+    analyzed = 0
+    started = time.perf_counter()
+
+    def progress(first, last, count):
+        nonlocal analyzed
+        analyzed += count
+        elapsed = time.perf_counter() - started
+        print(f"  {(first + count) / fps / 60:6.1f} min of video, "
+              f"{analyzed / fps / max(elapsed, 1e-9):.1f}x real time")
+
+    with _mp.Pool(workers, initializer=_init_worker,
+                  initargs=(backend, detector_model, shortlist, identity_ttl, zones)) as pool:
+        # imap keeps segment order, so the replay starts as soon as the first is done
+        run_recognition(None, None, None, tracker, show_window=False, threshold=threshold,
+                        frames=replay(pool.imap(analyze_segment, tasks), fps, clock, progress))
+    tracker.mark_all_exit_on_close()
+
+    elapsed = time.perf_counter() - started
+    print(f"[OK] {analyzed} frames ({analyzed / fps / 60:.1f} min of video) in {elapsed:.1f} s, "
+          f"{analyzed / fps / max(elapsed, 1e-9):.1f}x real time. Log in {output_dir}/")
+    return analyzed
+
+def recording_start(video, duration):
+    """Default start time: the file was last written when the recording ended"""
+    return datetime.fromtimestamp(os.path.getmtime(video)) - timedelta(seconds=duration)
+
+def main():
+    parser = argparse.ArgumentParser(description="Recompute attendance from a recorded video")
+    parser.add_argument("video")
+    parser.add_argument("--start", help="wall-clock time of the first frame, "
+                                        "'YYYY-MM-DD HH:MM:SS' (default: file time - duration)")
+    parser.add_argument("--output", default="attendance_backfill",
+                        help="folder for the per-day CSV files")
+    parser.add_argument("--force", action="store_true",
+                        help="replace existing CSV files in --output for the recording's days")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--segment-seconds", type=float, default=SEGMENT_SECONDS)
+    parser.add_argument("--detector", help="detector backend (default: attendance_config.json)")
+    parser.add_argument("--detector-model", metavar="PATH")
+    parser.add_argument("--shortlist", type=int, default=0)
+    parser.add_argument("--identity-ttl", type=float, default=10.0, metavar="SECONDS")
+    parser.add_argument("--threshold", type=float,
+                        help="largest accepted LBPH distance (default: attendance_config.json)")
+    parser.add_argument("--camera", default="0",
+                        help="camera whose detection zones apply (see zones.py)")
+    parser.add_argument("--no-zones", action="store_true", help="search the whole frame")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.video):
+        print(f"[ERROR] Video not found: {args.video}")
+        sys.exit(1)
+    fps, n_frames = video_info(args.video)
+    if fps is None:
+        print(f"[ERROR] Could not open video {args.video}.")
+        sys.exit(1)
+    try:
+        start_time = (datetime.fromisoformat(args.start) if args.start
+                      else recording_start(args.video, n_frames / fps))
+    except ValueError:
+        print(f"[ERROR] Invalid --start {args.start!r}; use 'YYYY-MM-DD HH:MM:SS'")
+        sys.exit(1)
+
+    # Check the detector and model once here, not in every worker
+    from face_detectors import load_detector
+    from recognize_attendance import load_model
+    from zones import apply_zones
+    detector = load_detector(args.detector, args.detector_model, use_cache=False)
+    if detector is None:
+        sys.exit(1)
+    if not args.no_zones:
+        detector = apply_zones(detector, args.camera)
+    if load_model("trainer.yml", "labels.json", args.shortlist, use_cache=False) is None:
+        sys.exit(1)
+
+    end_time = start_time + timedelta(seconds=n_frames / fps)
+    days = {(start_time + timedelta(days=d)).strftime("%Y-%m-%d")
+            for d in range((end_time.date() - start_time.date()).days + 1)}
+    existing = [os.path.join(args.output, f"{day}.csv") for day in sorted(days)
+                if os.path.exists(os.path.join(args.output, f"{day}.csv"))]
+    if existing and not args.force:
+        print(f"[ERROR] {', '.join(existing)} already exists; use --force to replace it "
+              f"or choose another --output.")
+        sys.exit(1)
+    for path in existing:
+        os.remove(path)
+
+    backfill(args.video, start_time, args.output, args.workers, args.segment_seconds,
+             args.detector, args.detector_model, args.shortlist, args.identity_ttl,
+             args.threshold, getattr(detector, "zones", None))
+
+if __name__ == "__main__":
+    main()
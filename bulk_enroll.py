@@ -0,0 +1,210 @@
+import os
+import re
+import sys
+import time
+import argparse
+import multiprocessing as mp
+
+# Bulk enrollment from photos and videos.
+#
+#   python bulk_enroll.py cohort/ --workers 4
+#
+# cohort/ holds one folder per person, named like the dataset (NameSurname),
+# with any mix of photos and videos:
+#
+#   cohort/
+#     JohnDoe/       passport.jpg  phone_clip.mp4
+#     JaneRoe/       1.png  2.png  3.png
+#
+# Photos and videos are processed in a process pool, each worker with its own
+# enrollment detector (face_detectors.py, purpose="enrollment"). The largest
+# face of each photo, and of every --video-step-th video frame, goes through
+# the same CLAHE preprocessing and blur gate as collect_faces.py. Samples are
+# written as dataset/NameSurname_N.jpg, numbered after the person's existing
+# samples, up to --max-per-person new samples each. One training run
+# (train_lbph.run_training) follows unless --no-train is given.
+
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".webm")
+MAX_SIDE = 1280    # photos are scaled down to this before detection
+
+_mp = mp.get_context("spawn")
+_detector = None   # per worker process
+_clahe = None
+
+def find_sources(root):
+    """{name: [(kind, path)]} for every person folder under root"""
+    sources = {}
+    for name in sorted(os.listdir(root)):
+        folder = os.path.join(root, name)
+        if not os.path.isdir(folder):
+            continue
+        files = []
+        for filename in sorted(os.listdir(folder)):
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in PHOTO_EXTENSIONS:
+                files.append(("photo", os.path.join(folder, filename)))
+            elif ext in VIDEO_EXTENSIONS:
+                files.append(("video", os.path.join(folder, filename)))
+        if files:
+            sources[name] = files
+    return sources
+
+def valid_name(name):
+    return bool(name) and "_" not in name and " " not in name
+
+def _init_worker(backend, model):
+    global _detector, _clahe
+    import cv2
+    from face_detectors import create_detector
+    _detector = create_detector(backend, model, purpose="enrollment")
+    _clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+
+def _sample(gray):
+    """(sample or None, outcome) for the largest face in a grayscale image"""
+    from collect_faces import enrollment_preprocess, face_sample
+    gray_eq = enrollment_preprocess(gray, _clahe)
+    faces = _detector.detect(gray_eq)
+    if not faces:
+        return None, "no_face"
+    sample = face_sample(gray_eq, max(faces, key=lambda f: f[2] * f[3]))
+    return sample, ("ok" if sample is not None else "blurry")
+
+def process_source(task):
+    """Detect and crop one photo or video; returns (name, samples, counts)"""
+    import cv2
+    name, kind, path, video_step, limit = task
+    counts = {"images": 0, "ok": 0, "no_face": 0, "blurry": 0, "unreadable": 0}
+    samples = []
+
+    if kind == "photo":
+        gray = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if gray is None:
+            counts["unreadable"] += 1
+            return name, samples, counts
+        scale = MAX_SIDE / max(gray.shape)
+        if scale < 1:
+            gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+        frames = [gray]
+    else:
+        frames = _video_frames(path, video_step)
+
+    for gray in frames:
+        counts["images"] += 1
+        sample, outcome = _sample(gray)
+        counts[outcome] += 1
+        if sample is not None:
+            # JPEG-encoded here, so only ~5 KB per sample crosses the process boundary
+            samples.append(cv2.imencode(".jpg", sample)[1].tobytes())
+            if len(samples) >= limit:
+                break
+    if kind == "video" and counts["images"] == 0:
+        counts["unreadable"] += 1
+    return name, samples, counts
+
+def _video_frames(path, step):
+    import cv2
+    cap = cv2.VideoCapture(path)
+    index = 0
+    try:
+        while cap.grab():
+            if index % step == 0:
+                ok, frame = cap.retrieve()
+                if ok:
+                    yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            index += 1
+    finally:
+        cap.release()
+
+def next_sample_number(dataset_dir, name):
+    """1 + the highest N of the person's existing NameSurname_N.jpg samples"""
+    pattern = re.compile(re.escape(name) + r"_(\d+)\.jpg$")
+    numbers = [int(m.group(1)) for f in os.listdir(dataset_dir) for m in [pattern.match(f)] if m]
+    return max(numbers, default=0) + 1
+
+def bulk_enroll(root, dataset_dir="dataset", workers=None, backend=None, model=None,
+                video_step=5, max_per_person=100):
+    """Write samples for everyone under root; returns {name: samples written}"""
+    from face_detectors import create_detector
+    sources = find_sources(root)
+    invalid = [n for n in sources if not valid_name(n)]
+    for name in invalid:
+        print(f"[WARNING] Skipping {name}: use the NameSurname format (no spaces or '_')")
+        del sources[name]
+    if not sources:
+        print(f"[ERROR] No person folders with photos or videos in {root}")
+        return {}
+    try:
+        # Fail here, not in every worker
+        create_detector(backend, model, purpose="enrollment", use_cache=False)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return {}
+
+    os.makedirs(dataset_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+    tasks = [(name, kind, path, video_step, max_per_person)
+             for name, files in sources.items() for kind, path in files]
+    n_files = len(tasks)
+    print(f"Enrolling {len(sources)} people from {n_files} files with {workers} workers...")
+
+    written = {name: 0 for name in sources}
+    numbers = {name: next_sample_number(dataset_dir, name) for name in sources}
+    totals = {"images": 0, "ok": 0, "no_face": 0, "blurry": 0, "unreadable": 0}
+    start = time.perf_counter()
+    with _mp.Pool(workers, initializer=_init_worker, initargs=(backend, model)) as pool:
+        for done, (name, samples, counts) in enumerate(
+                pool.imap_unordered(process_source, tasks), 1):
+            for key, value in counts.items():
+                totals[key] += value
+            for data in samples[:max_per_person - written[name]]:
+                with open(os.path.join(dataset_dir, f"{name}_{numbers[name]}.jpg"), "wb") as f:
+                    f.write(data)
+                numbers[name] += 1
+                written[name] += 1
+            if done % 20 == 0 or done == n_files:
+                elapsed = time.perf_counter() - start
+                print(f"  {done}/{n_files} files, {totals['images']} images "
+                      f"({totals['images'] / elapsed:.1f} images/s)")
+    elapsed = time.perf_counter() - start
+
+    print(f"[OK] {totals['images']} images in {elapsed:.1f} s "
+          f"({totals['images'] / max(elapsed, 1e-9):.1f} images/s): "
+          f"{sum(written.values())} samples written, {totals['no_face']} without a face, "
+          f"{totals['blurry']} too blurry, {totals['unreadable']} unreadable files")
+    for name, count in written.items():
+        flag = "" if count >= 10 else "  (few samples; add photos or a video)"
+        print(f"  {name:<24} {count:>4}{flag}")
+    return written
+
+def main():
+    parser = argparse.ArgumentParser(description="Enroll many people from photo and video folders")
+    parser.add_argument("root", help="folder with one subfolder of photos/videos per person")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--detector", help="detector backend (default: attendance_config.json)")
+    parser.add_argument("--detector-model", metavar="PATH")
+    parser.add_argument("--video-step", type=int, default=5, help="use every Nth video frame")
+    parser.add_argument("--max-per-person", type=int, default=100,
+                        help="new samples per person at most")
+    parser.add_argument("--no-train", action="store_true", help="only write the samples")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.root):
+        print(f"[ERROR] Folder not found: {args.root}")
+        sys.exit(1)
+    written = bulk_enroll(args.root, args.dataset, args.workers, args.detector,
+                          args.detector_model, args.video_step, args.max_per_person)
+    if not any(written.values()):
+        sys.exit(1)
+    if args.no_train:
+        print("Run 'python train_lbph.py' to train on the new samples.")
+        return
+
+    from train_lbph import run_training
+    start = time.perf_counter()
+    run_training(args.dataset)
+    print(f"Training took {time.perf_counter() - start:.1f} s.")
+
+if __name__ == "__main__":
+    main()
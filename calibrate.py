@@ -0,0 +1,264 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import itertools
+import multiprocessing as mp
+import numpy as np
+
+from train_lbph import CONFIG_PATH, RECOGNITION_DEFAULTS, load_recognition_config
+
+# LBPH parameter sweep and threshold calibration.
+#
+#   python calibrate.py --folds 5 --workers 4
+#
+# dataset/ is split per person into k folds: fold f tests every person's
+# images i with i % k == f and trains on the rest. People whose position
+# (sorted by name) % k == f are left out of training in fold f altogether
+# and tested as strangers, which is what false accepts are made of. Every
+# (radius, neighbors, grid) combination is trained and evaluated on every
+# fold in a process pool, with the same augmentation as train_lbph.py and
+# the NumPy matcher kiosks use (lbph_features.py).
+#
+# Each test face gives (is enrolled, predicted correctly, distance). For a
+# threshold t a face is accepted if its distance is below t:
+#
+#   accuracy           enrolled faces accepted with the right name / enrolled faces
+#   false-accept rate  faces accepted with a wrong name (strangers included) / all faces
+#   latency            median time of one predict (histogram + matching)
+#
+# Each combination's threshold is the one with the best accuracy whose
+# false-accept rate stays within --max-far. The combinations not beaten on
+# all of accuracy, false-accept rate and latency at once form the Pareto
+# front. Results go to calibration.json; --apply writes the most accurate
+# setting on the front to the "recognition" section of attendance_config.json.
+#
+# Every finished (combination, fold) is appended to the results cache,
+# keyed by a digest of the dataset, so an interrupted run resumes where it
+# stopped and a changed dataset is evaluated afresh.
+
+CACHE_PATH = "calibration_cache.jsonl"
+RESULTS_PATH = "calibration.json"
+
+_mp = mp.get_context("spawn")
+_dataset = None   # per worker process
+
+def dataset_digest(dataset_dir, max_per_person):
+    """Hash of the dataset's file names, sizes and modification times"""
+    h = hashlib.blake2b(digest_size=12)
+    h.update(str(max_per_person).encode())
+    for filename in sorted(os.listdir(dataset_dir)):
+        st = os.stat(os.path.join(dataset_dir, filename))
+        h.update(f"{filename}:{st.st_size}:{st.st_mtime_ns}\n".encode())
+    return h.hexdigest()
+
+def _load(dataset_dir, max_per_person):
+    global _dataset
+    if _dataset is None:
+        from cascade_matcher import load_dataset
+        people = load_dataset(dataset_dir)
+        _dataset = {name: images[:max_per_person] for name, images in sorted(people.items())}
+    return _dataset
+
+def split_fold(people, fold, folds):
+    """(train [(name, image)], test [(name, image, enrolled)]) for one fold"""
+    train, test = [], []
+    for position, name in enumerate(sorted(people)):
+        stranger = folds > 1 and position % folds == fold
+        for i, img in enumerate(people[name]):
+            if stranger:
+                test.append((name, img, False))
+            elif i % folds == fold:
+                test.append((name, img, True))
+            else:
+                train.append((name, img))
+    return train, test
+
+def evaluate(task):
+    """Train one combination on one fold; returns the per-face test records"""
+    dataset_dir, max_per_person, augment, (radius, neighbors, grid), fold, folds = task
+    from train_lbph import augment_image
+    from lbph_features import compute_histogram, chi_square_distances
+
+    people = _load(dataset_dir, max_per_person)
+    train, test = split_fold(people, fold, folds)
+    if not train:
+        return {"records": [], "latency": 0.0, "samples": 0}
+    names = sorted({name for name, _ in train})
+    label_of = {name: i for i, name in enumerate(names)}
+    histograms, labels = [], []
+    for name, img in train:
+        for sample in (augment_image(img) if augment else [img]):
+            histograms.append(compute_histogram(sample, radius, neighbors, grid, grid))
+            labels.append(label_of[name])
+    histograms = np.vstack(histograms)
+    labels = np.asarray(labels)
+
+    records, latencies = [], []
+    for name, img, enrolled in test:
+        start = time.perf_counter()
+        dists = chi_square_distances(histograms, compute_histogram(img, radius, neighbors, grid, grid))
+        best = int(np.argmin(dists))
+        latencies.append(time.perf_counter() - start)
+        records.append((enrolled, enrolled and names[labels[best]] == name, float(dists[best])))
+    return {"records": records, "latency": float(np.median(latencies)) if latencies else 0.0,
+            "samples": len(histograms)}
+
+def calibrate_threshold(records, max_far=0.01):
+    """(threshold, accuracy, false-accept rate) with the best accuracy within max_far"""
+    records = sorted(records, key=lambda r: r[2])
+    enrolled = sum(1 for r in records if r[0]) or 1
+    total = len(records) or 1
+    best = (records[0][2] if records else 0.0, 0.0, 0.0)
+    correct = false_accepts = 0
+    for i, (_, right, distance) in enumerate(records):
+        if right:
+            correct += 1
+        else:
+            false_accepts += 1
+        if false_accepts / total > max_far:
+            break
+        # Accept everything up to this face: threshold halfway to the next distance
+        upper = records[i + 1][2] if i + 1 < len(records) else distance + 1.0
+        if correct / enrolled > best[1]:
+            best = ((distance + upper) / 2, correct / enrolled, false_accepts / total)
+    return best
+
+def pareto_front(results):
+    """Results not dominated on (accuracy up, far down, latency down)"""
+    def dominates(a, b):
+        better_or_equal = (a["accuracy"] >= b["accuracy"] and a["far"] <= b["far"]
+                           and a["latency_ms"] <= b["latency_ms"])
+        strictly = (a["accuracy"] > b["accuracy"] or a["far"] < b["far"]
+                    or a["latency_ms"] < b["latency_ms"])
+        return better_or_equal and strictly
+    return [r for r in results if not any(dominates(o, r) for o in results)]
+
+def _read_cache(path, digest):
+    cached = {}
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue   # a line cut short by an interrupted run
+                if entry.get("dataset") == digest:
+                    cached[entry["key"]] = entry["result"]
+    return cached
+
+def _task_key(combo, fold, folds, augment):
+    radius, neighbors, grid = combo
+    return f"r{radius}-n{neighbors}-g{grid}-fold{fold}of{folds}-aug{int(augment)}"
+
+def sweep(dataset_dir="dataset", radii=(1, 2, 3), neighbors=(8,), grids=(6, 8, 10), folds=5,
+          workers=None, max_far=0.01, max_per_person=40, augment=True, cache_path=CACHE_PATH):
+    """Evaluate every combination on every fold; returns one summary per combination"""
+    digest = dataset_digest(dataset_dir, max_per_person)
+    cached = _read_cache(cache_path, digest)
+    combos = list(itertools.product(radii, neighbors, grids))
+    tasks = {_task_key(c, f, folds, augment): (dataset_dir, max_per_person, augment, c, f, folds)
+             for c in combos for f in range(folds)}
+    todo = [k for k in tasks if k not in cached]
+    print(f"{len(combos)} combinations x {folds} folds: {len(tasks) - len(todo)} cached, "
+          f"{len(todo)} to run")
+
+    if todo:
+        os.makedirs(os.path.dirname(cache_path) or ".", exist_ok=True)
+        workers = workers or os.cpu_count() or 1
+        with _mp.Pool(min(workers, len(todo))) as pool, open(cache_path, "a") as cache:
+            for n, (key, result) in enumerate(
+                    pool.imap_unordered(_run_task, [(k, tasks[k]) for k in todo]), 1):
+                cached[key] = result
+                cache.write(json.dumps({"dataset": digest, "key": key, "result": result}) + "\n")
+                cache.flush()
+                print(f"  [{n}/{len(todo)}] {key}")
+
+    summaries = []
+    for combo in combos:
+        parts = [cached[_task_key(combo, f, folds, augment)] for f in range(folds)]
+        parts = [p for p in parts if p["samples"]] or parts
+        records = [tuple(r) for p in parts for r in p["records"]]
+        threshold, accuracy, far = calibrate_threshold(records, max_far)
+        radius, n, grid = combo
+        summaries.append({"radius": radius, "neighbors": n, "grid_x": grid, "grid_y": grid,
+                          "threshold": round(threshold, 2), "accuracy": accuracy, "far": far,
+                          "latency_ms": float(np.median([p["latency"] for p in parts])) * 1000,
+                          "samples": int(np.mean([p["samples"] for p in parts]))})
+    return summaries
+
+def _run_task(item):
+    key, task = item
+    return key, evaluate(task)
+
+def print_results(summaries, front):
+    print(f"{'radius':>6} {'nbrs':>5} {'grid':>5} {'threshold':>10} {'accuracy':>9} "
+          f"{'FAR':>7} {'ms':>7}  pareto")
+    for s in sorted(summaries, key=lambda s: -s["accuracy"]):
+        mark = "*" if s in front else ""
+        print(f"{s['radius']:>6} {s['neighbors']:>5} {s['grid_x']:>5} {s['threshold']:>10.2f} "
+              f"{s['accuracy']:>8.1%} {s['far']:>7.2%} {s['latency_ms']:>7.2f}  {mark}")
+
+def apply_setting(setting, config_path=CONFIG_PATH):
+    """Write a setting to the "recognition" section of attendance_config.json"""
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path, "r") as f:
+            config = json.load(f)
+    config["recognition"] = {k: setting[k] for k in RECOGNITION_DEFAULTS}
+    tmp_path = config_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=2)
+    os.replace(tmp_path, config_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="LBPH parameter sweep and threshold calibration")
+    parser.add_argument("--dataset", default="dataset")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--radius", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--neighbors", type=int, nargs="+", default=[8])
+    parser.add_argument("--grid", type=int, nargs="+", default=[6, 8, 10],
+                        help="cells per side (grid_x = grid_y)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--max-far", type=float, default=0.01,
+                        help="highest acceptable false-accept rate for the threshold")
+    parser.add_argument("--max-per-person", type=int, default=40,
+                        help="images used per person (memory grows with it)")
+    parser.add_argument("--no-augment", action="store_true",
+                        help="train without train_lbph.py's augmentation (faster, less faithful)")
+    parser.add_argument("--output", default=RESULTS_PATH)
+    parser.add_argument("--apply", action="store_true",
+                        help=f"write the most accurate Pareto setting to {CONFIG_PATH}")
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.dataset):
+        print(f"[ERROR] Dataset folder not found: {args.dataset}")
+        sys.exit(1)
+    if args.folds < 2:
+        print("[ERROR] Need at least 2 folds")
+        sys.exit(1)
+
+    summaries = sweep(args.dataset, args.radius, args.neighbors, args.grid, args.folds,
+                      args.workers, args.max_far, args.max_per_person, not args.no_augment)
+    front = pareto_front(summaries)
+    print_results(summaries, front)
+    best = max(front, key=lambda s: (s["accuracy"], -s["latency_ms"]))
+
+    with open(args.output, "w") as f:
+        json.dump({"max_far": args.max_far, "folds": args.folds, "results": summaries,
+                   "pareto": front, "recommended": best}, f, indent=2)
+    print(f"[OK] Results written to {args.output}")
+
+    current = load_recognition_config()
+    print(f"Recommended: radius={best['radius']} neighbors={best['neighbors']} "
+          f"grid={best['grid_x']}x{best['grid_y']} threshold={best['threshold']:.2f} "
+          f"(current: radius={current['radius']} neighbors={current['neighbors']} "
+          f"grid={current['grid_x']}x{current['grid_y']} threshold={current['threshold']})")
+    if args.apply:
+        apply_setting(best)
+        print(f"[OK] Saved to {CONFIG_PATH}. Retrain with train_lbph.py to use the new parameters.")
+
+if __name__ == "__main__":
+    main()
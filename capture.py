@@ -0,0 +1,268 @@
+import sys
+import time
+import cv2
+
+import metrics
+
+# Camera capture with format negotiation and cheap frame skipping.
+#
+# Camera wraps cv2.VideoCapture. For a camera index it opens the V4L2
+# backend (on Linux), asks for MJPG and then YUYV at the requested size and
+# frame rate, keeps the first format the driver actually accepts, and
+# shrinks the driver queue to one buffer so a read never returns a frame
+# that waited behind others.
+#
+# Frames are taken in two steps:
+#
+#   grab()     dequeue a frame; nothing is decoded. Frames the loop will
+#              not look at are only grabbed.
+#   gray()     the luma plane of the grabbed frame: the Y bytes of YUYV, or
+#              the JPEG decoded straight to grayscale, so no BGR image and
+#              no cvtColor(BGR2GRAY) are needed.
+#   bgr(out)   the color image, only when something is displayed.
+#
+# This works because the camera delivers raw buffers (CAP_PROP_CONVERT_RGB
+# off). Backends that ignore that setting, and video files, deliver BGR, and
+# gray() falls back to cvtColor. read(image) behaves like
+# VideoCapture.read, so FrameRing.capture() and other callers keep working.
+#
+# Camera also counts frames the driver dropped. V4L2 buffer timestamps
+# (CAP_PROP_POS_MSEC) show gaps larger than one frame interval; without
+# them, the time between grabs is used.
+#
+# MotionGate lets the frame loop skip face detection on an empty, unchanged
+# scene: it compares a thumbnail of the luma plane with the last frame that
+# passed.
+
+CAMERA_FPS = metrics.gauge("attendance_camera_fps", "Frames per second delivered by the camera")
+CAMERA_DROPPED = metrics.counter("attendance_camera_dropped_frames_total",
+                                 "Frames the camera driver dropped because they were not read in time")
+CAMERA_FRAMES = {mode: metrics.counter("attendance_camera_frames_total",
+                                       "Frames taken from the camera, by decode mode",
+                                       {"mode": mode})
+                 for mode in ("grab", "gray", "bgr")}
+
+MOTION_SKIPS = metrics.counter("attendance_motion_skipped_total",
+                               "Detections skipped because the scene did not change")
+
+FORMATS = ("MJPG", "YUYV")
+
+def _fourcc_name(value):
+    value = int(value)
+    return "".join(chr((value >> (8 * i)) & 0xFF) for i in range(4)).strip("\0")
+
+class Camera:
+    """A cv2.VideoCapture that negotiates its format and decodes on demand"""
+
+    def __init__(self, source=0, width=640, height=480, fps=30, formats=FORMATS,
+                 buffer_size=1, raw=True):
+        self.source = source
+        self.width = width
+        self.height = height
+        self.requested_fps = fps
+        self.formats = formats
+        self.buffer_size = buffer_size
+        self.use_raw = raw
+        self.cap = None
+        self.is_file = isinstance(source, str) and not source.isdigit()
+        self.fourcc = ""
+        self.raw = False
+        self.frame_interval = 1.0 / fps
+        self._frame = None      # what retrieve() gave for the current grab
+        self._gray = None
+        self._bgr = None
+        self.grabbed = 0
+        self.dropped = 0
+        self._last_stamp = None
+        self._window_start = None
+        self._window_frames = 0
+        self.fps = 0.0
+
+    def open(self):
+        """Open and configure the source; False if it cannot be opened"""
+        if self.is_file:
+            # A recorded video: played as recorded, decoded by the backend
+            self.cap = cv2.VideoCapture(self.source)
+            if not self.cap.isOpened():
+                return False
+            self.fourcc = _fourcc_name(self.cap.get(cv2.CAP_PROP_FOURCC))
+            self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or self.requested_fps)
+            return True
+
+        index = int(self.source)
+        if sys.platform.startswith("linux"):
+            self.cap = cv2.VideoCapture(index, cv2.CAP_V4L2)
+        if self.cap is None or not self.cap.isOpened():
+            self.cap = cv2.VideoCapture(index)
+        if not self.cap.isOpened():
+            return False
+
+        for fmt in self.formats:
+            # The format must be chosen before the size: the driver picks
+            # the sizes and rates it offers per format
+            self.cap.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fmt))
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, self.width)
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, self.height)
+            self.cap.set(cv2.CAP_PROP_FPS, self.requested_fps)
+            if _fourcc_name(self.cap.get(cv2.CAP_PROP_FOURCC)) == fmt:
+                break
+        self.fourcc = _fourcc_name(self.cap.get(cv2.CAP_PROP_FOURCC))
+        self.cap.set(cv2.CAP_PROP_BUFFERSIZE, self.buffer_size)
+        self.cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+        if self.use_raw and self.fourcc in FORMATS:
+            self.raw = bool(self.cap.set(cv2.CAP_PROP_CONVERT_RGB, 0))
+        self.frame_interval = 1.0 / (self.cap.get(cv2.CAP_PROP_FPS) or self.requested_fps)
+        return True
+
+    def describe(self):
+        w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        mode = "raw" if self.raw else "converted"
+        return (f"{self.fourcc or '?'} {w}x{h} @ {1.0 / self.frame_interval:.0f} fps, "
+                f"{mode}, buffer {self.buffer_size}")
+
+    # VideoCapture interface
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def get(self, prop):
+        return self.cap.get(prop)
+
+    def set(self, prop, value):
+        return self.cap.set(prop, value)
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+    def read(self, image=None):
+        """grab() and bgr(), like VideoCapture.read"""
+        if not self.grab():
+            return False, None
+        frame = self.bgr(image)
+        return frame is not None, frame
+
+    # Two-step capture
+
+    def grab(self):
+        """Take the next frame from the driver without decoding it"""
+        if not self.cap.grab():
+            return False
+        self._frame = self._gray = self._bgr = None
+        self.grabbed += 1
+        CAMERA_FRAMES["grab"].inc()
+        self._count_drops()
+        return True
+
+    def _retrieve(self):
+        if self._frame is None:
+            ok, frame = self.cap.retrieve()
+            self._frame = frame if ok else None
+        return self._frame
+
+    def gray(self):
+        """Luma plane of the grabbed frame (None if it cannot be decoded)"""
+        if self._gray is not None:
+            return self._gray
+        frame = self._retrieve()
+        if frame is None:
+            return None
+        CAMERA_FRAMES["gray"].inc()
+        if self.raw and self.fourcc == "YUYV":
+            # Y0 U Y1 V: every other byte is luma
+            self._gray = cv2.extractChannel(self._yuyv(frame), 0)
+        elif self.raw and self._bgr is None:
+            # libjpeg decodes only the Y component for a grayscale result
+            self._gray = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_GRAYSCALE)
+        else:
+            # Already decoded to color (for display), or a converting backend
+            source = self._bgr if self._bgr is not None else frame
+            self._gray = cv2.cvtColor(source, cv2.COLOR_BGR2GRAY)
+        return self._gray
+
+    def bgr(self, out=None):
+        """Color image of the grabbed frame, written into out if given"""
+        if self._bgr is None:
+            frame = self._retrieve()
+            if frame is None:
+                return None
+            CAMERA_FRAMES["bgr"].inc()
+            if not self.raw:
+                self._bgr = frame
+            elif self.fourcc == "YUYV":
+                self._bgr = cv2.cvtColor(self._yuyv(frame), cv2.COLOR_YUV2BGR_YUYV, dst=out)
+            else:
+                self._bgr = cv2.imdecode(frame.reshape(-1), cv2.IMREAD_COLOR)
+        if out is not None and self._bgr is not out:
+            if self._bgr.shape != out.shape:
+                return self._bgr
+            out[...] = self._bgr
+            self._bgr = out
+        return self._bgr
+
+    def _yuyv(self, frame):
+        h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+        return frame.reshape(h, w, 2)
+
+    # Statistics
+
+    def _count_drops(self):
+        now = time.monotonic()
+        stamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        if stamp <= 0:
+            stamp = now
+        if self._last_stamp is not None:
+            gap = round((stamp - self._last_stamp) / self.frame_interval) - 1
+            if gap > 0:
+                self.dropped += gap
+                CAMERA_DROPPED.inc(gap)
+        self._last_stamp = stamp
+
+        if self._window_start is None:
+            self._window_start = now
+        self._window_frames += 1
+        if now - self._window_start >= 2.0:
+            self.fps = self._window_frames / (now - self._window_start)
+            CAMERA_FPS.set(round(self.fps, 1))
+            self._window_start, self._window_frames = now, 0
+
+    def summary(self):
+        total = self.grabbed + self.dropped
+        share = self.dropped / total if total else 0.0
+        return (f"{self.grabbed} frames at {self.fps:.1f} fps, "
+                f"{self.dropped} dropped ({share:.1%})")
+
+class MotionGate:
+    """Tells whether a grayscale frame differs from the last one that passed.
+
+    threshold is the mean absolute difference (0-255) of 80x60 thumbnails.
+    At least every max_skip-th frame passes, so a slow change is not missed.
+    """
+
+    def __init__(self, threshold=3.0, size=(80, 60), max_skip=15):
+        self.threshold = threshold
+        self.size = size
+        self.max_skip = max_skip
+        self.reference = None
+        self.skipped = 0
+
+    def moved(self, gray):
+        small = cv2.resize(gray, self.size, interpolation=cv2.INTER_AREA)
+        if (self.reference is not None and self.skipped < self.max_skip
+                and cv2.absdiff(small, self.reference).mean() < self.threshold):
+            self.skipped += 1
+            MOTION_SKIPS.inc()
+            return False
+        self.reference = small
+        self.skipped = 0
+        return True
+
+def open_camera(source=0, width=640, height=480, fps=30, **kwargs):
+    """Open a Camera (None if it cannot be opened)"""
+    camera = Camera(source, width, height, fps, **kwargs)
+    if not camera.open():
+        camera.release()
+        return None
+    return camera
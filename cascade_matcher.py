@@ -0,0 +1,246 @@
+import os
+import time
+import argparse
+import numpy as np
+import cv2
+
+from lbph_features import HistogramRecognizer, chi_square_distances, chunk_rows
+
+# Two-tier LBPH matching.
+#
+# Tier one compares a small, coarse descriptor against every training
+# sample and keeps the `shortlist` people whose closest sample is nearest.
+# Tier two computes the exact LBPH distance only against the samples of
+# those people, so the reported label and distance are the ones
+# recognizer.predict() would give whenever the true nearest person makes
+# the shortlist.
+#
+# The coarse descriptor is pooled from the full histogram rather than
+# computed from a separate low-resolution image: neighbouring cells are
+# merged into a 4x4 grid and the 256 LBP codes are folded into the 59
+# "uniform pattern" bins. That is 944 values instead of 16384 per sample,
+# needs no extra training data, and works for any model (trainer.yml,
+# compact, binary).
+#
+# Tier two runs in NumPy (lbph_features.py), which is slower per sample than
+# OpenCV's predict, and a shortlist that misses the true nearest person
+# changes the match. The cascade only pays off when the shortlist is a small
+# fraction of the enrollment, so from_recognizer() keeps the OpenCV
+# recognizer for up to SHORTLIST_MIN_FACTOR * shortlist people. Check the
+# benchmark on the kiosk before turning it on.
+
+SHORTLIST_MIN_FACTOR = 10
+
+def uniform_bin_map(neighbors):
+    """Map each LBP code to its uniform-pattern bin (non-uniform codes share the last)"""
+    n_codes = 2 ** neighbors
+    mapping = np.empty(n_codes, dtype=np.int64)
+    next_bin = 0
+    for code in range(n_codes):
+        rotated = ((code >> 1) | ((code & 1) << (neighbors - 1)))
+        transitions = bin(code ^ rotated).count("1")
+        if transitions <= 2:
+            mapping[code] = next_bin
+            next_bin += 1
+        else:
+            mapping[code] = -1
+    mapping[mapping < 0] = next_bin
+    return mapping, next_bin + 1
+
+class CoarsePooling:
+    """Pools full LBPH histograms into coarse descriptors"""
+
+    def __init__(self, neighbors, grid_x, grid_y, coarse_x=4, coarse_y=4):
+        self.n_codes = 2 ** neighbors
+        self.n_cells = grid_x * grid_y
+        coarse_x, coarse_y = min(coarse_x, grid_x), min(coarse_y, grid_y)
+
+        bin_map, n_bins = uniform_bin_map(neighbors)
+        self.bin_pool = np.zeros((self.n_codes, n_bins), dtype=np.float32)
+        self.bin_pool[np.arange(self.n_codes), bin_map] = 1.0
+
+        # Each full cell goes to one coarse cell; divide by the cells merged
+        # so every coarse cell stays a normalized histogram
+        cell_pool = np.zeros((self.n_cells, coarse_x * coarse_y), dtype=np.float32)
+        for cy in range(grid_y):
+            for cx in range(grid_x):
+                target = (cy * coarse_y // grid_y) * coarse_x + cx * coarse_x // grid_x
+                cell_pool[cy * grid_x + cx, target] = 1.0
+        self.cell_pool = cell_pool / cell_pool.sum(axis=0, keepdims=True)
+        self.size = coarse_x * coarse_y * n_bins
+
+    def __call__(self, histograms):
+        hist = np.asarray(histograms, dtype=np.float32).reshape(-1, self.n_cells, self.n_codes)
+        binned = hist @ self.bin_pool                                 # (n, cells, bins)
+        pooled = np.einsum("ncb,cd->ndb", binned, self.cell_pool)     # (n, coarse cells, bins)
+        return pooled.reshape(len(hist), self.size)
+
+class CascadeRecognizer(HistogramRecognizer):
+    """HistogramRecognizer that shortlists people with a coarse tier first"""
+
+    def __init__(self, params, histograms, labels, shortlist=3, coarse_grid=(4, 4)):
+        super().__init__(params, histograms, labels)
+        self.shortlist = shortlist
+        self.pooling = CoarsePooling(self.neighbors, self.grid_x, self.grid_y, *coarse_grid)
+
+        labels = np.asarray(labels).ravel()
+        # Samples grouped by person: order[starts[i]:starts[i + 1]] are person i's rows
+        self.order = np.argsort(labels, kind="stable")
+        self.people, self.starts = np.unique(labels[self.order], return_index=True)
+        self.bounds = np.append(self.starts, len(labels))
+
+        # Built in chunks so a memory-mapped model is streamed
+        self.coarse = np.empty((len(labels), self.pooling.size), dtype=np.float32)
+        rows = chunk_rows(histograms.shape[1])
+        for start in range(0, len(labels), rows):
+            block = histograms[start:start + rows]
+            self.coarse[start:start + len(block)] = self.pooling(block)
+
+    @classmethod
+    def from_recognizer(cls, recognizer, shortlist=3, min_factor=SHORTLIST_MIN_FACTOR):
+        """Build from a cv2 LBPH recognizer or a HistogramRecognizer.
+
+        With min_factor * shortlist people or fewer, recognizer is returned
+        unchanged: the shortlist would save too little to make up for the
+        slower second tier.
+        """
+        if isinstance(recognizer, HistogramRecognizer):
+            labels = np.asarray(recognizer.labels).ravel()
+        else:
+            labels = np.asarray(recognizer.getLabels()).ravel()
+        if len(np.unique(labels)) <= min_factor * shortlist:
+            return recognizer
+
+        if isinstance(recognizer, HistogramRecognizer):
+            params = {"radius": recognizer.radius, "neighbors": recognizer.neighbors,
+                      "grid_x": recognizer.grid_x, "grid_y": recognizer.grid_y,
+                      "threshold": recognizer.threshold}
+            return cls(params, recognizer.histograms, recognizer.labels, shortlist)
+
+        params = {"radius": recognizer.getRadius(), "neighbors": recognizer.getNeighbors(),
+                  "grid_x": recognizer.getGridX(), "grid_y": recognizer.getGridY(),
+                  "threshold": recognizer.getThreshold()}
+        histograms = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()])
+        return cls(params, histograms.astype(np.float32), labels, shortlist)
+
+    def candidates(self, query):
+        """Indices (into self.people) of the shortlisted people"""
+        coarse_dists = chi_square_distances(self.coarse, self.pooling(query)[0])
+        per_person = np.minimum.reduceat(coarse_dists[self.order], self.starts)
+        k = min(self.shortlist, len(per_person))
+        return np.argpartition(per_person, k - 1)[:k]
+
+    def predict_histogram(self, query):
+        if self.shortlist <= 0 or self.shortlist >= len(self.people):
+            return super().predict_histogram(query)
+
+        rows = np.sort(np.concatenate([self.order[self.bounds[i]:self.bounds[i + 1]]
+                                       for i in self.candidates(query)]))
+        dists = chi_square_distances(self.histograms[rows], query)
+        best = int(np.argmin(dists))
+        if dists[best] >= self.threshold:
+            return -1, float(dists[best])
+        return int(self.labels[rows[best]]), float(dists[best])
+
+    def predict_batch(self, imgs):
+        if self.shortlist <= 0 or self.shortlist >= len(self.people):
+            return super().predict_batch(imgs)
+        # Shortlists differ per query, so there is nothing to share
+        return [self.predict_histogram(self.compute_histogram(img)) for img in imgs]
+
+# Benchmark
+
+def load_dataset(dataset_dir="dataset", size=(150, 150)):
+    """{name: [grayscale images]} from dataset/Name_N.jpg ({} if the folder is missing)"""
+    people = {}
+    if not os.path.isdir(dataset_dir):
+        return people
+    for filename in sorted(os.listdir(dataset_dir)):
+        if not filename.lower().endswith((".jpg", ".jpeg", ".png")):
+            continue
+        img = cv2.imread(os.path.join(dataset_dir, filename), cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        people.setdefault(filename.rsplit("_", 1)[0], []).append(cv2.resize(img, size))
+    return people
+
+def synthetic_people(people, headcount, seed=0):
+    """Pad the enrolled people up to headcount with distorted copies.
+
+    Each synthetic person is a real person's images under a fixed random
+    warp, gamma and mirror, which changes the LBP texture the way a
+    different face would. Real people are used as-is first.
+    """
+    rng = np.random.default_rng(seed)
+    names = sorted(people)
+    result = {name: people[name] for name in names[:headcount]}
+    i = 0
+    while len(result) < headcount:
+        base = people[names[i % len(names)]]
+        i += 1
+        h, w = base[0].shape
+        src = np.float32([[0, 0], [w, 0], [0, h]])
+        dst = (src + rng.uniform(-0.12, 0.12, src.shape) * [w, h]).astype(np.float32)
+        warp = cv2.getAffineTransform(src, dst)
+        gamma = rng.uniform(0.6, 1.6)
+        lut = np.clip(((np.arange(256) / 255.0) ** gamma) * 255, 0, 255).astype(np.uint8)
+        mirror = rng.random() < 0.5
+        images = []
+        for img in base:
+            out = cv2.LUT(cv2.warpAffine(img, warp, (w, h), borderMode=cv2.BORDER_REFLECT), lut)
+            images.append(cv2.flip(out, 1) if mirror else out)
+        result[f"synthetic{i}"] = images
+    return result
+
+def benchmark(dataset_dir="dataset", headcounts=(10, 50, 100, 200), shortlist=3,
+              holdout=0.2, max_queries=300):
+    people = load_dataset(dataset_dir)
+    if not people:
+        print(f"[ERROR] No images found in {dataset_dir}")
+        return
+
+    print(f"{'people':>7} {'samples':>8} {'full ms':>8} {'cascade ms':>11} {'speedup':>8} {'top-1 agree':>12}")
+    for headcount in headcounts:
+        enrolled = synthetic_people(people, headcount)
+        train_images, train_labels, queries = [], [], []
+        for label, name in enumerate(sorted(enrolled)):
+            images = enrolled[name]
+            n_test = max(1, int(len(images) * holdout))
+            train_images.extend(images[:-n_test])
+            train_labels.extend([label] * (len(images) - n_test))
+            queries.extend(images[-n_test:])
+        rng = np.random.default_rng(1)
+        if len(queries) > max_queries:
+            queries = [queries[i] for i in rng.choice(len(queries), max_queries, replace=False)]
+
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.train(train_images, np.array(train_labels, dtype=np.int32))
+        # Measured at every headcount, including those where recognition leaves it off
+        cascade = CascadeRecognizer.from_recognizer(recognizer, shortlist, min_factor=0)
+
+        start = time.perf_counter()
+        full = [recognizer.predict(q)[0] for q in queries]
+        full_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        start = time.perf_counter()
+        fast = [cascade.predict(q)[0] for q in queries]
+        cascade_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+        agree = np.mean([a == b for a, b in zip(full, fast)])
+        print(f"{headcount:>7} {len(train_images):>8} {full_ms:>8.2f} {cascade_ms:>11.2f} "
+              f"{full_ms / cascade_ms:>7.1f}x {agree:>11.1%}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Two-tier (coarse shortlist + full) LBPH matching")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("benchmark", help="speed and agreement with recognizer.predict()")
+    bench.add_argument("--dataset", default="dataset")
+    bench.add_argument("--headcounts", type=int, nargs="+", default=[10, 50, 100, 200])
+    bench.add_argument("--shortlist", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        benchmark(args.dataset, args.headcounts, args.shortlist)
+
+if __name__ == "__main__":
+    main()
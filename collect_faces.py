@@ -2,104 +2,84 @@ import cv2
 import os
 import sys
 import time
-
-def main():
-    # Check if name passed as argument
-    name = None
-    if len(sys.argv) > 2 and sys.argv[1] == "--name":
-        name = sys.argv[2].strip()
-    
-    if not name:
-        name = input("Enter students's name (no spaces NameSurname format): ").strip()
-    
-    if not name:
-        print("Name cannot be empty.")
-        return
-
-    # Make sure dataset folder exists
-    dataset_dir = "dataset"
+from frame_ring import FrameRing, frame_shape
+from face_detectors import load_detector
+from capture import open_camera
+
+BLUR_THRESHOLD = 50     # variance of the Laplacian; sharper faces score higher
+SAMPLE_SIZE = (150, 150)
+
+def enrollment_preprocess(gray, clahe):
+    """CLAHE and a light Gaussian blur, as used for enrollment samples"""
+    gray_eq = clahe.apply(gray)
+    return cv2.GaussianBlur(gray_eq, (5, 5), 0)
+
+def face_sample(gray_eq, box):
+    """The face resized to SAMPLE_SIZE, or None if it is too blurry"""
+    x, y, w, h = box
+    face_roi = gray_eq[y:y+h, x:x+w]
+    if cv2.Laplacian(face_roi, cv2.CV_64F).var() < BLUR_THRESHOLD:
+        return None
+    return cv2.resize(face_roi, SAMPLE_SIZE)
+
+def collect_samples(cap, detector, name, dataset_dir="dataset", target_count=100,
+                    stop_event=None, window_name="Collecting faces", ring=None):
+    """Capture face samples for one person from an open camera.
+
+    detector should be created with purpose="enrollment" (see
+    face_detectors.py). cap is a capture.Camera. Frames are captured into
+    ring (a private FrameRing if None); the on-screen overlay is drawn on a
+    separate canvas. Returns (collected, skipped_blurry). The caller owns
+    the camera.
+    """
     os.makedirs(dataset_dir, exist_ok=True)
-
-    # Load Haar cascade
-    cascade_path = "haarcascade_frontalface_default.xml"
-    face_cascade = cv2.CascadeClassifier(cascade_path)
-
-    # Open camera
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("Could not open camera.")
-        return
-    
-    # Optimize camera settings
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-
-    # Give user time to setup
-    print(f"Collecting faces for: {name}")
-    print("Position yourself in front of the camera.")
-    print("Tips: Good lighting, face the camera directly, vary expressions slightly")
-    print("Starting in 5 seconds...")
-    
-    for i in range(5, 0, -1):
-        print(f"{i}...")
-        time.sleep(1)
-    
-    print("Starting collection now!")
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    own_ring = ring is None
+    if own_ring:
+        ring = FrameRing(frame_shape(cap))
 
     count = 0
-    target_count = 100
     frame_skip = 0
     skipped_blurry = 0
+    canvas = None
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
+    while stop_event is None or not stop_event.is_set():
+        seq = ring.capture(cap)
+        if not seq:
             print("Failed to grab frame")
             break
-
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        frame = ring.get(seq)
+        if canvas is None or canvas.shape != frame.shape:
+            canvas = frame.copy()
+        else:
+            canvas[...] = frame
+
+        # Luma straight from the camera buffer where the format allows
+        gray = cap.gray()
+        if gray is None:
+            print("Failed to decode frame")
+            break
         
         # Use CLAHE for better preprocessing
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        gray_eq = clahe.apply(gray)
-        gray_eq = cv2.GaussianBlur(gray_eq, (5, 5), 0)
-
-        # Multi-scale detection
-        faces = face_cascade.detectMultiScale(
-            gray_eq,
-            scaleFactor=1.05,
-            minNeighbors=5,
-            minSize=(100, 100)
-        )
-        
-        if len(faces) == 0:
-            faces = face_cascade.detectMultiScale(
-                gray_eq,
-                scaleFactor=1.1,
-                minNeighbors=4,
-                minSize=(80, 80)
-            )
+        gray_eq = enrollment_preprocess(gray, clahe)
+
+        # Multi-scale detection (relaxed second pass if nothing is found)
+        faces = detector.detect(gray_eq)
 
         for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), (0, 255, 0), 2)
+            cv2.rectangle(canvas, (x, y), (x + w, y + h), (0, 255, 0), 2)
 
             frame_skip += 1
             if frame_skip % 3 != 0:
                 continue
 
-            face_roi = gray_eq[y:y+h, x:x+w]
-            
             # Check face quality before saving
-            laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-            
-            if laplacian_var < 50:
+            face_roi = face_sample(gray_eq, (x, y, w, h))
+            if face_roi is None:
                 skipped_blurry += 1
-                cv2.putText(frame, "Too blurry - hold still", (x, y-10),
+                cv2.putText(canvas, "Too blurry - hold still", (x, y-10),
                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
                 continue
-            
-            face_roi = cv2.resize(face_roi, (150, 150))
 
             count += 1
             filename = os.path.join(dataset_dir, f"{name}_{count}.jpg")
@@ -107,21 +87,69 @@ def main():
 
         # Progress bar
         progress = int((count / target_count) * 100)
-        cv2.putText(frame, f"Progress: {progress}% ({count}/{target_count})", (10, 30),
+        cv2.putText(canvas, f"Progress: {progress}% ({count}/{target_count})", (10, 30),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 255, 0), 2)
         
-        cv2.putText(frame, f"Skipped blurry: {skipped_blurry}", (10, 60),
+        cv2.putText(canvas, f"Skipped blurry: {skipped_blurry}", (10, 60),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 0), 1)
         
-        cv2.putText(frame, "Press 'q' to stop early", (10, 90),
+        cv2.putText(canvas, "Press 'q' to stop early", (10, 90),
                     cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
 
-        cv2.imshow("Collecting faces", frame)
+        cv2.imshow(window_name, canvas)
 
         key = cv2.waitKey(1) & 0xFF
         if key == ord('q') or count >= target_count:
             break
 
+    cv2.destroyWindow(window_name)
+    frame = None
+    if own_ring:
+        ring.close()
+    return count, skipped_blurry
+
+def main():
+    # Check if name passed as argument
+    name = None
+    if len(sys.argv) > 2 and sys.argv[1] == "--name":
+        name = sys.argv[2].strip()
+    
+    if not name:
+        name = input("Enter students's name (no spaces NameSurname format): ").strip()
+    
+    if not name:
+        print("Name cannot be empty.")
+        return
+
+    # Make sure dataset folder exists
+    dataset_dir = "dataset"
+    os.makedirs(dataset_dir, exist_ok=True)
+
+    # Load the configured face detector (attendance_config.json)
+    detector = load_detector(purpose="enrollment")
+    if detector is None:
+        return
+
+    # Open camera
+    cap = open_camera(0, 640, 480, 30)
+    if cap is None:
+        print("Could not open camera.")
+        return
+
+    # Give user time to setup
+    print(f"Collecting faces for: {name}")
+    print("Position yourself in front of the camera.")
+    print("Tips: Good lighting, face the camera directly, vary expressions slightly")
+    print("Starting in 5 seconds...")
+    
+    for i in range(5, 0, -1):
+        print(f"{i}...")
+        time.sleep(1)
+    
+    print("Starting collection now!")
+
+    count, skipped_blurry = collect_samples(cap, detector, name, dataset_dir)
+
     cap.release()
     cv2.destroyAllWindows()
     print(f"Done. Collected {count} images for {name} (skipped {skipped_blurry} blurry images).")
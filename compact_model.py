@@ -0,0 +1,186 @@
+import os
+import sys
+import time
+import random
+import cv2
+import numpy as np
+from train_lbph import augment_image
+
+# LBPH stores one histogram per training sample. This tool clusters each
+# person's histograms into k prototypes and writes a much smaller model in the
+# same trainer.yml format, so cv2.face.LBPHFaceRecognizer can read it as-is.
+
+COMPACT_MODEL_PATH = "trainer_compact.yml"
+
+def get_model_params(recognizer):
+    """Return the LBPH parameters needed to write a compatible model"""
+    return {
+        "radius": recognizer.getRadius(),
+        "neighbors": recognizer.getNeighbors(),
+        "grid_x": recognizer.getGridX(),
+        "grid_y": recognizer.getGridY(),
+        "threshold": recognizer.getThreshold(),
+    }
+
+def load_model_histograms(path="trainer.yml"):
+    """Load an LBPH model and return (params, histograms, labels)"""
+    recognizer = cv2.face.LBPHFaceRecognizer_create()
+    recognizer.read(path)
+    histograms = np.vstack([h.reshape(1, -1) for h in recognizer.getHistograms()]).astype(np.float32)
+    labels = np.asarray(recognizer.getLabels()).reshape(-1).astype(np.int32)
+    return get_model_params(recognizer), histograms, labels
+
+def compact_histograms(histograms, labels, k=5, attempts=3):
+    """Cluster each person's histograms into at most k prototypes.
+
+    Prototypes are k-means centroids. Persons with k or fewer samples keep
+    their original histograms.
+    """
+    proto_hists = []
+    proto_labels = []
+    criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 50, 1e-4)
+
+    for label in np.unique(labels):
+        person = histograms[labels == label]
+        if len(person) <= k:
+            centers = person
+        else:
+            _, _, centers = cv2.kmeans(person, k, None, criteria, attempts, cv2.KMEANS_PP_CENTERS)
+        proto_hists.append(centers.astype(np.float32))
+        proto_labels.extend([int(label)] * len(centers))
+
+    return np.vstack(proto_hists), np.array(proto_labels, dtype=np.int32)
+
+def write_lbph_model(path, params, histograms, labels, base64=False):
+    """Write histograms in the layout produced by LBPHFaceRecognizer.write().
+
+    With base64=True the matrices are stored as base64 raw data, which
+    recognizer.read() loads without parsing each number.
+    """
+    flags = cv2.FILE_STORAGE_WRITE | (cv2.FILE_STORAGE_BASE64 if base64 else 0)
+    fs = cv2.FileStorage(path, flags)
+    fs.startWriteStruct("opencv_lbphfaces", cv2.FileNode_MAP)
+    fs.write("format", 3)
+    fs.write("threshold", float(params["threshold"]))
+    fs.write("radius", int(params["radius"]))
+    fs.write("neighbors", int(params["neighbors"]))
+    fs.write("grid_x", int(params["grid_x"]))
+    fs.write("grid_y", int(params["grid_y"]))
+
+    fs.startWriteStruct("histograms", cv2.FileNode_SEQ)
+    for hist in histograms:
+        fs.write("", hist.reshape(1, -1))
+    fs.endWriteStruct()
+
+    fs.write("labels", np.asarray(labels, dtype=np.int32).reshape(-1, 1))
+    fs.startWriteStruct("labelsInfo", cv2.FileNode_SEQ)
+    fs.endWriteStruct()
+    fs.endWriteStruct()
+    fs.release()
+
+def split_dataset(dataset_dir="dataset", test_fraction=0.2, seed=0):
+    """Split dataset image paths per person into train and held-out lists"""
+    per_person = {}
+    for f in sorted(os.listdir(dataset_dir)):
+        if not f.lower().endswith((".jpg", ".png", ".jpeg")) or "_" not in f:
+            continue
+        per_person.setdefault(f.split("_")[0], []).append(os.path.join(dataset_dir, f))
+
+    rng = random.Random(seed)
+    train, test = [], []
+    for label, paths in per_person.items():
+        rng.shuffle(paths)
+        n_test = max(1, int(len(paths) * test_fraction)) if len(paths) > 1 else 0
+        test.extend((p, label) for p in paths[:n_test])
+        train.extend((p, label) for p in paths[n_test:])
+    return train, test
+
+def load_split(samples, label_to_id, augment=True):
+    """Load (path, label) samples as 150x150 grayscale images"""
+    images, ids = [], []
+    for path, label in samples:
+        img = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            continue
+        img = cv2.resize(img, (150, 150))
+        variants = augment_image(img) if augment else [img]
+        for v in variants:
+            images.append(v)
+            ids.append(label_to_id[label])
+    return images, np.array(ids)
+
+def evaluate(recognizer, images, ids):
+    """Return (accuracy, mean predict time in ms)"""
+    correct = 0
+    start = time.perf_counter()
+    for img, true_id in zip(images, ids):
+        label_id, _ = recognizer.predict(img)
+        if label_id == true_id:
+            correct += 1
+    elapsed = time.perf_counter() - start
+    n = max(len(images), 1)
+    return correct / n, elapsed * 1000 / n
+
+def holdout_report(dataset_dir="dataset", k=5, test_fraction=0.2):
+    """Train on a split, compact, and compare accuracy on the held-out images"""
+    train, test = split_dataset(dataset_dir, test_fraction)
+    if not train or not test:
+        print("Not enough images for a held-out split.")
+        return None
+
+    label_to_id = {label: i for i, label in enumerate(sorted({l for _, l in train}))}
+    test = [(p, l) for p, l in test if l in label_to_id]
+    train_imgs, train_ids = load_split(train, label_to_id, augment=True)
+    test_imgs, test_ids = load_split(test, label_to_id, augment=False)
+
+    full = cv2.face.LBPHFaceRecognizer_create(radius=2, neighbors=8, grid_x=8, grid_y=8)
+    full.train(train_imgs, train_ids)
+
+    params = get_model_params(full)
+    histograms = np.vstack([h.reshape(1, -1) for h in full.getHistograms()]).astype(np.float32)
+    labels = np.asarray(full.getLabels()).reshape(-1).astype(np.int32)
+    proto_hists, proto_labels = compact_histograms(histograms, labels, k)
+
+    tmp_path = "trainer_holdout_compact.yml"
+    write_lbph_model(tmp_path, params, proto_hists, proto_labels)
+    compact = cv2.face.LBPHFaceRecognizer_create()
+    compact.read(tmp_path)
+    os.remove(tmp_path)
+
+    full_acc, full_ms = evaluate(full, test_imgs, test_ids)
+    compact_acc, compact_ms = evaluate(compact, test_imgs, test_ids)
+
+    print(f"Held-out images: {len(test_imgs)} ({len(label_to_id)} people)")
+    print(f"Full model:    {len(histograms):6d} histograms  acc={full_acc:.3f}  predict={full_ms:.2f} ms")
+    print(f"Compact model: {len(proto_hists):6d} histograms  acc={compact_acc:.3f}  predict={compact_ms:.2f} ms")
+    print(f"Accuracy loss: {(full_acc - compact_acc) * 100:.2f} percentage points")
+    return {"full_acc": full_acc, "compact_acc": compact_acc,
+            "full_ms": full_ms, "compact_ms": compact_ms}
+
+def compact_model(model_path="trainer.yml", output_path=COMPACT_MODEL_PATH, k=5):
+    """Compact an existing trained model and write it to output_path"""
+    params, histograms, labels = load_model_histograms(model_path)
+    proto_hists, proto_labels = compact_histograms(histograms, labels, k)
+    write_lbph_model(output_path, params, proto_hists, proto_labels)
+
+    full_size = os.path.getsize(model_path) / 1e6
+    compact_size = os.path.getsize(output_path) / 1e6
+    print(f"Compacted {len(histograms)} histograms into {len(proto_hists)} prototypes "
+          f"(k={k} per person)")
+    print(f"Saved compact model to {output_path} ({full_size:.1f} MB -> {compact_size:.1f} MB)")
+
+def main():
+    k = 5
+    if len(sys.argv) > 2 and sys.argv[1] == "--k":
+        k = int(sys.argv[2])
+
+    if not os.path.exists("trainer.yml"):
+        print("trainer.yml not found. Run train_lbph.py first.")
+        return
+
+    if os.path.exists("dataset"):
+        holdout_report("dataset", k)
+    compact_model("trainer.yml", COMPACT_MODEL_PATH, k)
+
+if __name__ == "__main__":
+    main()
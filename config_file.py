@@ -0,0 +1,7 @@
+# Location of attendance_config.json.
+#
+# Kept in a module of its own, without dependencies, so that modules which
+# only read their section of the file (presence.py, zones.py, train_lbph.py)
+# can be imported, and tested, without OpenCV.
+
+CONFIG_PATH = "attendance_config.json"
@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import argparse
+import cv2
+
+import metrics
+from config_file import CONFIG_PATH
+from profiler import PROFILER
+from temporal_voting import iou
+from startup_cache import cached_cascade
+
+# Interchangeable face detector backends. Every backend has the same
+# contract: detect(gray) -> list of (x, y, w, h) boxes on a grayscale frame.
+#
+#   haar  haarcascade_frontalface_default.xml (the original detector)
+#   lbp   lbpcascade_frontalface_improved.xml; integer features, several
+#         times faster than Haar on ARM boards at a small cost in recall
+#   dnn   YuNet, a small CPU face detection network (OpenCV >= 4.5.4,
+#         cv2.FaceDetectorYN), loaded from a local .onnx file
+#
+# The backend comes from the "detector" section of attendance_config.json
+# and can be overridden on the command line (--detector). Cascade backends
+# run a standard pass and, if nothing is found, a relaxed second pass;
+# enrollment uses stricter passes so fewer false crops reach the dataset.
+#
+#   python face_detectors.py benchmark recording.mp4
+#
+# compares the backends' speed and recall on recorded footage.
+
+BACKENDS = ("haar", "lbp", "dnn")
+DEFAULT_MODELS = {
+    "haar": "haarcascade_frontalface_default.xml",
+    "lbp": "lbpcascade_frontalface_improved.xml",
+    "dnn": os.path.join("models", "face_detection_yunet_2023mar.onnx"),
+}
+DOWNLOAD_URLS = {
+    "haar": "https://raw.githubusercontent.com/opencv/opencv/master/data/haarcascades/"
+            "haarcascade_frontalface_default.xml",
+    "lbp": "https://raw.githubusercontent.com/opencv/opencv/master/data/lbpcascades/"
+           "lbpcascade_frontalface_improved.xml",
+    "dnn": "https://github.com/opencv/opencv_zoo/raw/main/models/face_detection_yunet/"
+           "face_detection_yunet_2023mar.onnx",
+}
+
+# detectMultiScale parameters per pass: (scaleFactor, minNeighbors, minSize, maxSize)
+RECOGNITION_PASSES = ((1.05, 4, (100, 100), (400, 400)),
+                      (1.1, 3, (80, 80), (500, 500)))
+ENROLLMENT_PASSES = ((1.05, 5, (100, 100), (0, 0)),
+                     (1.1, 4, (80, 80), (0, 0)))
+
+DETECTIONS = metrics.counter("attendance_detection_passes_total", "Face detector passes")
+P_DETECT = (PROFILER.stage("detect_pass1"), PROFILER.stage("detect_pass2"))
+
+class CascadeDetector:
+    """Haar or LBP cascade via cv2.CascadeClassifier"""
+
+    def __init__(self, path, passes=RECOGNITION_PASSES, name="haar", use_cache=True):
+        self.name = name
+        self.path = path
+        # The minified copy from the startup cache parses about twice as fast
+        cached = cached_cascade(path) if use_cache else path
+        self.cascade = cv2.CascadeClassifier(cached)
+        if self.cascade.empty() and cached != path:
+            self.cascade = cv2.CascadeClassifier(path)
+        if self.cascade.empty():
+            raise ValueError(f"Could not load cascade {path}")
+        self.passes = passes
+
+    def detect(self, gray):
+        for stage, (scale, neighbors, min_size, max_size) in zip(P_DETECT, self.passes):
+            DETECTIONS.inc()
+            with stage:
+                faces = self.cascade.detectMultiScale(gray, scaleFactor=scale,
+                                                      minNeighbors=neighbors,
+                                                      minSize=min_size, maxSize=max_size)
+            if len(faces):
+                return [tuple(int(v) for v in f) for f in faces]
+        return []
+
+class DNNDetector:
+    """YuNet face detection network via cv2.FaceDetectorYN"""
+
+    def __init__(self, path, score_threshold=0.8, nms_threshold=0.3, min_size=80):
+        if not hasattr(cv2, "FaceDetectorYN"):
+            raise ValueError("The dnn detector needs OpenCV 4.5.4 or newer")
+        self.name = "dnn"
+        self.path = path
+        self.detector = cv2.FaceDetectorYN.create(path, "", (320, 320),
+                                                  score_threshold, nms_threshold)
+        self.min_size = min_size
+        self.input_size = None
+
+    def detect(self, gray):
+        h, w = gray.shape[:2]
+        if self.input_size != (w, h):
+            self.detector.setInputSize((w, h))
+            self.input_size = (w, h)
+        DETECTIONS.inc()
+        with P_DETECT[0]:
+            _, faces = self.detector.detect(cv2.cvtColor(gray, cv2.COLOR_GRAY2BGR))
+        if faces is None:
+            return []
+        boxes = []
+        for face in faces:
+            x, y, bw, bh = (int(round(v)) for v in face[:4])
+            x, y = max(x, 0), max(y, 0)
+            bw, bh = min(bw, w - x), min(bh, h - y)
+            if min(bw, bh) >= self.min_size:
+                boxes.append((x, y, bw, bh))
+        return boxes
+
+def load_config(path=CONFIG_PATH):
+    """The "detector" section of attendance_config.json ({} if absent)"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return json.load(f).get("detector", {})
+
+def create_detector(backend=None, model=None, purpose="recognition", config=None,
+                    use_cache=True):
+    """Build the configured detector; backend/model override the config.
+
+    purpose is "recognition" or "enrollment" (stricter cascade passes).
+    Cascades are loaded through the startup cache unless use_cache is False.
+    Raises ValueError if the backend is unknown or its model cannot be loaded.
+    """
+    config = load_config() if config is None else config
+    configured = config.get("backend", "haar")
+    backend = backend or configured
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown detector backend {backend!r} (choose from {', '.join(BACKENDS)})")
+    if backend != configured:
+        # The config's model and thresholds belong to another backend
+        config = {}
+    model = model or config.get("model") or DEFAULT_MODELS[backend]
+    if not os.path.exists(model):
+        raise ValueError(f"Detector model {model} not found. Download it with:\n"
+                         f"  wget -O {model} {DOWNLOAD_URLS[backend]}")
+
+    if backend == "dnn":
+        return DNNDetector(model, config.get("score_threshold", 0.8),
+                           config.get("nms_threshold", 0.3), config.get("min_size", 80))
+    passes = ENROLLMENT_PASSES if purpose == "enrollment" else RECOGNITION_PASSES
+    return CascadeDetector(model, passes, backend, use_cache)
+
+def load_detector(backend=None, model=None, purpose="recognition", use_cache=True):
+    """create_detector() that prints the outcome; None on failure"""
+    try:
+        detector = create_detector(backend, model, purpose, use_cache=use_cache)
+    except ValueError as e:
+        print(f"[ERROR] {e}")
+        return None
+    print(f"[OK] Face detector: {detector.name} ({detector.path})")
+    return detector
+
+# Benchmark
+
+def load_annotations(path):
+    """{frame index: [(x, y, w, h), ...]} from a JSON file"""
+    with open(path, "r") as f:
+        return {int(k): [tuple(b) for b in v] for k, v in json.load(f).items()}
+
+def match_boxes(truth, found, min_iou=0.3):
+    """Number of truth boxes matched by a found box (each used once)"""
+    unused = list(found)
+    matched = 0
+    for box in truth:
+        best = max(unused, key=lambda f: iou(box, f), default=None)
+        if best is not None and iou(box, best) >= min_iou:
+            unused.remove(best)
+            matched += 1
+    return matched
+
+def benchmark(video_path, backends=BACKENDS, annotations=None, reference="dnn",
+              every=1, max_frames=500):
+    """Time each backend on the same frames and measure recall.
+
+    Recall is against annotations (from load_annotations) when given, else
+    against the reference backend's detections.
+    """
+    from recognize_attendance import preprocess
+
+    detectors = {}
+    for backend in backends:
+        try:
+            detectors[backend] = create_detector(backend, config={})
+        except ValueError as e:
+            print(f"[WARNING] Skipping {backend}: {e}")
+    if annotations is None and reference not in detectors:
+        print(f"[ERROR] Reference backend {reference} is not available; pass --annotations")
+        return
+
+    cap = cv2.VideoCapture(video_path)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    frames = []
+    index = 0
+    while len(frames) < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        if index % every == 0 and (annotations is None or index in annotations):
+            frames.append((index, preprocess(frame, clahe)))
+        index += 1
+    cap.release()
+    if not frames:
+        print(f"[ERROR] No frames read from {video_path}")
+        return
+
+    results = {}
+    for backend, detector in detectors.items():
+        detector.detect(frames[0][1])  # warm-up
+        boxes = {}
+        start = time.perf_counter()
+        for i, gray in frames:
+            boxes[i] = detector.detect(gray)
+        results[backend] = ((time.perf_counter() - start) / len(frames), boxes)
+
+    truth = annotations if annotations is not None else results[reference][1]
+    total = sum(len(truth.get(i, ())) for i, _ in frames)
+    source = "annotations" if annotations is not None else f"{reference} detections"
+    print(f"{len(frames)} frames, {total} faces in {source}")
+    print(f"{'backend':<8} {'ms/frame':>9} {'FPS':>7} {'recall':>7} {'extra/frame':>12}")
+    for backend, (seconds, boxes) in results.items():
+        matched = sum(match_boxes(truth.get(i, ()), boxes[i]) for i, _ in frames)
+        found = sum(len(boxes[i]) for i, _ in frames)
+        recall = matched / total if total else 0.0
+        print(f"{backend:<8} {seconds * 1000:>9.2f} {1 / seconds:>7.1f} {recall:>6.1%} "
+              f"{(found - matched) / len(frames):>12.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    bench = sub.add_parser("benchmark", help="speed and recall on recorded footage")
+    bench.add_argument("video")
+    bench.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    bench.add_argument("--annotations", help="JSON {frame index: [[x, y, w, h], ...]}")
+    bench.add_argument("--reference", choices=BACKENDS, default="dnn",
+                       help="backend treated as ground truth without --annotations")
+    bench.add_argument("--every", type=int, default=1, help="use every Nth frame")
+    bench.add_argument("--max-frames", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.command == "benchmark":
+        if not os.path.exists(args.video):
+            print(f"[ERROR] Video not found: {args.video}")
+            sys.exit(1)
+        annotations = load_annotations(args.annotations) if args.annotations else None
+        benchmark(args.video, args.backends, annotations, args.reference,
+                  args.every, args.max_frames)
+
+if __name__ == "__main__":
+    main()
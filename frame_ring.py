@@ -0,0 +1,190 @@
+import sys
+import time
+import numpy as np
+from multiprocessing import shared_memory, resource_tracker
+
+# Fixed-size ring of preallocated frame slots in shared memory.
+#
+# One producer (the capture loop) writes frames straight into the slots;
+# any number of consumers, in this or other processes, read them as NumPy
+# views without copying. Every frame gets a sequence number (1, 2, ...) and
+# lives in slot seq % slots until the producer comes round again.
+#
+# Layout: a header of int64 fields, one int64 sequence number per slot, then
+# the frame data. The producer marks a slot invalid (0) before writing into
+# it and publishes the new sequence number when done. A consumer that holds
+# a view while the producer may lap it can call is_valid(seq) after it has
+# finished with the frame: if it is still True, the data was not overwritten.
+
+_MAGIC = 0x474E495246525441  # "ATRFRING"
+_HEADER_FIELDS = 8           # magic, slots, height, width, channels, head, 2 reserved
+_HEAD = 5
+_DATA_ALIGN = 64
+
+def _attach_untracked(name):
+    """Open an existing segment without handing it to the resource tracker.
+
+    Only the creating process may unlink the ring. Unregistering after the
+    fact is not enough: spawned children share the parent's tracker, so
+    that would drop the creator's registration as well.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+class FrameRing:
+    """Shared-memory frame ring buffer (single producer, many consumers)"""
+
+    def __init__(self, shape=(480, 640, 3), slots=8, name=None, _attach=False):
+        self.owner = not _attach
+        if _attach:
+            self.shm = _attach_untracked(name)
+            header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+            if header[0] != _MAGIC:
+                self.shm.close()
+                raise ValueError(f"{name} is not a frame ring")
+            slots = int(header[1])
+            shape = tuple(int(v) for v in header[2:5] if v)
+        else:
+            shape = tuple(shape)
+            size = self._data_offset(slots) + slots * int(np.prod(shape))
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+
+        self.shape = shape
+        self.n_slots = slots
+        self.header = np.ndarray((_HEADER_FIELDS,), dtype=np.int64, buffer=self.shm.buf)
+        self.slot_seq = np.ndarray((slots,), dtype=np.int64, buffer=self.shm.buf,
+                                   offset=_HEADER_FIELDS * 8)
+        self.frames = np.ndarray((slots,) + shape, dtype=np.uint8, buffer=self.shm.buf,
+                                 offset=self._data_offset(slots))
+
+        if self.owner:
+            self.slot_seq[:] = 0
+            self.header[:] = 0
+            self.header[1] = slots
+            self.header[2:2 + len(shape)] = shape
+            self.header[0] = _MAGIC
+
+        # Views are created once; reading a frame allocates nothing
+        self._write_views = [self.frames[i] for i in range(slots)]
+        self._read_views = []
+        for i in range(slots):
+            view = self.frames[i].view()
+            view.flags.writeable = False
+            self._read_views.append(view)
+
+    @staticmethod
+    def _data_offset(slots):
+        offset = (_HEADER_FIELDS + slots) * 8
+        return (offset + _DATA_ALIGN - 1) // _DATA_ALIGN * _DATA_ALIGN
+
+    @classmethod
+    def attach(cls, name):
+        """Open an existing ring created by another process"""
+        return cls(name=name, _attach=True)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    @property
+    def head(self):
+        """Sequence number of the newest complete frame (0 before the first)"""
+        return int(self.header[_HEAD])
+
+    # Producer side
+
+    def begin_write(self):
+        """Claim the next slot; returns (seq, writable view). Call commit(seq) when done."""
+        seq = self.head + 1
+        slot = seq % self.n_slots
+        self.slot_seq[slot] = 0
+        return seq, self._write_views[slot]
+
+    def commit(self, seq):
+        self.slot_seq[seq % self.n_slots] = seq
+        self.header[_HEAD] = seq
+
+    def write(self, frame):
+        """Copy a frame into the ring (for sources that cannot decode in place)"""
+        seq, view = self.begin_write()
+        view[...] = frame
+        self.commit(seq)
+        return seq
+
+    def capture(self, cap):
+        """Read the next frame from cap directly into the ring.
+
+        Returns its sequence number, or 0 if no frame could be read.
+        """
+        seq, view = self.begin_write()
+        ret, frame = cap.read(view)
+        if not ret or frame is None:
+            return 0
+        if frame.ctypes.data != view.ctypes.data:
+            # The backend allocated its own buffer (e.g. size or type mismatch)
+            if frame.shape != view.shape:
+                print(f"[ERROR] Frame size {frame.shape} does not match ring {view.shape}")
+                return 0
+            view[...] = frame
+        self.commit(seq)
+        return seq
+
+    # Consumer side
+
+    def get(self, seq):
+        """Read-only view of frame seq, or None if it was overwritten or not yet written"""
+        if seq <= 0 or self.slot_seq[seq % self.n_slots] != seq:
+            return None
+        return self._read_views[seq % self.n_slots]
+
+    def latest(self):
+        """(seq, read-only view) of the newest frame, or (0, None)"""
+        seq = self.head
+        frame = self.get(seq)
+        if frame is None:
+            return 0, None
+        return seq, frame
+
+    def wait_newer(self, seq, timeout=1.0, interval=0.002):
+        """Wait for a frame newer than seq; returns latest(), or (0, None) on timeout"""
+        deadline = time.monotonic() + timeout
+        while self.head <= seq:
+            if time.monotonic() >= deadline:
+                return 0, None
+            time.sleep(interval)
+        return self.latest()
+
+    def is_valid(self, seq):
+        """True if frame seq is still in the ring unmodified"""
+        return self.slot_seq[seq % self.n_slots] == seq
+
+    def close(self):
+        self._write_views = self._read_views = []
+        self.header = self.slot_seq = self.frames = None
+        if self.owner:
+            self.shm.unlink()
+        try:
+            self.shm.close()
+        except BufferError:
+            # A consumer still holds a frame view; the mapping goes away with it
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+def frame_shape(cap):
+    """(height, width, 3) of the frames cap delivers"""
+    import cv2
+    w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) or 640
+    h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)) or 480
+    return (h, w, 3)
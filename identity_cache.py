@@ -0,0 +1,198 @@
+import time
+import cv2
+import numpy as np
+
+import metrics
+from temporal_voting import iou
+
+# Per-track cache of recognition results.
+#
+# A face that keeps getting the same confident prediction does not need a
+# recognizer.predict() every other frame. Once a track has been identified
+# `confirmations` times in a row below `confident_distance`, later lookups
+# return the cached name without calling predict. predict runs again to
+# re-verify the entry when its TTL has expired and on every
+# `verify_every`-th hit; a re-verification that disagrees drops the entry.
+# The entry is also dropped when
+#
+#   - the box jumps (moves or resizes too much between lookups),
+#   - the face's appearance hash drifts too far from the verified one, or
+#   - the track is lost (not matched for `max_missed` frames).
+#
+# The appearance hash is a 64-bit difference hash of the face region, far
+# cheaper than predict.
+
+CACHE_LOOKUPS = {result: metrics.counter("attendance_identity_cache_total",
+                                         "Identity cache lookups by result",
+                                         {"result": result})
+                 for result in ("hit", "miss", "verify")}
+CACHE_HIT_RATIO = metrics.gauge("attendance_identity_cache_hit_ratio",
+                                "Share of recognitions answered from the identity cache")
+CACHE_INVALIDATIONS = {reason: metrics.counter("attendance_identity_cache_invalidations_total",
+                                               "Identity cache entries dropped, by reason",
+                                               {"reason": reason})
+                       for reason in ("jump", "appearance", "lost", "disagree", "model")}
+
+def appearance_hash(face_roi):
+    """64-bit difference hash of a grayscale face region"""
+    small = cv2.resize(face_roi, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+class _Entry:
+    __slots__ = ("box", "name", "distance", "streak", "confirmed", "verified_at",
+                 "hash", "last_seen", "hits")
+
+    def __init__(self, box, frame_id):
+        self.box = box
+        self.name = None
+        self.distance = 0.0
+        self.streak = 0
+        self.confirmed = False
+        self.verified_at = 0.0
+        self.hash = 0
+        self.last_seen = frame_id
+        self.hits = 0
+
+class IdentityCache:
+    """Caches the identity of tracked faces between recognizer calls.
+
+    ttl is in seconds (0 disables the cache); clock returns seconds and
+    defaults to time.monotonic.
+    """
+
+    def __init__(self, ttl=10.0, verify_every=10, confirmations=2, confident_distance=55,
+                 max_jump=0.25, max_hash_distance=12, match_iou=0.3, max_missed=30,
+                 clock=time.monotonic):
+        self.ttl = ttl
+        self.verify_every = verify_every
+        self.confirmations = confirmations
+        self.confident_distance = confident_distance
+        self.max_jump = max_jump
+        self.max_hash_distance = max_hash_distance
+        self.match_iou = match_iou
+        self.max_missed = max_missed
+        self.clock = clock
+        self.entries = []
+        self._pending = None
+        self.recognizer = None
+        self.hits = 0
+        self.lookups = 0
+
+    def bind(self, recognizer):
+        """Drop all entries when the model has been swapped"""
+        if recognizer is not self.recognizer:
+            if self.recognizer is not None and self.entries:
+                CACHE_INVALIDATIONS["model"].inc(len(self.entries))
+            self.entries = []
+            self.recognizer = recognizer
+
+    def _invalidate(self, entry, reason):
+        if entry.confirmed:
+            CACHE_INVALIDATIONS[reason].inc()
+        entry.confirmed = False
+        entry.streak = 0
+        entry.name = None
+
+    def _jumped(self, old, new):
+        ox, oy, ow, oh = old
+        nx, ny, nw, nh = new
+        shift = max(abs((nx + nw / 2) - (ox + ow / 2)), abs((ny + nh / 2) - (oy + oh / 2)))
+        scale = max(nw * nh, ow * oh) / float(max(min(nw * nh, ow * oh), 1))
+        return shift > self.max_jump * ow or scale > (1 + self.max_jump) ** 2
+
+    def expire(self, frame_id):
+        """Forget tracks that have not been looked up for max_missed frames"""
+        kept = []
+        for entry in self.entries:
+            if frame_id - entry.last_seen >= self.max_missed:
+                if entry.confirmed:
+                    CACHE_INVALIDATIONS["lost"].inc()
+            else:
+                kept.append(entry)
+        self.entries = kept
+
+    def lookup(self, frame_id, box, face_roi):
+        """Return (name, distance) for the face at box, or None if predict must run.
+
+        After a None, call store() with the predict result.
+        """
+        self.expire(frame_id)
+        self.lookups += 1
+        entry = self._match(box)
+        if entry is None:
+            entry = _Entry(box, frame_id)
+            self.entries.append(entry)
+            self._pending = (entry, None)
+            return self._miss("miss")
+
+        jumped = self._jumped(entry.box, box)
+        entry.box = box
+        entry.last_seen = frame_id
+        if not entry.confirmed or self.ttl <= 0:
+            self._pending = (entry, None)
+            return self._miss("miss")
+
+        face_hash = appearance_hash(face_roi)
+        if jumped:
+            self._invalidate(entry, "jump")
+        elif hamming(face_hash, entry.hash) > self.max_hash_distance:
+            self._invalidate(entry, "appearance")
+        else:
+            entry.hits += 1
+            if (entry.hits % self.verify_every == 0
+                    or self.clock() - entry.verified_at > self.ttl):
+                self._pending = (entry, face_hash)
+                return self._miss("verify")
+            self.hits += 1
+            CACHE_LOOKUPS["hit"].inc()
+            CACHE_HIT_RATIO.set(round(self.hits / self.lookups, 3))
+            return entry.name, entry.distance
+
+        self._pending = (entry, None)
+        return self._miss("miss")
+
+    def _miss(self, result):
+        CACHE_LOOKUPS[result].inc()
+        CACHE_HIT_RATIO.set(round(self.hits / self.lookups, 3))
+        return None
+
+    def store(self, name, distance, face_roi):
+        """Record the predict result for the face of the last missed lookup"""
+        entry, face_hash = self._pending
+        self._pending = None
+        confident = name != "Unknown" and distance < self.confident_distance
+
+        if entry.confirmed:
+            # Re-verification of a cached identity
+            if confident and name == entry.name:
+                entry.verified_at = self.clock()
+                entry.hash = face_hash
+                entry.distance = distance
+                entry.hits = 0
+            else:
+                self._invalidate(entry, "disagree")
+            return
+
+        if confident and name == entry.name:
+            entry.streak += 1
+        else:
+            entry.streak = 1 if confident else 0
+        entry.name = name
+        entry.distance = distance
+        if entry.streak >= self.confirmations and self.ttl > 0:
+            entry.confirmed = True
+            entry.hits = 0
+            entry.verified_at = self.clock()
+            entry.hash = appearance_hash(face_roi)
+
+    def _match(self, box):
+        best, best_iou = None, self.match_iou
+        for entry in self.entries:
+            overlap = iou(box, entry.box)
+            if overlap >= best_iou:
+                best, best_iou = entry, overlap
+        return best
@@ -0,0 +1,152 @@
+import cv2
+import numpy as np
+
+# NumPy re-implementation of OpenCV's LBPH feature extraction and matching.
+# It produces the same histograms as cv2.face.LBPHFaceRecognizer, so models
+# can be stored outside trainer.yml (see model_binary.py) and still be matched
+# with the same distances the stock recognizer reports.
+
+# Distances are computed a chunk of rows at a time in two preallocated
+# buffers of about this many float32 values (1 MB each), small enough to stay
+# in cache. Every step writes in place (out=), so no other temporaries exist.
+DIST_CHUNK_VALUES = 1 << 18
+
+# Added to the query's side of the denominator: a bin empty in both
+# histograms gives 0 / _TINY = 0 instead of 0 / 0. A non-empty bin is at
+# least 1 / (pixels per cell), next to which _TINY vanishes in float32, so
+# the result equals OpenCV's, which skips empty bins.
+_TINY = np.float32(1e-30)
+
+def chunk_rows(dim):
+    """Rows per chunk for histograms of dim values"""
+    return max(1, DIST_CHUNK_VALUES // max(int(dim), 1))
+
+def lbp_image(img, radius=2, neighbors=8):
+    """Extended (circular) LBP codes, matching OpenCV's elbp()"""
+    src = np.asarray(img, dtype=np.float32)
+    rows, cols = src.shape
+    h, w = rows - 2 * radius, cols - 2 * radius
+    center = src[radius:radius + h, radius:radius + w]
+    codes = np.zeros((h, w), dtype=np.int32)
+
+    for n in range(neighbors):
+        x = radius * np.cos(2.0 * np.pi * n / neighbors)
+        y = -radius * np.sin(2.0 * np.pi * n / neighbors)
+        fx, fy = int(np.floor(x)), int(np.floor(y))
+        cx, cy = int(np.ceil(x)), int(np.ceil(y))
+        tx, ty = x - fx, y - fy
+        w1 = (1 - tx) * (1 - ty)
+        w2 = tx * (1 - ty)
+        w3 = (1 - tx) * ty
+        w4 = tx * ty
+
+        def shifted(dy, dx):
+            return src[radius + dy:radius + dy + h, radius + dx:radius + dx + w]
+
+        t = (w1 * shifted(fy, fx) + w2 * shifted(fy, cx)
+             + w3 * shifted(cy, fx) + w4 * shifted(cy, cx))
+        bit = (t > center) | (np.abs(t - center) < np.finfo(np.float32).eps)
+        codes += bit.astype(np.int32) << n
+
+    return codes
+
+def spatial_histogram(codes, num_patterns, grid_x=8, grid_y=8):
+    """Concatenated, per-cell normalized histograms of an LBP code image"""
+    height = codes.shape[0] // grid_y
+    width = codes.shape[1] // grid_x
+    cells = codes[:height * grid_y, :width * grid_x]
+    cells = cells.reshape(grid_y, height, grid_x, width).transpose(0, 2, 1, 3)
+    cells = cells.reshape(grid_y * grid_x, height * width)
+
+    offsets = (np.arange(grid_y * grid_x) * num_patterns)[:, None]
+    hist = np.bincount((cells + offsets).ravel(), minlength=grid_y * grid_x * num_patterns)
+    return (hist / float(height * width)).astype(np.float32)
+
+def compute_histogram(img, radius=2, neighbors=8, grid_x=8, grid_y=8):
+    """LBPH descriptor of a grayscale face image"""
+    codes = lbp_image(img, radius, neighbors)
+    return spatial_histogram(codes, 2 ** neighbors, grid_x, grid_y)
+
+def _chi_square_block(block, query, query_tiny, diff, total, out):
+    """Distances from one query to the rows of block, written to out"""
+    np.subtract(block, query, out=diff)
+    np.add(block, query_tiny, out=total)
+    np.multiply(diff, diff, out=diff)
+    np.divide(diff, total, out=diff)
+    np.sum(diff, axis=1, dtype=np.float64, out=out)
+    out *= 2.0
+
+def chi_square_distances(histograms, query, out=None):
+    """HISTCMP_CHISQR_ALT distance from query to every row of histograms.
+
+    Rows are processed in chunks so memory-mapped models are streamed
+    instead of materialized.
+    """
+    return chi_square_distances_many(histograms, np.reshape(query, (1, -1)),
+                                     None if out is None else out.reshape(1, -1))[0]
+
+def chi_square_distances_many(histograms, queries, out=None):
+    """chi_square_distances() for several queries at once, shape (queries, rows).
+
+    The stored histograms are streamed once for the whole batch instead of
+    once per query: each chunk is compared with every query while it is in
+    cache.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    n = len(histograms)
+    if out is None:
+        out = np.empty((len(queries), n), dtype=np.float64)
+    dim = queries.shape[1]
+    rows = min(chunk_rows(dim), max(n, 1))
+    diff = np.empty((rows, dim), dtype=np.float32)
+    total = np.empty((rows, dim), dtype=np.float32)
+    queries_tiny = queries + _TINY
+
+    for start in range(0, n, rows):
+        block = np.asarray(histograms[start:start + rows], dtype=np.float32)
+        k = len(block)
+        for i in range(len(queries)):
+            _chi_square_block(block, queries[i], queries_tiny[i], diff[:k], total[:k],
+                              out[i, start:start + k])
+
+    return out
+
+class HistogramRecognizer:
+    """Drop-in replacement for the LBPH recognizer's predict() over raw histograms"""
+
+    def __init__(self, params, histograms, labels):
+        self.radius = int(params["radius"])
+        self.neighbors = int(params["neighbors"])
+        self.grid_x = int(params["grid_x"])
+        self.grid_y = int(params["grid_y"])
+        self.threshold = float(params.get("threshold", np.finfo(np.float64).max))
+        self.histograms = histograms
+        self.labels = labels
+
+    def compute_histogram(self, img):
+        return compute_histogram(img, self.radius, self.neighbors, self.grid_x, self.grid_y)
+
+    def predict_histogram(self, query):
+        """Return (label, distance) of the nearest stored histogram"""
+        dists = chi_square_distances(self.histograms, query)
+        best = int(np.argmin(dists))
+        if dists[best] >= self.threshold:
+            return -1, float(dists[best])
+        return int(self.labels[best]), float(dists[best])
+
+    def predict(self, img):
+        if img.ndim == 3:
+            img = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return self.predict_histogram(self.compute_histogram(img))
+
+    def predict_batch(self, imgs):
+        """predict() for a list of grayscale images"""
+        queries = [self.compute_histogram(img) for img in imgs]
+        results = []
+        for dists in chi_square_distances_many(self.histograms, queries):
+            best = int(np.argmin(dists))
+            if dists[best] >= self.threshold:
+                results.append((-1, float(dists[best])))
+            else:
+                results.append((int(self.labels[best]), float(dists[best])))
+        return results
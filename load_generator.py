@@ -0,0 +1,265 @@
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+import contextlib
+from bisect import bisect_left, bisect_right
+
+import metrics
+from recognize_attendance import AttendanceTracker
+from notification_queue import NotificationAggregator
+from presence import ManualClock
+
+# Load generator for the attendance and notification paths.
+#
+# Simulates a crowd passing the camera, e.g. 200 students entering within
+# five minutes, without a camera or model. Each simulated person appears for
+# a few seconds (Entry) and, with --dwell, appears again later (Exit). The
+# frame loop drives AttendanceTracker the way run_recognition does:
+# update_visibility for everyone in view, mark_attendance once a face has
+# been in view for --commit-frames frames, check_exits every frame. The
+# tracker's presence engine runs on simulated time (a ManualClock at
+# frame / fps), with no cooldown, so every appearance is marked.
+# Telegram is replaced by StubNotifier, which takes a configurable time per
+# send and can fail or time out. With --digest-window the stub sits behind
+# a NotificationAggregator (digests, per-chat rate limit) as in production;
+# without it every mark sends synchronously.
+#
+# Simulated frames are due at fixed wall-clock times (--fps, sped up by
+# --speed). Everything in the loop is synchronous, so a slow CSV write or
+# send delays every later frame. The report shows:
+#
+#   throughput     marks and notifications per second of wall time
+#   latency        from the frame that should have marked a person until
+#                  mark_attendance (CSV and notification) returned
+#   queue depth    marks already due but not yet written, how far the
+#                  frame loop ran behind the camera, and queued notifications
+#   dropped        notifications that failed or timed out (with an
+#                  aggregator: still undelivered after --drain-timeout)
+#
+# The run happens in a temporary folder, so attendance/ is not touched.
+
+class SendTimeout(Exception):
+    pass
+
+class StubNotifier:
+    """Stands in for TelegramNotifier: sleeps instead of sending.
+
+    Each send takes latency +/- jitter seconds. A share failure_rate of sends
+    fail, and sends that would take longer than timeout give up after timeout
+    seconds (like the 10 s subprocess timeout of send_sync).
+    """
+
+    def __init__(self, latency=0.3, jitter=0.1, failure_rate=0.0, timeout=10.0, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.timeout = timeout
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.sent = 0
+        self.failed = 0
+        self.timed_out = 0
+        self.busy = 0.0
+
+    def send_sync(self, message):
+        with self.lock:
+            delay = max(0.0, self.rng.uniform(self.latency - self.jitter, self.latency + self.jitter))
+            fail = self.rng.random() < self.failure_rate
+        start = time.perf_counter()
+        time.sleep(min(delay, self.timeout))
+        with self.lock:
+            self.busy += time.perf_counter() - start
+            if delay > self.timeout:
+                self.timed_out += 1
+                raise SendTimeout(f"send took longer than {self.timeout} s")
+            if fail:
+                self.failed += 1
+                raise ConnectionError("simulated send failure")
+            self.sent += 1
+
+    @property
+    def dropped(self):
+        return self.failed + self.timed_out
+
+def crowd_schedule(people=200, window=300.0, dwell=0.0, visible=3.0, fps=30, seed=0):
+    """Appearances of a simulated crowd as (start_frame, end_frame, name), sorted.
+
+    Arrivals are spread uniformly at random over window seconds; with dwell
+    > 0 everyone appears again dwell seconds (+/- 25%) after arriving.
+    """
+    rng = random.Random(seed)
+    visible_frames = max(1, int(visible * fps))
+    appearances = []
+    for i in range(people):
+        name = f"loadtest_{i + 1:04d}"
+        arrival = int(rng.uniform(0, window) * fps)
+        appearances.append((arrival, arrival + visible_frames, name))
+        if dwell > 0:
+            leave = arrival + int(dwell * rng.uniform(0.75, 1.25) * fps)
+            appearances.append((leave, leave + visible_frames, name))
+    appearances.sort()
+    return appearances
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_load(tracker, appearances, fps=30, speed=1.0, commit_frames=8, tail=3.0):
+    """Drive tracker through the schedule; returns the measurements as a dict.
+
+    The tracker's clock must be a presence.ManualClock; it is set to each
+    frame's simulated time.
+    """
+    frame_seconds = 1.0 / (fps * speed)
+    commits = sorted(start + commit_frames for start, end, _ in appearances
+                     if end - start > commit_frames)
+    last_frame = max(end for _, end, _ in appearances) + int(tail * fps)
+
+    in_view = {}               # {name: (first frame, end frame) of the current appearance}
+    marked_this_session = set()
+    latencies = []
+    depths = []
+    notify_depths = []
+    max_lag = 0.0
+    next_appearance = 0
+
+    start = time.perf_counter()
+    for frame in range(last_frame + 1):
+        tracker.presence.clock.set(frame / fps)
+        due = start + frame * frame_seconds
+        now = time.perf_counter()
+        if now < due:
+            time.sleep(due - now)
+            now = due
+        max_lag = max(max_lag, now - due)
+
+        # Marks the camera has already reached but this loop has not
+        camera_frame = int((now - start) / frame_seconds)
+        depths.append(bisect_right(commits, camera_frame) - bisect_left(commits, frame))
+        if tracker.notifications is not None:
+            notify_depths.append(tracker.notifications.pending())
+
+        while next_appearance < len(appearances) and appearances[next_appearance][0] <= frame:
+            first, end, name = appearances[next_appearance]
+            in_view[name] = (first, end)
+            next_appearance += 1
+
+        for name, (first, end) in list(in_view.items()):
+            if frame >= end:
+                del in_view[name]
+                continue
+            tracker.update_visibility(name)
+            if name not in marked_this_session and frame - first >= commit_frames:
+                tracker.mark_attendance(name, 40.0)
+                marked_this_session.add(name)
+                latencies.append(time.perf_counter() - due)
+        for name in tracker.check_exits():
+            marked_this_session.discard(name)
+
+    return {"marks": len(latencies), "frames": last_frame + 1,
+            "wall": time.perf_counter() - start, "latencies": latencies,
+            "depths": depths, "notify_depths": notify_depths, "max_lag": max_lag}
+
+def simulate(people=200, window=300.0, dwell=0.0, visible=3.0, fps=30, speed=1.0,
+             commit_frames=8, send_latency=0.3, send_jitter=0.1, failure_rate=0.0,
+             send_timeout=10.0, digest_window=None, chats=1, rate_per_minute=20,
+             drain_timeout=120.0, seed=0, verbose=False):
+    """Run one load test in a temporary folder and print the report"""
+    appearances = crowd_schedule(people, window, dwell, visible, fps, seed)
+    stub = StubNotifier(send_latency, send_jitter, failure_rate, send_timeout, seed)
+    print(f"Simulating {people} people, {len(appearances)} appearances over "
+          f"{appearances[-1][1] / fps:.0f} s at {speed:g}x "
+          f"(send {send_latency:g} +/- {send_jitter:g} s, failure rate {failure_rate:.0%})")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        try:
+            # Tracker messages would drown the report
+            with open(os.devnull, "w") as devnull, \
+                    contextlib.redirect_stdout(sys.stdout if verbose else devnull):
+                tracker = AttendanceTracker(enable_telegram=False, cooldown_minutes=0,
+                                            clock=ManualClock())
+                tracker.telegram = stub
+                if digest_window is not None:
+                    tracker.notifications = NotificationAggregator(
+                        lambda chat_id, text: stub.send_sync(text),
+                        [f"chat{i + 1}" for i in range(chats)], digest_window,
+                        rate_per_minute, spool_path=os.path.join(workdir, "spool.json")).start()
+                result = run_load(tracker, appearances, fps, speed, commit_frames)
+                if tracker.notifications is not None:
+                    start = time.perf_counter()
+                    undelivered = 0 if tracker.notifications.close(drain_timeout) \
+                        else tracker.notifications.pending()
+                    drain = time.perf_counter() - start
+        finally:
+            os.chdir(cwd)
+
+    wall = result["wall"]
+    simulated = result["frames"] / fps
+    latencies = result["latencies"]
+    depths = result["depths"]
+    print(f"Wall time         {wall:.1f} s for {simulated:.1f} s of simulated time "
+          f"({simulated / wall:.2f}x real time, target {speed:g}x)")
+    print(f"Throughput        {result['marks'] / wall:.2f} marks/s, "
+          f"{stub.sent / wall:.2f} notifications/s")
+    print(f"Marking latency   p50 {_percentile(latencies, 0.5):.2f} s, "
+          f"p95 {_percentile(latencies, 0.95):.2f} s, "
+          f"p99 {_percentile(latencies, 0.99):.2f} s, max {max(latencies, default=0):.2f} s")
+    print(f"Queue depth       pending marks mean {sum(depths) / max(len(depths), 1):.1f}, "
+          f"max {max(depths, default=0)}; frame loop up to {result['max_lag']:.1f} s "
+          f"({result['max_lag'] * fps * speed:.0f} frames) behind")
+    if digest_window is None:
+        print(f"Notifications     {stub.sent} sent, {stub.dropped} dropped "
+              f"({stub.failed} failed, {stub.timed_out} timed out), "
+              f"{stub.busy:.1f} s spent sending")
+    else:
+        notify_depths = result["notify_depths"]
+        print(f"Notifications     {stub.sent} digests to {chats} chats for {result['marks']} marks, "
+              f"{stub.dropped} attempts failed (retried), {undelivered} undelivered; "
+              f"queue max {max(notify_depths, default=0)}, drained in {drain:.1f} s")
+    print(f"Marks written     {result['marks']} of {len(appearances)} appearances")
+    return result, stub
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test for attendance marking and notifications")
+    parser.add_argument("--people", type=int, default=200)
+    parser.add_argument("--window", type=float, default=300.0, help="seconds over which people arrive")
+    parser.add_argument("--dwell", type=float, default=0.0,
+                        help="seconds until each person leaves again (0: arrivals only)")
+    parser.add_argument("--visible", type=float, default=3.0, help="seconds each person stays in view")
+    parser.add_argument("--fps", type=int, default=30)
+    parser.add_argument("--speed", type=float, default=1.0, help="simulated seconds per wall second")
+    parser.add_argument("--commit-frames", type=int, default=8,
+                        help="frames in view before a person is marked")
+    parser.add_argument("--send-latency", type=float, default=0.3, help="seconds per notification")
+    parser.add_argument("--send-jitter", type=float, default=0.1)
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of sends that fail")
+    parser.add_argument("--send-timeout", type=float, default=10.0)
+    parser.add_argument("--digest-window", type=float,
+                        help="send through a NotificationAggregator with this window (seconds)")
+    parser.add_argument("--chats", type=int, default=1, help="chat targets for the aggregator")
+    parser.add_argument("--rate-per-minute", type=float, default=20, help="per-chat send limit")
+    parser.add_argument("--drain-timeout", type=float, default=120.0,
+                        help="seconds to deliver queued notifications after the run")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--metrics-file", help="write the pipeline metrics here after the run")
+    parser.add_argument("--verbose", action="store_true", help="show the tracker's messages")
+    args = parser.parse_args()
+
+    simulate(args.people, args.window, args.dwell, args.visible, args.fps, args.speed,
+             args.commit_frames, args.send_latency, args.send_jitter, args.failure_rate,
+             args.send_timeout, args.digest_window, args.chats, args.rate_per_minute,
+             args.drain_timeout, args.seed, args.verbose)
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
+        print(f"[OK] Metrics written to {args.metrics_file}")
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,10 @@
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, simpledialog, ttk
 import subprocess
 import os
 import sys
+from service_client import send_command, spawn_service, ServiceUnavailable
+from training_worker import TrainingJob, describe_progress
 
 # Project folder
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -35,14 +37,113 @@ def run_script(script_name):
         messagebox.showerror("Error", f"Failed to run script:\n{e}")
         root.deiconify()
 
+def wait_for_service_idle():
+    """Show the menu again once the service has finished its job"""
+    try:
+        reply = send_command("status")
+    except ServiceUnavailable:
+        root.deiconify()
+        return
+    if reply.get("state") == "idle":
+        root.deiconify()
+    else:
+        root.after(500, wait_for_service_idle)
+
+def run_service_action(cmd, script_name, **params):
+    """Run an action on the warm attendance service, or the script if it is not running"""
+    try:
+        reply = send_command(cmd, **params)
+    except ServiceUnavailable:
+        run_script(script_name)
+        return False
+
+    if not reply.get("ok"):
+        messagebox.showerror("Error", reply.get("error", "Attendance service error"))
+        return False
+    return True
+
 def enroll_user():
-    run_script("collect_faces.py")
+    try:
+        send_command("status")
+    except ServiceUnavailable:
+        run_script("collect_faces.py")
+        return
+
+    name = simpledialog.askstring("Enroll New User", "Student's name (NameSurname format):")
+    if name and run_service_action("enroll", "collect_faces.py", name=name.strip()):
+        root.withdraw()
+        root.after(500, wait_for_service_idle)
+
+def show_training_progress(poll, cancel):
+    """Non-blocking progress window.
+
+    poll() returns (text, fraction, finished) and is called every 200 ms;
+    cancel() is bound to the Cancel button.
+    """
+    win = tk.Toplevel(root)
+    win.title("Training")
+    win.configure(bg="#1e1e1e")
+    win.geometry("420x150")
+    win.transient(root)
+
+    label = tk.Label(win, text="Starting training...", font=("Arial", 12),
+                     bg="#1e1e1e", fg="white")
+    label.pack(pady=15)
+    bar = ttk.Progressbar(win, length=360, maximum=1.0)
+    bar.pack(pady=5)
+    button = tk.Button(win, text="Cancel", font=("Arial", 12), width=12,
+                       command=cancel, bg="#f44336", fg="white")
+    button.pack(pady=10)
+
+    def update():
+        text, fraction, finished = poll()
+        label.config(text=text)
+        bar["value"] = fraction
+        if finished:
+            button.config(text="Close", command=win.destroy, bg="#607D8B")
+        else:
+            win.after(200, update)
+
+    update()
 
 def train_system():
-    run_script("train_lbph.py")
+    try:
+        send_command("status")
+    except ServiceUnavailable:
+        # No service: train in a local background process
+        job = TrainingJob().start()
+
+        def poll():
+            job.poll()
+            text, fraction = describe_progress(job.last_event)
+            return text, fraction, job.finished()
+
+        show_training_progress(poll, job.cancel)
+        return
+
+    if not run_service_action("train", "train_lbph.py"):
+        return
+
+    def poll_service():
+        try:
+            training = send_command("status").get("training") or {}
+        except ServiceUnavailable:
+            return "Attendance service stopped", 0.0, True
+        return (training.get("text", "Starting training..."), training.get("fraction", 0.0),
+                not training.get("running", True))
+
+    def cancel_service():
+        try:
+            send_command("cancel_training")
+        except ServiceUnavailable:
+            pass
+
+    show_training_progress(poll_service, cancel_service)
 
 def start_attendance():
-    run_script("recognize_attendance.py")
+    if run_service_action("start", "recognize_attendance.py"):
+        root.withdraw()
+        root.after(500, wait_for_service_idle)
 
 def manage_users():
     run_script("manage_users.py")
@@ -54,11 +155,18 @@ def exit_application(root):
     """Properly exit the application with confirmation"""
     if messagebox.askyesno("Exit", "Are you sure you want to exit the Face Attendance System?"):
         print("Exiting Face Attendance System...")
+        try:
+            send_command("shutdown")
+        except ServiceUnavailable:
+            pass
         root.destroy()
         sys.exit(0)
 
 def main():
     global root
+    # Warm up the attendance service in the background so later actions are instant
+    spawn_service()
+
     root = tk.Tk()
     root.title("Face Attendance System")
     root.attributes('-fullscreen', True)  # Fullscreen mode
@@ -111,6 +219,13 @@ import subprocess
 import sys
 import os
 
+# Menu scripts that the attendance service can run without a new process
+SERVICE_COMMANDS = {
+    "recognize_attendance.py": "start",
+    "collect_faces.py": "enroll",
+    "train_lbph.py": "train",
+}
+
 class MainMenu:
     def __init__(self, root):
         self.root = root
@@ -149,10 +264,35 @@ class MainMenu:
         if script is None:
             self.root.destroy()
             return
+
+        if self.run_on_service(script):
+            return
         
         self.root.destroy()
         subprocess.run([sys.executable, script])
 
+    def run_on_service(self, script):
+        """Send the action to the attendance service; False if it is not running"""
+        cmd = SERVICE_COMMANDS.get(script)
+        if cmd is None:
+            return False
+
+        params = {}
+        try:
+            send_command("status")
+            if cmd == "enroll":
+                name = simpledialog.askstring("Collect Faces", "Student's name (NameSurname format):")
+                if not name:
+                    return True
+                params["name"] = name.strip()
+            reply = send_command(cmd, **params)
+        except ServiceUnavailable:
+            return False
+
+        if not reply.get("ok"):
+            messagebox.showerror("Error", reply.get("error", "Attendance service error"))
+        return True
+
 if __name__ == "__main__":
     root = tk.Tk()
     app = MainMenu(root)
@@ -0,0 +1,267 @@
+import os
+import sys
+import time
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Lightweight metrics for the attendance pipeline: counters, gauges and
+# histograms in a process-wide registry, exported in the Prometheus text
+# format over HTTP or to a file (node_exporter textfile collector). Stage
+# timers are reusable objects so timing a stage in the frame loop costs two
+# perf_counter() calls and a bisect.
+
+# Seconds; tuned for per-frame stages (sub-millisecond) up to network sends
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}"
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def dec(self, amount=1):
+        self.value -= amount
+
+    def samples(self, name, labels):
+        yield name, labels, self.value
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def mean(self):
+        return self.sum / self.count if self.count else 0.0
+
+    def samples(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.bounds + (float("inf"),), self.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            yield name + "_bucket", labels + (("le", le),), cumulative
+        yield name + "_sum", labels, self.sum
+        yield name + "_count", labels, self.count
+
+class Timer:
+    """Reusable context manager recording elapsed seconds into a histogram"""
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.start = 0.0
+
+    def begin(self):
+        self.start = time.perf_counter()
+
+    def end(self):
+        self.histogram.observe(time.perf_counter() - self.start)
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}  # {(name, labels): metric}
+        self.help = {}
+        self.lock = threading.Lock()
+
+    def _get(self, cls, name, help_text, labels, **kwargs):
+        key = (name, tuple(sorted((labels or {}).items())))
+        metric = self.metrics.get(key)
+        if metric is None:
+            with self.lock:
+                metric = self.metrics.get(key)
+                if metric is None:
+                    metric = self.metrics[key] = cls(**kwargs)
+                    self.help.setdefault(name, help_text)
+        return metric
+
+    def counter(self, name, help_text="", labels=None):
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name, help_text="", labels=None):
+        return self._get(Gauge, name, help_text, labels)
+
+    def histogram(self, name, help_text="", labels=None, buckets=DEFAULT_BUCKETS):
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self):
+        """Prometheus text exposition format"""
+        # Metrics are created lazily from other threads: copy under the lock
+        with self.lock:
+            items = list(self.metrics.items())
+            help_texts = dict(self.help)
+        lines = []
+        seen = set()
+        for (name, labels), metric in sorted(items, key=lambda kv: kv[0]):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {help_texts.get(name, '')}")
+                lines.append(f"# TYPE {name} {metric.kind}")
+            for sample_name, sample_labels, value in metric.samples(name, labels):
+                lines.append(f"{sample_name}{_format_labels(sample_labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def counter(name, help_text="", labels=None):
+    return REGISTRY.counter(name, help_text, labels)
+
+def gauge(name, help_text="", labels=None):
+    return REGISTRY.gauge(name, help_text, labels)
+
+def histogram(name, help_text="", labels=None, buckets=DEFAULT_BUCKETS):
+    return REGISTRY.histogram(name, help_text, labels, buckets)
+
+def stage_timer(stage):
+    """Timer for one stage of the frame loop"""
+    return Timer(histogram("attendance_stage_seconds", "Time spent per pipeline stage",
+                           {"stage": stage}))
+
+def write_textfile(path, registry=REGISTRY):
+    """Write all metrics to path atomically"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        f.write(registry.render())
+    os.replace(tmp_path, path)
+
+def start_textfile_writer(path, interval=10.0, registry=REGISTRY):
+    """Rewrite the metrics file every interval seconds in a daemon thread"""
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                write_textfile(path, registry)
+            except OSError as e:
+                print(f"[WARNING] Failed to write metrics to {path}: {e}")
+
+    thread = threading.Thread(target=loop, daemon=True)
+    thread.start()
+    return thread
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port, host="127.0.0.1", registry=REGISTRY):
+    """Serve /metrics on a local port from a daemon thread"""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.registry = registry
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[OK] Metrics available at http://{host}:{port}/metrics")
+    return server
+
+class RateLimitedLogger:
+    """Structured key=value logger that emits each message at most once per interval.
+
+    Messages are identified by key, or by the event when no key is given;
+    pass a key such as f"event:{name}" to rate-limit per name. Suppressed
+    repeats are counted and reported with the next emitted line. Keys not
+    emitted for an interval are forgotten, so per-name keys do not pile up.
+    """
+
+    LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40}
+
+    def __init__(self, interval=5.0, level="info", stream=None):
+        self.interval = interval
+        self.level = self.LEVELS[level]
+        self.stream = stream
+        self.last_emit = {}
+        self.suppressed = {}
+        self.lock = threading.Lock()
+        self._pruned = time.monotonic()
+
+    def _prune(self, now):
+        """Forget keys last emitted an interval or more ago"""
+        self._pruned = now
+        for key in [k for k, t in self.last_emit.items() if now - t >= self.interval]:
+            del self.last_emit[key]
+            self.suppressed.pop(key, None)
+
+    def log(self, level, event, key=None, **fields):
+        if self.LEVELS[level] < self.level:
+            return
+        if key is None:
+            key = event
+        now = time.monotonic()
+        with self.lock:
+            last = self.last_emit.get(key)
+            if last is not None and now - last < self.interval:
+                self.suppressed[key] = self.suppressed.get(key, 0) + 1
+                return
+            self.last_emit[key] = now
+            suppressed = self.suppressed.pop(key, 0)
+            # After the lookup, so this key's suppressed count is still reported
+            if now - self._pruned >= self.interval:
+                self._prune(now)
+
+        if suppressed:
+            fields["suppressed"] = suppressed
+        parts = [time.strftime("%H:%M:%S"), level.upper(), event]
+        parts.extend(f"{k}={v}" for k, v in fields.items())
+        print(" ".join(parts), file=self.stream or sys.stdout)
+
+    def debug(self, event, key=None, **fields):
+        self.log("debug", event, key, **fields)
+
+    def info(self, event, key=None, **fields):
+        self.log("info", event, key, **fields)
+
+    def warning(self, event, key=None, **fields):
+        self.log("warning", event, key, **fields)
+
+    def error(self, event, key=None, **fields):
+        self.log("error", event, key, **fields)
+
+log = RateLimitedLogger(level=os.environ.get("ATTENDANCE_LOG_LEVEL", "info").lower())
@@ -0,0 +1,223 @@
+import os
+import sys
+import time
+import struct
+import zlib
+import numpy as np
+
+# Binary LBPH model format (trainer.bin)
+#
+#   [header, 128 bytes] [float32 histograms, count x dim] [int32 labels, count]
+#
+# The histogram block starts at a 64-byte aligned offset so it can be mapped
+# with np.memmap and used without copying or parsing. The CRC32 covers the
+# histogram and label blocks.
+#
+# Every load checks the header against the LBPH parameters and the file
+# size, so a truncated or corrupt file is refused instead of mapped; the
+# CRC32 (verify=True, or "verify" on the command line) reads the whole file
+# and is left to installs and manual checks.
+
+BINARY_MODEL_PATH = "trainer.bin"
+MAGIC = b"LBPHBIN\0"
+FORMAT_VERSION = 1
+HEADER_SIZE = 128
+HEADER_STRUCT = struct.Struct("<8sHHIIiiiidQQId")
+
+class ModelFormatError(Exception):
+    pass
+
+def _pack_header(count, dim, params, checksum, created):
+    data_offset = HEADER_SIZE
+    labels_offset = data_offset + count * dim * 4
+    header = HEADER_STRUCT.pack(
+        MAGIC, FORMAT_VERSION, HEADER_SIZE, count, dim,
+        int(params["radius"]), int(params["neighbors"]),
+        int(params["grid_x"]), int(params["grid_y"]),
+        float(params["threshold"]), data_offset, labels_offset,
+        checksum, created)
+    return header.ljust(HEADER_SIZE, b"\0")
+
+def read_header(path):
+    """Read and validate the header of a binary model against the file size"""
+    with open(path, "rb") as f:
+        raw = f.read(HEADER_SIZE)
+        size = os.fstat(f.fileno()).st_size
+    if len(raw) < HEADER_STRUCT.size:
+        raise ModelFormatError(f"{path}: file too short")
+
+    (magic, version, header_size, count, dim, radius, neighbors, grid_x, grid_y,
+     threshold, data_offset, labels_offset, checksum, created) = HEADER_STRUCT.unpack_from(raw)
+    if magic != MAGIC:
+        raise ModelFormatError(f"{path}: not a binary LBPH model")
+    if version > FORMAT_VERSION:
+        raise ModelFormatError(f"{path}: unsupported format version {version}")
+    if header_size != HEADER_SIZE or data_offset != HEADER_SIZE:
+        raise ModelFormatError(f"{path}: corrupt header")
+    if not (0 < radius and 0 < neighbors <= 16 and grid_x > 0 and grid_y > 0):
+        raise ModelFormatError(f"{path}: invalid LBPH parameters")
+    if dim != (1 << neighbors) * grid_x * grid_y:
+        raise ModelFormatError(f"{path}: histogram size {dim} does not match the LBPH parameters")
+    if labels_offset != data_offset + count * dim * 4:
+        raise ModelFormatError(f"{path}: corrupt header")
+    if size != labels_offset + count * 4:
+        raise ModelFormatError(f"{path}: {size} bytes, expected {labels_offset + count * 4} "
+                               f"(truncated or corrupt)")
+
+    return {
+        "version": version,
+        "count": count,
+        "dim": dim,
+        "params": {"radius": radius, "neighbors": neighbors,
+                   "grid_x": grid_x, "grid_y": grid_y, "threshold": threshold},
+        "data_offset": data_offset,
+        "labels_offset": labels_offset,
+        "checksum": checksum,
+        "created": created,
+    }
+
+def write_binary_model(path, params, histograms, labels):
+    """Write histograms and labels atomically in the binary format"""
+    histograms = np.ascontiguousarray(histograms, dtype=np.float32)
+    labels = np.ascontiguousarray(labels, dtype=np.int32).reshape(-1)
+    count, dim = histograms.shape
+    if len(labels) != count:
+        raise ValueError("histograms and labels differ in length")
+
+    data = histograms.tobytes()
+    label_bytes = labels.tobytes()
+    checksum = zlib.crc32(label_bytes, zlib.crc32(data))
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(_pack_header(count, dim, params, checksum, time.time()))
+        f.write(data)
+        f.write(label_bytes)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def compute_checksum(path, header):
+    """CRC32 over the histogram and label blocks"""
+    crc = 0
+    with open(path, "rb") as f:
+        f.seek(header["data_offset"])
+        remaining = header["count"] * header["dim"] * 4 + header["count"] * 4
+        while remaining > 0:
+            chunk = f.read(min(remaining, 1 << 20))
+            if not chunk:
+                break
+            crc = zlib.crc32(chunk, crc)
+            remaining -= len(chunk)
+    return crc
+
+def load_binary_model(path=BINARY_MODEL_PATH, verify=False):
+    """Map a binary model without copying.
+
+    Returns (params, histograms, labels) where histograms and labels are
+    read-only np.memmap views into the file.
+    """
+    header = read_header(path)
+    if verify and compute_checksum(path, header) != header["checksum"]:
+        raise ModelFormatError(f"{path}: checksum mismatch")
+
+    count, dim = header["count"], header["dim"]
+    histograms = np.memmap(path, dtype=np.float32, mode="r",
+                           offset=header["data_offset"], shape=(count, dim))
+    labels = np.memmap(path, dtype=np.int32, mode="r",
+                       offset=header["labels_offset"], shape=(count,))
+    return header["params"], histograms, labels
+
+def load_lbph_recognizer(path=BINARY_MODEL_PATH, verify=False):
+    """OpenCV LBPH recognizer holding a binary model's histograms.
+
+    The recognizer can only be filled by read(), so the histograms go
+    through a temporary base64 YAML file. The startup cache
+    (startup_cache.py) keeps that file between starts.
+    """
+    import cv2
+    import tempfile
+    from compact_model import write_lbph_model
+    params, histograms, labels = load_binary_model(path, verify)
+    fd, tmp_path = tempfile.mkstemp(suffix=".yml")
+    os.close(fd)
+    try:
+        write_lbph_model(tmp_path, params, histograms, labels, base64=True)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(tmp_path)
+    finally:
+        os.remove(tmp_path)
+    return recognizer
+
+def load_binary_recognizer(path=BINARY_MODEL_PATH, verify=False):
+    """Return a HistogramRecognizer backed by a memory-mapped model"""
+    from lbph_features import HistogramRecognizer
+    params, histograms, labels = load_binary_model(path, verify)
+    return HistogramRecognizer(params, histograms, labels)
+
+def convert_yml(yml_path="trainer.yml", bin_path=BINARY_MODEL_PATH):
+    """Convert an OpenCV trainer.yml into the binary format"""
+    from compact_model import load_model_histograms
+    params, histograms, labels = load_model_histograms(yml_path)
+    write_binary_model(bin_path, params, histograms, labels)
+    print(f"Converted {yml_path} -> {bin_path} "
+          f"({len(histograms)} histograms, {os.path.getsize(bin_path) / 1e6:.1f} MB)")
+
+def benchmark(yml_path="trainer.yml", bin_path=BINARY_MODEL_PATH, repeats=3):
+    """Compare startup time of recognizer.read() against the binary model"""
+    import cv2
+
+    probe = np.full((150, 150), 128, dtype=np.uint8)
+
+    def time_yml():
+        start = time.perf_counter()
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(yml_path)
+        loaded = time.perf_counter()
+        recognizer.predict(probe)
+        return loaded - start, time.perf_counter() - start
+
+    def time_bin():
+        start = time.perf_counter()
+        recognizer = load_binary_recognizer(bin_path)
+        loaded = time.perf_counter()
+        recognizer.predict(probe)
+        return loaded - start, time.perf_counter() - start
+
+    print(f"{'format':<8} {'load (ms)':>10} {'first predict (ms)':>20}")
+    for name, fn in (("yml", time_yml), ("binary", time_bin)):
+        runs = [fn() for _ in range(repeats)]
+        load_ms = min(r[0] for r in runs) * 1000
+        first_ms = min(r[1] for r in runs) * 1000
+        print(f"{name:<8} {load_ms:>10.1f} {first_ms:>20.1f}")
+
+def main():
+    usage = "Usage: python model_binary.py [convert|verify|info|benchmark] [trainer.yml] [trainer.bin]"
+    if len(sys.argv) < 2:
+        print(usage)
+        return
+
+    command = sys.argv[1]
+    yml_path = sys.argv[2] if len(sys.argv) > 2 else "trainer.yml"
+    bin_path = sys.argv[3] if len(sys.argv) > 3 else BINARY_MODEL_PATH
+
+    if command == "convert":
+        convert_yml(yml_path, bin_path)
+    elif command in ("verify", "info"):
+        path = sys.argv[2] if len(sys.argv) > 2 else BINARY_MODEL_PATH
+        header = read_header(path)
+        print(f"{path}: format v{header['version']}, {header['count']} histograms x {header['dim']}, "
+              f"created {time.ctime(header['created'])}")
+        print(f"params: {header['params']}")
+        if command == "verify":
+            ok = compute_checksum(path, header) == header["checksum"]
+            print("Checksum OK" if ok else "Checksum MISMATCH")
+    elif command == "benchmark":
+        if not os.path.exists(bin_path):
+            convert_yml(yml_path, bin_path)
+        benchmark(yml_path, bin_path)
+    else:
+        print(usage)
+
+if __name__ == "__main__":
+    main()
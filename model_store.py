@@ -0,0 +1,320 @@
+import io
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import threading
+import numpy as np
+
+import metrics
+from model_binary import (BINARY_MODEL_PATH, ModelFormatError, load_binary_model, read_header,
+                          write_binary_model)
+
+# Versioned model distribution to kiosks.
+#
+# The training machine publishes each trained model into a store directory:
+#
+#   model_store/
+#     manifest.json            the current version (written last)
+#     manifests/v<N>.json      earlier versions
+#     segments/<hash>.npy      one person's histograms, named by content hash
+#
+# The manifest lists every person with a label id, the segment holding their
+# histograms, and the LBPH parameters. Label ids are assigned by the store
+# and never change or get reused, so retraining after one enrollment changes
+# one segment and one manifest entry; every other segment keeps its hash.
+#
+# A kiosk syncs from the store (a shared folder, a mounted USB stick, or a
+# copy made with rsync/scp). Only segments missing from its local cache
+# (.model_store/) are copied, and each is checked against its hash.
+# The kiosk then builds trainer.bin and labels.json from the cached segments
+# and installs them in this order:
+#
+#   labels.json         new names only add ids, so the old model still reads correctly
+#   trainer.bin         atomic replace; the recognizer now uses the new version
+#                       (loaded into the OpenCV LBPH recognizer, see
+#                       recognize_attendance.load_recognizer)
+#   model_version.json  version number and the checksum of that trainer.bin
+#
+# Each file is replaced atomically. Because ids are stable, every state in
+# between is consistent; a removed person just reads as Unknown a little
+# early. The version a kiosk reports (installed_version()) is taken from
+# model_version.json only if its checksum matches the trainer.bin in place.
+
+STORE_DIR = "model_store"
+LOCAL_DIR = ".model_store"
+VERSION_PATH = "model_version.json"
+KEEP_VERSIONS = 5
+
+MODEL_VERSION = metrics.gauge("attendance_model_version", "Installed model version (0: unversioned)")
+
+def _digest(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+def segment_bytes(histograms):
+    """Serialized segment; rows are sorted so the same histograms give the same bytes"""
+    rows = np.ascontiguousarray(histograms, dtype=np.float32)
+    rows = rows[sorted(range(len(rows)), key=lambda i: rows[i].tobytes())]
+    buf = io.BytesIO()
+    np.save(buf, rows, allow_pickle=False)
+    return buf.getvalue()
+
+def read_segment(path):
+    return np.load(path, allow_pickle=False)
+
+def read_manifest(store=STORE_DIR):
+    """The store's current manifest (None if the store has none)"""
+    path = os.path.join(store, "manifest.json")
+    if not os.path.exists(path):
+        return None
+    with open(path, "r") as f:
+        return json.load(f)
+
+def _source_model(model_path="trainer.yml", binary_path=BINARY_MODEL_PATH):
+    """(params, histograms, labels) of the full trained model"""
+    if os.path.exists(model_path):
+        from compact_model import load_model_histograms
+        return load_model_histograms(model_path)
+    return load_binary_model(binary_path)
+
+def publish(store=STORE_DIR, model_path="trainer.yml", labels_path="labels.json"):
+    """Add the trained model to the store as a new version; returns its manifest"""
+    params, histograms, labels = _source_model(model_path)
+    with open(labels_path, "r") as f:
+        train_labels = json.load(f)
+    previous = read_manifest(store)
+    ids = {p["name"]: p["id"] for p in previous["people"]} if previous else {}
+    next_id = previous["next_id"] if previous else 0
+    old_segments = {p["name"]: p["segment"] for p in previous["people"]} if previous else {}
+
+    labels = np.asarray(labels).reshape(-1)
+    people = []
+    new_bytes = 0
+    for label in np.unique(labels):
+        name = train_labels.get(str(int(label)))
+        if name is None:
+            continue
+        data = segment_bytes(histograms[labels == label])
+        digest = _digest(data)
+        path = os.path.join(store, "segments", digest + ".npy")
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+            new_bytes += len(data)
+        if name not in ids:
+            ids[name] = next_id
+            next_id += 1
+        people.append({"name": name, "id": ids[name], "segment": digest,
+                       "count": int((labels == label).sum()), "bytes": len(data)})
+    people.sort(key=lambda p: p["id"])
+
+    params = {k: (float(v) if k == "threshold" else int(v)) for k, v in params.items()}
+    body = {"params": params, "dim": int(histograms.shape[1]), "people": people}
+    model_id = _digest(json.dumps(body, sort_keys=True).encode())
+    if previous is not None and previous["model_id"] == model_id:
+        print(f"[OK] Model unchanged; store stays at version {previous['version']}.")
+        return previous
+
+    version = previous["version"] + 1 if previous else 1
+    manifest = dict(body, version=version, model_id=model_id, next_id=next_id,
+                    created=time.time())
+    data = json.dumps(manifest, indent=2).encode()
+    _write_atomic(os.path.join(store, "manifests", f"v{version}.json"), data)
+    _write_atomic(os.path.join(store, "manifest.json"), data)
+
+    names = {p["name"] for p in people}
+    changed = sum(1 for p in people if old_segments.get(p["name"], p["segment"]) != p["segment"])
+    added = len(names - set(old_segments))
+    removed = len(set(old_segments) - names)
+    print(f"[OK] Published model version {version} ({model_id[:8]}) to {store}: "
+          f"{len(people)} people, {added} added, {changed} changed, {removed} removed, "
+          f"{new_bytes / 1e6:.1f} MB of new segments")
+    _prune(store, KEEP_VERSIONS)
+    return manifest
+
+def _prune(store, keep):
+    """Remove manifests older than the last keep versions and their unused segments"""
+    manifest_dir = os.path.join(store, "manifests")
+    versions = sorted(int(n[1:-5]) for n in os.listdir(manifest_dir)
+                      if n.startswith("v") and n.endswith(".json"))
+    for version in versions[:-keep]:
+        os.remove(os.path.join(manifest_dir, f"v{version}.json"))
+    used = set()
+    for version in versions[-keep:]:
+        with open(os.path.join(manifest_dir, f"v{version}.json"), "r") as f:
+            used.update(p["segment"] for p in json.load(f)["people"])
+    segment_dir = os.path.join(store, "segments")
+    for name in os.listdir(segment_dir):
+        if name.endswith(".npy") and name[:-4] not in used:
+            os.remove(os.path.join(segment_dir, name))
+
+def installed_version(model_path=BINARY_MODEL_PATH, version_path=VERSION_PATH):
+    """{"version", "model_id", ...} of the installed model, or None if unversioned.
+
+    The version file only counts if it describes the trainer.bin in place.
+    """
+    try:
+        with open(version_path, "r") as f:
+            info = json.load(f)
+        header = read_header(model_path)
+    except (OSError, ValueError, ModelFormatError):
+        return None
+    if info.get("checksum") != header["checksum"]:
+        return None
+    return info
+
+def describe_version(info=None):
+    """Short text for logs and status, e.g. "v12 (3f2a9c1e)"; sets the version metric"""
+    info = installed_version() if info is None else info
+    MODEL_VERSION.set(info["version"] if info else 0)
+    if info is None:
+        return "unversioned"
+    return f"v{info['version']} ({info['model_id'][:8]})"
+
+def sync(source, local=LOCAL_DIR, model_path=BINARY_MODEL_PATH, labels_path="labels.json",
+         version_path=VERSION_PATH):
+    """Fetch the source store's current version and install it.
+
+    Returns the installed version info, or None if the source has no model.
+    Raises ValueError if a fetched segment does not match its hash.
+    """
+    manifest = read_manifest(source)
+    if manifest is None:
+        print(f"[ERROR] No model published in {source}")
+        return None
+    current = installed_version(model_path, version_path)
+    if current is not None and current["model_id"] == manifest["model_id"]:
+        print(f"[OK] Model is up to date ({describe_version(current)}).")
+        return current
+
+    segment_dir = os.path.join(local, "segments")
+    os.makedirs(segment_dir, exist_ok=True)
+    fetched = fetched_bytes = 0
+    for person in manifest["people"]:
+        path = os.path.join(segment_dir, person["segment"] + ".npy")
+        if os.path.exists(path):
+            continue
+        with open(os.path.join(source, "segments", person["segment"] + ".npy"), "rb") as f:
+            data = f.read()
+        if _digest(data) != person["segment"]:
+            raise ValueError(f"Segment for {person['name']} is corrupt (hash mismatch)")
+        _write_atomic(path, data)
+        fetched += 1
+        fetched_bytes += len(data)
+
+    histograms = []
+    labels = []
+    for person in manifest["people"]:
+        rows = read_segment(os.path.join(segment_dir, person["segment"] + ".npy"))
+        histograms.append(rows)
+        labels.extend([person["id"]] * len(rows))
+    histograms = np.vstack(histograms) if histograms else np.zeros((0, manifest["dim"]), np.float32)
+    id_to_label = {str(p["id"]): p["name"] for p in manifest["people"]}
+
+    # Order matters: see the top of this file
+    _write_atomic(labels_path, json.dumps(id_to_label).encode())
+    write_binary_model(model_path, manifest["params"], histograms, labels)
+    info = {"version": manifest["version"], "model_id": manifest["model_id"],
+            "checksum": read_header(model_path)["checksum"], "installed": time.time(),
+            "source": os.path.abspath(source)}
+    _write_atomic(version_path, json.dumps(info, indent=2).encode())
+
+    # Segments of people no longer in the model
+    used = {p["segment"] + ".npy" for p in manifest["people"]}
+    for name in os.listdir(segment_dir):
+        if name.endswith(".npy") and name not in used:
+            os.remove(os.path.join(segment_dir, name))
+
+    total = sum(p["bytes"] for p in manifest["people"])
+    print(f"[OK] Installed model {describe_version(info)}: fetched {fetched} of "
+          f"{len(manifest['people'])} segments ({fetched_bytes / 1e6:.1f} of {total / 1e6:.1f} MB)")
+    return info
+
+class ModelWatcher:
+    """Calls on_change() in a background thread when any of paths is modified"""
+
+    def __init__(self, on_change, paths=(BINARY_MODEL_PATH, "trainer.yml", "labels.json"),
+                 interval=10.0):
+        self.on_change = on_change
+        self.paths = paths
+        self.interval = interval
+        self.stop_event = threading.Event()
+
+    def _stamp(self):
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else 0 for p in self.paths)
+
+    def _run(self):
+        stamp = self._stamp()
+        while not self.stop_event.wait(self.interval):
+            if self._stamp() != stamp:
+                # Let a sync or training run finish writing its files
+                time.sleep(1.0)
+                stamp = self._stamp()
+                try:
+                    self.on_change()
+                except Exception as e:
+                    print(f"[ERROR] Model reload failed: {e}")
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+
+def main():
+    parser = argparse.ArgumentParser(description="Versioned model distribution to kiosks")
+    sub = parser.add_subparsers(dest="command", required=True)
+    pub = sub.add_parser("publish", help="add the trained model to the store as a new version")
+    pub.add_argument("--store", default=STORE_DIR)
+    syn = sub.add_parser("sync", help="install the store's current version on this kiosk")
+    syn.add_argument("source", help="store directory to sync from")
+    syn.add_argument("--watch", type=float, metavar="SECONDS",
+                     help="keep syncing every SECONDS")
+    sub.add_parser("version", help="show the installed model version")
+    hist = sub.add_parser("history", help="list the versions in a store")
+    hist.add_argument("--store", default=STORE_DIR)
+    args = parser.parse_args()
+
+    if args.command == "publish":
+        if not os.path.exists("labels.json"):
+            print("[ERROR] labels.json not found. Run train_lbph.py first.")
+            sys.exit(1)
+        publish(args.store)
+    elif args.command == "sync":
+        while True:
+            try:
+                sync(args.source)
+            except (OSError, ValueError) as e:
+                print(f"[ERROR] Sync failed: {e}")
+                if not args.watch:
+                    sys.exit(1)
+            if not args.watch:
+                break
+            time.sleep(args.watch)
+    elif args.command == "version":
+        print(describe_version())
+    elif args.command == "history":
+        manifest_dir = os.path.join(args.store, "manifests")
+        if not os.path.isdir(manifest_dir):
+            print(f"[ERROR] No model store at {args.store}")
+            sys.exit(1)
+        names = sorted(os.listdir(manifest_dir), key=lambda n: int(n[1:-5]))
+        for name in names:
+            with open(os.path.join(manifest_dir, name), "r") as f:
+                m = json.load(f)
+            print(f"v{m['version']:<4} {m['model_id'][:8]}  {time.ctime(m['created'])}  "
+                  f"{len(m['people'])} people")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+import os
+import json
+import time
+import threading
+from collections import deque
+
+import metrics
+from telegram_bot import format_attendance_message
+
+# Batched, rate-limited delivery of attendance notifications.
+#
+# Attendance events are not sent one message each. Events arriving within
+# `window` seconds of the first pending one are coalesced into a digest
+# (a count of entries and exits, then one line per event), split to stay
+# under Telegram's message size limit. A digest is queued for every chat
+# target. Each chat has its own token bucket (`rate_per_minute`, `burst`),
+# so a class of 200 arriving at once costs a few messages per chat instead
+# of 200, and never more than the chat's limit.
+#
+# Failed sends stay at the head of their chat's queue and are retried with
+# exponential backoff. Pending events and undelivered messages are written
+# to `spool_path` on every change and loaded again at startup, so nothing is
+# lost across a crash or restart.
+
+MESSAGE_LIMIT = 4000   # Telegram allows 4096 characters
+
+NOTIFICATIONS_SENT = metrics.counter("attendance_notifications_sent_total",
+                                     "Notification messages delivered")
+NOTIFICATIONS_PENDING = metrics.gauge("attendance_notifications_pending",
+                                      "Undelivered notification messages")
+
+class TokenBucket:
+    """rate tokens per second, up to burst"""
+
+    def __init__(self, rate, burst=1, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.tokens = float(burst)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Seconds until a token is available (0 if one is)"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self._refill()
+        self.tokens -= 1
+
+def format_digest(events, limit=MESSAGE_LIMIT):
+    """Messages for a list of (name, action, time, confidence) events.
+
+    A single event keeps the usual format_attendance_message text.
+    """
+    if len(events) == 1:
+        return [format_attendance_message(*events[0])]
+
+    lines = [f"{time_str}  {action:<5}  {name}" for name, action, time_str, _ in events]
+    entries = sum(1 for e in events if e[1] == "Entry")
+    header = f"Attendance: {entries} entries, {len(events) - entries} exits"
+    messages, current = [], []
+    size = len(header)
+    for line in lines:
+        if current and size + len(line) + 1 > limit:
+            messages.append(current)
+            current, size = [], len(header)
+        current.append(line)
+        size += len(line) + 1
+    messages.append(current)
+    if len(messages) == 1:
+        return [header + "\n" + "\n".join(messages[0])]
+    return [f"{header} ({i}/{len(messages)})\n" + "\n".join(part)
+            for i, part in enumerate(messages, 1)]
+
+class NotificationAggregator:
+    """Coalesces attendance events into digests and delivers them per chat.
+
+    send(chat_id, text) must raise on failure. Sending happens in a
+    background thread; add() only queues.
+    """
+
+    def __init__(self, send, chat_ids, window=10.0, rate_per_minute=20, burst=3,
+                 spool_path="notifications_pending.json", max_backoff=300.0,
+                 clock=time.monotonic):
+        self.send = send
+        self.chat_ids = [str(c) for c in chat_ids]
+        self.window = window
+        self.spool_path = spool_path
+        self.max_backoff = max_backoff
+        self.clock = clock
+        self.buckets = {c: TokenBucket(rate_per_minute / 60.0, burst, clock) for c in self.chat_ids}
+        self.outbox = {c: deque() for c in self.chat_ids}
+        self.retry_at = {c: 0.0 for c in self.chat_ids}
+        self.failures = {c: 0 for c in self.chat_ids}
+        self.events = []
+        self.first_event = 0.0
+        self.flushing = False
+        self.closed = False
+        self.sending = 0
+        self.cond = threading.Condition()
+        self.thread = None
+        self._load()
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def add(self, name, action, time_str, confidence):
+        with self.cond:
+            if not self.events:
+                self.first_event = self.clock()
+            self.events.append((name, action, time_str, round(float(confidence), 2)))
+            self._save()
+            self.cond.notify_all()
+
+    def pending(self):
+        """Undelivered messages plus events not yet in a digest"""
+        with self.cond:
+            return sum(len(q) for q in self.outbox.values()) + len(self.events)
+
+    def flush(self, timeout=None):
+        """Send everything now, ignoring the window; True if all was delivered"""
+        if self.thread is None:
+            return self.pending() == 0
+        deadline = None if timeout is None else self.clock() + timeout
+        with self.cond:
+            self.flushing = True
+            self.cond.notify_all()
+            while self.events or self.sending or any(self.outbox.values()):
+                remaining = None if deadline is None else deadline - self.clock()
+                if remaining is not None and remaining <= 0:
+                    break
+                self.cond.wait(remaining if remaining is not None else 1.0)
+            self.flushing = False
+            return not (self.events or self.sending or any(self.outbox.values()))
+
+    def close(self, timeout=10.0):
+        """Flush for up to timeout seconds; what is left stays in the spool"""
+        delivered = True
+        if self.thread is not None:
+            delivered = self.flush(timeout)
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+        if not delivered:
+            print(f"[WARNING] {self.pending()} notifications kept in {self.spool_path} "
+                  "for the next start")
+        return delivered
+
+    def _digest(self):
+        """Move pending events into every chat's outbox (caller holds cond)"""
+        texts = format_digest(self.events)
+        for chat_id in self.chat_ids:
+            self.outbox[chat_id].extend(texts)
+        self.events = []
+        self._save()
+
+    def _next_send(self, now):
+        """(chat_id, wait) of the chat that can send soonest (caller holds cond)"""
+        best, best_wait = None, None
+        for chat_id, queue in self.outbox.items():
+            if not queue:
+                continue
+            wait = max(self.retry_at[chat_id] - now, self.buckets[chat_id].delay())
+            if best_wait is None or wait < best_wait:
+                best, best_wait = chat_id, wait
+        return best, best_wait
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if self.closed:
+                    return
+                now = self.clock()
+                if self.events and (self.flushing or now - self.first_event >= self.window):
+                    self._digest()
+                chat_id, wait = self._next_send(now)
+                if chat_id is None or wait > 0:
+                    # Sleep until the chat can send or the window closes
+                    timeouts = [] if wait is None else [wait]
+                    if self.events and not self.flushing:
+                        timeouts.append(self.first_event + self.window - now)
+                    self.cond.wait(min(timeouts) if timeouts else None)
+                    continue
+                self.buckets[chat_id].take()
+                text = self.outbox[chat_id][0]
+                self.sending += 1
+
+            try:
+                self.send(chat_id, text)
+                ok = True
+            except Exception as e:
+                ok = False
+                error = e
+
+            with self.cond:
+                self.sending -= 1
+                if ok:
+                    self.outbox[chat_id].popleft()
+                    self.failures[chat_id] = 0
+                    NOTIFICATIONS_SENT.inc()
+                    self._save()
+                else:
+                    self.failures[chat_id] += 1
+                    backoff = min(self.max_backoff, 2.0 ** self.failures[chat_id])
+                    self.retry_at[chat_id] = self.clock() + backoff
+                    print(f"[WARNING] Notification to {chat_id} failed ({error}); "
+                          f"retrying in {backoff:.0f} s")
+                self.cond.notify_all()
+
+    def _save(self):
+        """Write pending events and messages to the spool (caller holds cond)"""
+        NOTIFICATIONS_PENDING.set(sum(len(q) for q in self.outbox.values()) + len(self.events))
+        if self.spool_path is None:
+            return
+        if not self.events and not any(self.outbox.values()):
+            if os.path.exists(self.spool_path):
+                os.remove(self.spool_path)
+            return
+        state = {"events": self.events,
+                 "messages": {c: list(q) for c, q in self.outbox.items() if q}}
+        tmp_path = self.spool_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.spool_path)
+        except OSError as e:
+            print(f"[WARNING] Failed to save pending notifications: {e}")
+
+    def _load(self):
+        if self.spool_path is None or not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Ignoring unreadable {self.spool_path}: {e}")
+            return
+        self.events = [tuple(e) for e in state.get("events", [])]
+        self.first_event = self.clock()
+        for chat_id, texts in state.get("messages", {}).items():
+            # Messages for chats no longer configured are dropped
+            if chat_id in self.outbox:
+                self.outbox[chat_id].extend(texts)
+        restored = self.pending()
+        if restored:
+            print(f"[OK] Restored {restored} undelivered notifications from {self.spool_path}")
+        NOTIFICATIONS_PENDING.set(restored)
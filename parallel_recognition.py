@@ -0,0 +1,239 @@
+import os
+import sys
+import time
+import queue
+import argparse
+import multiprocessing as mp
+from frame_ring import FrameRing, frame_shape
+
+# Multi-process analysis for multi-core boards. The main process captures
+# frames straight into a shared-memory FrameRing and sends only the frame's
+# sequence number to the workers; each worker owns a cascade and recognizer,
+# runs preprocessing, detection and recognition on the ring slot in place
+# and returns the boxes and prediction. Results are reordered by frame_id
+# and yielded as FrameAnalysis, so recognize_attendance.run_recognition()
+# can consume them exactly like the serial analyze_frames() generator.
+
+_mp = mp.get_context("spawn")
+
+def _worker(ring_name, tasks, results, model_version, recognize_every, shortlist, detector,
+            zones):
+    from recognize_attendance import load_model, preprocess, predict_largest_face
+    from face_detectors import create_detector
+    from zones import ZonedDetector
+    import cv2
+
+    ring = FrameRing.attach(ring_name)
+    detector = create_detector(*detector)
+    if zones:
+        detector = ZonedDetector(detector, zones)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+    model = load_model("trainer.yml", "labels.json", shortlist=shortlist)
+    loaded_version = model_version.value
+
+    try:
+        while True:
+            frame_id = tasks.get()
+            if frame_id is None:
+                break
+
+            if model_version.value != loaded_version:
+                loaded_version = model_version.value
+                model = load_model("trainer.yml", "labels.json", shortlist=shortlist) or model
+
+            gray_eq = preprocess(ring.get(frame_id), clahe)
+            faces = detector.detect(gray_eq)
+            prediction = None
+            if len(faces) > 0 and model is not None and frame_id % recognize_every == 0:
+                recognizer, id_to_label = model.current
+                prediction = predict_largest_face(recognizer, id_to_label, gray_eq, faces,
+                                                  check_blur=frame_id % 5 == 0)
+            boxes = [tuple(int(v) for v in f) for f in faces]
+            results.put((frame_id, boxes, tuple(prediction) if prediction else None))
+    finally:
+        ring.close()
+
+class ParallelRecognizer:
+    """Pool of analysis worker processes reading frames from a shared FrameRing"""
+
+    def __init__(self, workers=4, frame_shape=(480, 640, 3), slots_per_worker=2,
+                 recognize_every=1, ring=None, shortlist=0, detector=(None, None), zones=None):
+        self.n_workers = workers
+        self.shape = tuple(frame_shape)
+        self.n_slots = workers * slots_per_worker + 1
+        self.recognize_every = recognize_every
+        self.shortlist = shortlist
+        self.detector = tuple(detector)  # (backend, model) for create_detector
+        self.zones = zones               # zones.Zone list, or None for the whole frame
+        self.ring = ring
+        self.own_ring = ring is None
+        self.processes = []
+
+    def start(self):
+        if self.own_ring:
+            self.ring = FrameRing(self.shape, self.n_slots)
+        else:
+            self.n_slots = self.ring.n_slots
+        self.tasks = _mp.SimpleQueue()
+        self.results = _mp.Queue()  # get() with a timeout, so dead workers are noticed
+        self.model_version = _mp.Value("i", 0)
+
+        for _ in range(self.n_workers):
+            p = _mp.Process(target=_worker, daemon=True,
+                            args=(self.ring.name, self.tasks, self.results,
+                                  self.model_version, self.recognize_every, self.shortlist,
+                                  self.detector, self.zones))
+            p.start()
+            self.processes.append(p)
+        return self
+
+    def reload_model(self):
+        """Make every worker reload trainer.yml/labels.json before its next frame"""
+        with self.model_version.get_lock():
+            self.model_version.value += 1
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for p in self.processes:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+        self.processes = []
+        if self.own_ring and self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def _result(self, timeout=0.5):
+        """Next worker result; None if a worker has died"""
+        while True:
+            try:
+                return self.results.get(timeout=timeout)
+            except queue.Empty:
+                dead = [p for p in self.processes if not p.is_alive()]
+                if dead:
+                    print(f"[ERROR] A recognition worker exited (code {dead[0].exitcode}); "
+                          f"stopping. Check the detector and trainer.yml.")
+                    return None
+
+    def frames(self, cap, stop_event=None):
+        """Capture from cap and yield FrameAnalysis in frame order.
+
+        Frames next_id..frame_id are in the ring and must not be overwritten:
+        a new frame is captured only while fewer than n_slots are
+        outstanding, and the yielded frame counts until the consumer resumes
+        the generator. If a worker process dies, an error is printed and the
+        generator ends.
+        """
+        from recognize_attendance import FrameAnalysis, Prediction
+
+        ring = self.ring
+        pending = {}
+        in_flight = 0
+        frame_id = ring.head
+        next_id = frame_id + 1
+        source_done = False
+
+        while True:
+            can_capture = frame_id + 1 - next_id < self.n_slots
+            if not source_done:
+                if stop_event is not None and stop_event.is_set():
+                    source_done = True
+                elif can_capture:
+                    frame_id = ring.capture(cap)
+                    if frame_id:
+                        self.tasks.put(frame_id)
+                        in_flight += 1
+                    else:
+                        frame_id = ring.head
+                        source_done = True
+
+            if source_done and in_flight == 0:
+                return
+
+            # Block for a result only when capture cannot proceed
+            block = source_done or not can_capture
+            while in_flight and (block or not self.results.empty()):
+                result = self._result()
+                if result is None:
+                    return
+                fid, boxes, prediction = result
+                pending[fid] = (boxes, prediction)
+                in_flight -= 1
+                block = False
+
+            while next_id in pending:
+                boxes, prediction = pending.pop(next_id)
+                if prediction is not None:
+                    prediction = Prediction(*prediction)
+                yield FrameAnalysis(next_id, ring.get(next_id), boxes, prediction)
+                next_id += 1
+
+def benchmark(video_path, max_workers=4, max_frames=600):
+    """Measure analysis throughput on a recording for 1..max_workers processes"""
+    import cv2
+    from recognize_attendance import load_model
+    from face_detectors import create_detector
+
+    def run(frames):
+        count = 0
+        start = time.perf_counter()
+        for _ in frames:
+            count += 1
+            if count >= max_frames:
+                break
+        return count / (time.perf_counter() - start)
+
+    model = load_model("trainer.yml", "labels.json")
+    detector = create_detector()
+
+    # Serial baseline; detection/recognition on every frame to match the workers
+    cap = cv2.VideoCapture(video_path)
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+
+    def serial_frames():
+        from recognize_attendance import preprocess, predict_largest_face
+        while True:
+            ret, frame = cap.read()
+            if not ret:
+                return
+            gray_eq = preprocess(frame, clahe)
+            faces = detector.detect(gray_eq)
+            if len(faces):
+                recognizer, id_to_label = model.current
+                predict_largest_face(recognizer, id_to_label, gray_eq, faces)
+            yield frame
+
+    serial_fps = run(serial_frames())
+    cap.release()
+
+    print(f"{'mode':<12} {'FPS':>8} {'speedup':>8}")
+    print(f"{'serial':<12} {serial_fps:>8.1f} {1.0:>8.2f}")
+    for n in range(1, max_workers + 1):
+        cap = cv2.VideoCapture(video_path)
+        with ParallelRecognizer(n, frame_shape(cap)) as pool:
+            fps = run(pool.frames(cap))
+        cap.release()
+        print(f"{f'{n} worker(s)':<12} {fps:>8.1f} {fps / serial_fps:>8.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark multi-process recognition scaling")
+    parser.add_argument("video", help="recorded video to analyze")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--frames", type=int, default=600)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.video):
+        print(f"[ERROR] Video not found: {args.video}")
+        sys.exit(1)
+    benchmark(args.video, args.max_workers, args.frames)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+import os
+import json
+import time
+import heapq
+
+import metrics
+from config_file import CONFIG_PATH
+
+# Who is in view, by time rather than by frame count.
+#
+# A person is in view from their first sighting until grace_seconds pass
+# without another one. Times come from a monotonic clock (time.monotonic by
+# default), so the grace period means the same at 30 fps, at 8 fps under
+# load, or with frames skipped by the motion gate.
+#
+# Expiries are kept in a min-heap with one (deadline, name) entry per person
+# in view. A sighting only updates the person's last-seen time; the heap
+# entry is checked when its deadline comes up, and pushed back to the real
+# deadline if the person was seen in the meantime. Each frame therefore
+# costs O(log n) per expired entry and nothing per person still in view,
+# and a visible person is re-pushed at most once per grace period.
+#
+# The engine also remembers each person's last mark: a new mark within
+# cooldown_minutes of it is refused, so someone who steps out of view and
+# back does not toggle Entry/Exit.
+#
+# Defaults and per-person values live in the "presence" section of
+# attendance_config.json:
+#
+#   "presence": {
+#     "grace_seconds": 2.0,
+#     "cooldown_minutes": 0.5,
+#     "people": {"JohnDoe": {"grace_seconds": 5.0, "cooldown_minutes": 10}}
+#   }
+#
+# ManualClock stands in for time.monotonic where time is simulated
+# (load_generator.py, video backfill) or stepped by hand.
+
+PRESENCE_DEFAULTS = {"grace_seconds": 2.0, "cooldown_minutes": 0.5, "people": {}}
+
+IN_VIEW = metrics.gauge("attendance_people_in_view", "People seen within their grace period")
+COOLDOWN_BLOCKED = metrics.counter("attendance_cooldown_blocked_total",
+                                   "Marks refused because the person's cooldown had not passed")
+
+def load_presence_config(path=CONFIG_PATH):
+    """PRESENCE_DEFAULTS updated from attendance_config.json"""
+    config = dict(PRESENCE_DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config.update(json.load(f).get("presence", {}))
+    return config
+
+class ManualClock:
+    """A clock that only moves when told to"""
+
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+        return self.now
+
+    def set(self, now):
+        if now < self.now:
+            raise ValueError(f"Clock cannot go back from {self.now} to {now}")
+        self.now = now
+
+class PresenceEngine:
+    """Visibility with time-based expiry and per-person cooldowns.
+
+    grace_seconds     time without a sighting before a person leaves view
+    cooldown_minutes  least time between two marks of the same person
+    people            {name: {"grace_seconds": .., "cooldown_minutes": ..}}
+    clock             function returning monotonic seconds
+    """
+
+    def __init__(self, grace_seconds=2.0, cooldown_minutes=0.5, people=None,
+                 clock=time.monotonic):
+        self.grace_seconds = grace_seconds
+        self.cooldown_minutes = cooldown_minutes
+        self.people = people or {}
+        self.clock = clock
+        self.last_seen = {}      # {name: time} for everyone in view
+        self.since = {}          # {name: time} the current visit started
+        self.last_mark = {}      # {name: time}
+        self._expiries = []      # heap of (deadline, name), one per person in view
+
+    @classmethod
+    def from_config(cls, path=CONFIG_PATH, clock=time.monotonic, **overrides):
+        """Engine set up from attendance_config.json; keyword arguments win"""
+        config = load_presence_config(path)
+        config.update({k: v for k, v in overrides.items() if v is not None})
+        return cls(config["grace_seconds"], config["cooldown_minutes"],
+                   config.get("people"), clock)
+
+    def _setting(self, name, key):
+        return self.people.get(name, {}).get(key, getattr(self, key))
+
+    def grace(self, name):
+        return self._setting(name, "grace_seconds")
+
+    def cooldown(self, name):
+        """Cooldown in seconds"""
+        return self._setting(name, "cooldown_minutes") * 60.0
+
+    def now(self):
+        return self.clock()
+
+    # Visibility
+
+    def seen(self, name, now=None):
+        """Record a sighting; True if it starts a new visit"""
+        now = self.clock() if now is None else now
+        new = name not in self.last_seen
+        self.last_seen[name] = now
+        if new:
+            self.since[name] = now
+            heapq.heappush(self._expiries, (now + self.grace(name), name))
+            IN_VIEW.set(len(self.last_seen))
+        return new
+
+    def expire(self, now=None):
+        """Remove and return the people whose grace period has run out"""
+        now = self.clock() if now is None else now
+        left = []
+        heap = self._expiries
+        while heap and heap[0][0] <= now:
+            _, name = heapq.heappop(heap)
+            deadline = self.last_seen[name] + self.grace(name)
+            if deadline > now:
+                # Seen since the entry was pushed
+                heapq.heappush(heap, (deadline, name))
+            else:
+                del self.last_seen[name]
+                del self.since[name]
+                left.append(name)
+        if left:
+            IN_VIEW.set(len(self.last_seen))
+        return left
+
+    def visible(self, name):
+        return name in self.last_seen
+
+    def in_view(self):
+        return list(self.last_seen)
+
+    def next_expiry(self):
+        """Earliest time someone may leave view (None if nobody is in view)"""
+        return self._expiries[0][0] if self._expiries else None
+
+    # Cooldown
+
+    def cooldown_left(self, name, now=None):
+        """Seconds until name may be marked again (0 if now)"""
+        now = self.clock() if now is None else now
+        last = self.last_mark.get(name)
+        if last is None:
+            return 0.0
+        return max(0.0, last + self.cooldown(name) - now)
+
+    def may_mark(self, name, now=None):
+        if self.cooldown_left(name, now) > 0:
+            COOLDOWN_BLOCKED.inc()
+            return False
+        return True
+
+    def marked(self, name, now=None):
+        self.last_mark[name] = self.clock() if now is None else now
@@ -0,0 +1,163 @@
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import cv2
+
+# Browser preview for headless units. The recognition loop hands annotated
+# frames to a PreviewServer, which streams them as MJPEG and serves the
+# current status as JSON:
+#
+#   /               minimal page showing the stream
+#   /stream.mjpg    multipart/x-mixed-replace JPEG stream
+#   /snapshot.jpg   one JPEG
+#   /status         {"person": ..., "status": ..., "fps": ...}
+#
+# Nothing is drawn or encoded unless a client is connected, and frames are
+# taken at most fps times per second. JPEG encoding happens once per frame
+# in the HTTP threads, shared by all clients, not in the recognition loop.
+
+_PAGE = b"""<!doctype html>
+<html><head><title>Attendance preview</title></head>
+<body style="margin:0;background:#000;color:#fff;font-family:sans-serif">
+<img src="/stream.mjpg" style="width:100%">
+<pre id="status"></pre>
+<script>
+setInterval(function () {
+  fetch("/status").then(r => r.json()).then(s => {
+    document.getElementById("status").textContent = JSON.stringify(s, null, 2);
+  });
+}, 1000);
+</script>
+</body></html>
+"""
+
+class PreviewServer:
+    def __init__(self, host="127.0.0.1", port=8080, fps=5.0, quality=70):
+        self.host = host
+        self.port = port
+        self.interval = 1.0 / fps
+        self.quality = quality
+        self.status = {}
+        self.clients = 0
+        self.closed = False
+        self.frame = None
+        self.frame_seq = 0
+        self.jpeg = None
+        self.jpeg_seq = 0
+        self.last_submit = 0.0
+        self.cond = threading.Condition()
+        self.encode_lock = threading.Lock()
+        self.httpd = None
+
+    def start(self):
+        self.httpd = ThreadingHTTPServer((self.host, self.port), _PreviewHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.preview = self
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        print(f"[OK] Preview available at http://{self.host}:{self.port}/")
+        return self
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+        if self.httpd is not None:
+            self.httpd.shutdown()
+            self.httpd.server_close()
+            self.httpd = None
+
+    def wants_frame(self):
+        """True if a client is waiting and the next preview frame is due"""
+        return self.clients > 0 and time.monotonic() - self.last_submit >= self.interval
+
+    def submit(self, frame):
+        """Publish an annotated frame (copied, so the caller may reuse its buffer)"""
+        with self.cond:
+            self.frame = frame.copy()
+            self.frame_seq += 1
+            self.last_submit = time.monotonic()
+            self.cond.notify_all()
+
+    def connect(self):
+        with self.cond:
+            self.clients += 1
+            # Make the next loop iteration produce a frame for the new client
+            self.last_submit = 0.0
+
+    def disconnect(self):
+        with self.cond:
+            self.clients -= 1
+
+    def wait_jpeg(self, after_seq, timeout=5.0):
+        """Wait for a frame newer than after_seq; returns (seq, jpeg bytes) or (after_seq, None)"""
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.closed or self.frame_seq > after_seq, timeout):
+                return after_seq, None
+            if self.closed:
+                return after_seq, None
+            seq, frame = self.frame_seq, self.frame
+
+        # Encode outside self.cond so submit() never waits for JPEG encoding.
+        # The first client to ask encodes; the others reuse the result.
+        with self.encode_lock:
+            if self.jpeg_seq < seq:
+                ok, buf = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+                self.jpeg = buf.tobytes() if ok else None
+                self.jpeg_seq = seq
+            return self.jpeg_seq, self.jpeg
+
+class _PreviewHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        preview = self.server.preview
+        if self.path == "/":
+            self.send_body(_PAGE, "text/html")
+        elif self.path == "/status":
+            self.send_body(json.dumps(dict(preview.status)).encode(), "application/json")
+        elif self.path == "/snapshot.jpg":
+            preview.connect()
+            try:
+                _, jpeg = preview.wait_jpeg(preview.frame_seq)
+            finally:
+                preview.disconnect()
+            if jpeg is None:
+                self.send_error(503, "No frame available")
+            else:
+                self.send_body(jpeg, "image/jpeg")
+        elif self.path == "/stream.mjpg":
+            self.stream(preview)
+        else:
+            self.send_error(404)
+
+    def send_body(self, body, content_type):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def stream(self, preview):
+        self.send_response(200)
+        self.send_header("Content-Type", "multipart/x-mixed-replace; boundary=frame")
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+
+        preview.connect()
+        try:
+            seq = preview.frame_seq
+            while not preview.closed:
+                seq, jpeg = preview.wait_jpeg(seq)
+                if jpeg is None:
+                    continue
+                self.wfile.write(b"--frame\r\nContent-Type: image/jpeg\r\n"
+                                 b"Content-Length: " + str(len(jpeg)).encode() + b"\r\n\r\n")
+                self.wfile.write(jpeg)
+                self.wfile.write(b"\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            preview.disconnect()
+
+    def log_message(self, format, *args):
+        pass
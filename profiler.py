@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import threading
+from collections import Counter
+
+# Profiling for the recognition loop. Two complementary views:
+#
+# - Stage timers around individual OpenCV calls (cvtColor, CLAHE,
+#   bilateralFilter, each detectMultiScale pass, predict, drawing, imshow).
+#   When profiling is off a stage costs one attribute check.
+# - A sampling profiler thread that records the loop thread's Python stack
+#   every few milliseconds and writes "collapsed" stacks, the input format
+#   of flamegraph.pl, speedscope and inferno.
+#
+# Profiling can be switched on and off while the loop runs (key 'p', SIGUSR1
+# or the service "profile" command); each session writes its own report.
+# Requests from other threads and signal handlers only set a flag; the loop
+# applies them via poll() so starting and stopping happen on its own thread.
+
+class _Stage:
+    __slots__ = ("profiler", "name", "start", "count", "total", "max")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = None
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def begin(self):
+        if self.profiler.enabled:
+            self.start = time.perf_counter()
+
+    def end(self):
+        if self.start is not None:
+            elapsed = time.perf_counter() - self.start
+            self.start = None
+            self.count += 1
+            self.total += elapsed
+            if elapsed > self.max:
+                self.max = elapsed
+
+    def __enter__(self):
+        self.begin()
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+        return False
+
+class StackSampler(threading.Thread):
+    """Samples one thread's Python stack into collapsed-stack counts"""
+
+    def __init__(self, thread_id, interval=0.005):
+        super().__init__(daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self.stop_event = threading.Event()
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self.stop_event.set()
+        self.join()
+
+class Profiler:
+    def __init__(self, output_dir="profiles", sample_interval=0.005):
+        self.enabled = False
+        self.output_dir = output_dir
+        self.sample_interval = sample_interval
+        self.stages = {}
+        self.target_thread = threading.get_ident()
+        self.sampler = None
+        self.started_at = None
+        self.toggle_requested = False
+        self.lock = threading.Lock()
+
+    def stage(self, name):
+        """Reusable timer for a named stage"""
+        if name not in self.stages:
+            self.stages[name] = _Stage(self, name)
+        return self.stages[name]
+
+    def attach(self):
+        """Sample the calling thread (call from the thread running the loop)"""
+        self.target_thread = threading.get_ident()
+
+    def start(self):
+        with self.lock:
+            if self.enabled:
+                return
+            for stage in self.stages.values():
+                stage.reset()
+            self.sampler = StackSampler(self.target_thread, self.sample_interval)
+            self.sampler.start()
+            self.started_at = time.time()
+            self.enabled = True
+            print("[OK] Profiling started.")
+
+    def stop(self):
+        """Stop profiling and write the report; returns the output paths"""
+        with self.lock:
+            if not self.enabled:
+                return None
+            self.enabled = False
+            self.sampler.stop()
+            paths = self.write_report()
+            self.sampler = None
+            return paths
+
+    def toggle(self):
+        if self.enabled:
+            self.stop()
+        else:
+            self.start()
+
+    def request_toggle(self):
+        """Ask the loop to toggle profiling at its next poll()"""
+        self.toggle_requested = True
+
+    def poll(self):
+        if self.toggle_requested:
+            self.toggle_requested = False
+            self.toggle()
+
+    def summary_table(self):
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        stages = [s for s in self.stages.values() if s.count]
+        total = sum(s.total for s in stages) or 1e-9
+        lines = [f"{'stage':<18} {'calls':>8} {'total ms':>10} {'mean ms':>9} {'max ms':>9} {'share':>7}"]
+        for s in sorted(stages, key=lambda s: s.total, reverse=True):
+            lines.append(f"{s.name:<18} {s.count:>8} {s.total * 1000:>10.1f} "
+                         f"{s.total / s.count * 1000:>9.2f} {s.max * 1000:>9.2f} "
+                         f"{s.total / total * 100:>6.1f}%")
+        lines.append(f"profiled {elapsed:.1f} s, {self.sampler.samples} stack samples")
+        return "\n".join(lines)
+
+    def write_report(self):
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self.started_at))
+        folded_path = os.path.join(self.output_dir, f"profile-{stamp}.folded")
+        summary_path = os.path.join(self.output_dir, f"profile-{stamp}.txt")
+
+        with open(folded_path, "w") as f:
+            for stack, count in self.sampler.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        table = self.summary_table()
+        with open(summary_path, "w") as f:
+            f.write(table + "\n")
+
+        print(table)
+        print(f"[OK] Profile written to {summary_path} and {folded_path}")
+        print(f"     Flame graph: flamegraph.pl {folded_path} > profile.svg")
+        return summary_path, folded_path
+
+PROFILER = Profiler()
+
+def install_signal_toggle(profiler=PROFILER):
+    """Toggle profiling with SIGUSR1 (useful for headless runs)"""
+    import signal
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: profiler.request_toggle())
@@ -0,0 +1,404 @@
+import os
+import sys
+import time
+import queue
+import socket
+import struct
+import argparse
+import tempfile
+import threading
+import socketserver
+
+import metrics
+
+# Central recognition server for thin camera nodes.
+#
+# In edge mode a kiosk keeps capture, motion gating and detection, and sends
+# the 150x150 grayscale crop of each face it needs recognized to this server
+# (recognize_attendance.py --server ADDRESS). The server holds the one
+# model, so enrollment and training happen in one place. ADDRESS is
+# host:port for TCP or a filesystem path for a Unix socket.
+#
+# Protocol, per connection, any number of exchanges:
+#
+#   request   REQUEST header (request_id, height, width), then height*width
+#             bytes of grayscale pixels
+#   reply     REPLY header (request_id, distance, name length), then the
+#             UTF-8 name ("Unknown" below the model threshold)
+#
+# Crops rather than LBPH descriptors travel over the wire: a crop is 22.5 KB,
+# the default 8x8-cell histogram is 64 KB.
+#
+# Requests from all connections are queued and recognized in batches of up
+# to max_batch, waiting at most max_wait for a batch to fill, so the model's
+# histograms are streamed once per batch rather than once per face. The
+# server reloads the model when trainer.yml or trainer.bin changes.
+#
+#   python recognition_server.py serve --listen 0.0.0.0:7070
+#   python recognition_server.py benchmark --nodes 1 2 4 8
+#
+# The benchmark runs the server and 1..N simulated nodes on this machine.
+
+REQUEST = struct.Struct("!IHH")
+REPLY = struct.Struct("!IdH")
+CROP_SIZE = (150, 150)
+MODEL_FILES = ("trainer.yml", "trainer_compact.yml", "trainer.bin", "labels.json")
+
+REQUESTS = metrics.counter("attendance_server_requests_total", "Crops recognized by the server")
+BATCH_SIZE = metrics.histogram("attendance_server_batch_size", "Crops per recognition batch",
+                               buckets=(1, 2, 4, 8, 16, 32, 64))
+T_BATCH = metrics.stage_timer("server_batch")
+
+def parse_address(address):
+    """(family, address) for "host:port" (TCP) or a socket path (Unix)"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit() and "/" not in address:
+        return socket.AF_INET, (host or "127.0.0.1", int(port))
+    return socket.AF_UNIX, address
+
+def _read_exact(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise ConnectionError("connection closed")
+    return data
+
+def predict_batch(recognizer, crops):
+    """(label_id, distance) per crop, batched where the recognizer supports it"""
+    if hasattr(recognizer, "predict_batch"):
+        return recognizer.predict_batch(crops)
+    # cv2 LBPH recognizer
+    return [tuple(recognizer.predict(crop)) for crop in crops]
+
+class _Request:
+    __slots__ = ("crop", "done", "name", "distance")
+
+    def __init__(self, crop):
+        self.crop = crop
+        self.done = threading.Event()
+        self.name = "Unknown"
+        self.distance = float("inf")
+
+class RecognitionServer:
+    """Recognizes face crops from many connections in batches"""
+
+    def __init__(self, model, address, max_batch=32, max_wait=0.005, reload_interval=5.0,
+                 loader=None):
+        self.model = model                # ModelHandle
+        self.address = address
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.reload_interval = reload_interval
+        self.loader = loader              # callable returning a new ModelHandle, or None
+        self.requests = queue.Queue()
+        self.closed = threading.Event()
+        self.batches = 0
+        self.recognized = 0
+        self.server = None
+
+    def start(self):
+        family, address = parse_address(self.address)
+        if family == socket.AF_UNIX:
+            if os.path.exists(address):
+                os.unlink(address)
+            self.server = socketserver.ThreadingUnixStreamServer(address, _Handler)
+        else:
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            self.server = socketserver.ThreadingTCPServer(address, _Handler)
+        self.server.daemon_threads = True
+        self.server.recognition = self
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def close(self):
+        self.closed.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            family, address = parse_address(self.address)
+            if family == socket.AF_UNIX and os.path.exists(address):
+                os.unlink(address)
+            self.server = None
+
+    def recognize(self, crop):
+        """Queue one crop and wait for its (name, distance)"""
+        request = _Request(crop)
+        self.requests.put(request)
+        request.done.wait()
+        return request.name, request.distance
+
+    def _next_batch(self):
+        try:
+            batch = [self.requests.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self.requests.get(timeout=max(remaining, 0)) if remaining > 0
+                             else self.requests.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _model_stamp(self):
+        return tuple(os.path.getmtime(p) if os.path.exists(p) else 0 for p in MODEL_FILES)
+
+    def _run(self):
+        stamp = self._model_stamp()
+        checked = time.monotonic()
+        while not self.closed.is_set():
+            if self.loader is not None and time.monotonic() - checked >= self.reload_interval:
+                checked = time.monotonic()
+                if self._model_stamp() != stamp:
+                    stamp = self._model_stamp()
+                    model = self.loader()
+                    if model is not None:
+                        self.model.swap(*model.current)
+                        print("[OK] Reloaded model.")
+
+            batch = self._next_batch()
+            if not batch:
+                continue
+            recognizer, id_to_label = self.model.current
+            with T_BATCH:
+                try:
+                    results = predict_batch(recognizer, [r.crop for r in batch])
+                except Exception as e:
+                    print(f"[ERROR] Recognition failed: {e}")
+                    results = [(-1, float("inf"))] * len(batch)
+            BATCH_SIZE.observe(len(batch))
+            REQUESTS.inc(len(batch))
+            self.batches += 1
+            self.recognized += len(batch)
+            for request, (label_id, distance) in zip(batch, results):
+                request.name = id_to_label.get(str(label_id), "Unknown")
+                request.distance = float(distance)
+                request.done.set()
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        import numpy as np
+        server = self.server.recognition
+        try:
+            while True:
+                header = self.rfile.read(REQUEST.size)
+                if not header:
+                    return
+                if len(header) != REQUEST.size:
+                    raise ConnectionError("truncated request")
+                request_id, height, width = REQUEST.unpack(header)
+                pixels = _read_exact(self.rfile, height * width)
+                crop = np.frombuffer(pixels, dtype=np.uint8).reshape(height, width)
+                name, distance = server.recognize(crop)
+                encoded = name.encode()
+                self.wfile.write(REPLY.pack(request_id, distance, len(encoded)) + encoded)
+        except (ConnectionError, OSError):
+            return
+
+class RemoteRecognizer:
+    """Recognizer whose predict() asks a RecognitionServer.
+
+    Labels are numbered locally as names arrive, in id_to_label, so a
+    ModelHandle(remote, remote.id_to_label) works wherever a local model
+    does. If the server cannot be reached, predict() answers "Unknown" and
+    reconnects on a later call.
+    """
+
+    def __init__(self, address, timeout=2.0, retry_interval=5.0):
+        self.address = address
+        self.timeout = timeout
+        self.retry_interval = retry_interval
+        self.id_to_label = {"-1": "Unknown"}
+        self.label_ids = {"Unknown": -1}
+        self.sock = None
+        self.stream = None
+        self.request_id = 0
+        self.failed_at = None
+
+    def connect(self):
+        family, address = parse_address(self.address)
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(address)
+        except OSError:
+            sock.close()
+            raise
+        if family == socket.AF_INET:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self.sock = sock
+        self.stream = sock.makefile("rb")
+        return self
+
+    def close(self):
+        if self.sock is not None:
+            self.stream.close()
+            self.sock.close()
+            self.sock = self.stream = None
+
+    def recognize(self, crop):
+        """(name, distance) for a grayscale crop; raises OSError on failure"""
+        if self.sock is None:
+            self.connect()
+        self.request_id = (self.request_id + 1) & 0xFFFFFFFF
+        height, width = crop.shape[:2]
+        try:
+            self.sock.sendall(REQUEST.pack(self.request_id, height, width) + crop.tobytes())
+            request_id, distance, length = REPLY.unpack(_read_exact(self.stream, REPLY.size))
+            name = _read_exact(self.stream, length).decode()
+        except OSError:
+            self.close()
+            raise
+        if request_id != self.request_id:
+            self.close()
+            raise ConnectionError("reply out of order")
+        return name, distance
+
+    def predict(self, img):
+        if self.failed_at is not None and time.monotonic() - self.failed_at < self.retry_interval:
+            return -1, float("inf")
+        try:
+            name, distance = self.recognize(img)
+        except OSError as e:
+            if self.failed_at is None:
+                print(f"[WARNING] Recognition server {self.address} unavailable ({e}); "
+                      "faces are Unknown until it is back")
+            self.failed_at = time.monotonic()
+            return -1, float("inf")
+        if self.failed_at is not None:
+            print(f"[OK] Recognition server {self.address} is back")
+            self.failed_at = None
+        if name not in self.label_ids:
+            self.label_ids[name] = len(self.label_ids)
+            self.id_to_label[str(self.label_ids[name])] = name
+        return self.label_ids[name], distance
+
+def load_remote_model(address):
+    """ModelHandle backed by the server at address (None if unreachable)"""
+    from recognize_attendance import ModelHandle
+    remote = RemoteRecognizer(address)
+    try:
+        remote.connect()
+    except OSError as e:
+        print(f"[ERROR] Could not connect to recognition server {address}: {e}")
+        return None
+    print(f"[OK] Recognizing on server {address}.")
+    return ModelHandle(remote, remote.id_to_label)
+
+# Benchmark
+
+def _node(address, crops, duration, start_at, results):
+    """One simulated edge node: sends crops back to back for duration seconds"""
+    remote = RemoteRecognizer(address, timeout=30.0).connect()
+    latencies = []
+    time.sleep(max(0.0, start_at - time.time()))
+    end = time.monotonic() + duration
+    i = 0
+    while time.monotonic() < end:
+        began = time.perf_counter()
+        remote.recognize(crops[i % len(crops)])
+        latencies.append(time.perf_counter() - began)
+        i += 1
+    remote.close()
+    results.put(latencies)
+
+def _benchmark_crops(count=50, dataset_dir="dataset"):
+    import numpy as np
+    import cv2
+    crops = []
+    if os.path.isdir(dataset_dir):
+        for filename in sorted(os.listdir(dataset_dir))[:count]:
+            img = cv2.imread(os.path.join(dataset_dir, filename), cv2.IMREAD_GRAYSCALE)
+            if img is not None:
+                crops.append(np.ascontiguousarray(cv2.resize(img, CROP_SIZE)))
+    if not crops:
+        rng = np.random.default_rng(0)
+        crops = [rng.integers(0, 256, CROP_SIZE, dtype=np.uint8) for _ in range(count)]
+    return crops
+
+def benchmark(model, node_counts=(1, 2, 4, 8), duration=10.0, max_batch=32, max_wait=0.005,
+              address=None):
+    """Recognition throughput and latency as simulated nodes are added"""
+    import multiprocessing as mp
+    ctx = mp.get_context("spawn")
+    crops = _benchmark_crops()
+    workdir = None
+    if address is None:
+        workdir = tempfile.mkdtemp()
+        address = os.path.join(workdir, "recognition.sock")
+    server = RecognitionServer(model, address, max_batch, max_wait).start()
+
+    print(f"{'nodes':>5} {'faces/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'batch':>6}")
+    try:
+        for nodes in node_counts:
+            results = ctx.Queue()
+            batches, recognized = server.batches, server.recognized
+            start_at = time.time() + 2.0   # after every node has started
+            procs = [ctx.Process(target=_node, args=(address, crops, duration, start_at, results))
+                     for _ in range(nodes)]
+            for p in procs:
+                p.start()
+            latencies = []
+            for _ in procs:
+                latencies.extend(results.get())
+            for p in procs:
+                p.join()
+            latencies.sort()
+            count = server.recognized - recognized
+            mean_batch = count / max(server.batches - batches, 1)
+            p50 = latencies[len(latencies) // 2] * 1000 if latencies else 0.0
+            p95 = latencies[int(len(latencies) * 0.95)] * 1000 if latencies else 0.0
+            print(f"{nodes:>5} {len(latencies) / duration:>9.1f} {p50:>8.1f} {p95:>8.1f} "
+                  f"{mean_batch:>6.1f}")
+    finally:
+        server.close()
+        if workdir is not None:
+            os.rmdir(workdir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Central face recognition server for edge nodes")
+    sub = parser.add_subparsers(dest="command", required=True)
+    serve = sub.add_parser("serve", help="recognize crops sent by edge nodes")
+    serve.add_argument("--listen", default="127.0.0.1:7070",
+                       help="host:port, or a path for a Unix socket")
+    bench = sub.add_parser("benchmark", help="throughput with 1..N simulated nodes on this machine")
+    bench.add_argument("--nodes", type=int, nargs="+", default=[1, 2, 4, 8])
+    bench.add_argument("--duration", type=float, default=10.0, help="seconds per node count")
+    bench.add_argument("--listen", help="address to benchmark on (default: a temporary Unix socket)")
+    for p in (serve, bench):
+        p.add_argument("--max-batch", type=int, default=32)
+        p.add_argument("--max-wait", type=float, default=0.005,
+                       help="seconds to wait for a batch to fill")
+        p.add_argument("--shortlist", type=int, default=0, metavar="K",
+                       help="two-tier matching (see recognize_attendance.py --shortlist)")
+    serve.add_argument("--metrics-port", type=int,
+                       help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    args = parser.parse_args()
+
+    from recognize_attendance import load_model
+    loader = lambda: load_model("trainer.yml", "labels.json", args.shortlist)
+    model = loader()
+    if model is None:
+        sys.exit(1)
+
+    if args.command == "benchmark":
+        benchmark(model, args.nodes, args.duration, args.max_batch, args.max_wait, args.listen)
+        return
+
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    server = RecognitionServer(model, args.listen, args.max_batch, args.max_wait,
+                               loader=loader).start()
+    print(f"[OK] Recognition server listening on {args.listen}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        print("Recognition server stopped.")
+
+if __name__ == "__main__":
+    main()
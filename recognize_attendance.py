@@ -1,11 +1,58 @@
 import os
+import time
+_STARTED = time.perf_counter()  # for --startup-report
 # Prefer X11 backend for Qt to avoid missing Wayland plugin in some OpenCV builds
 # This must be set before importing cv2 so the Qt plugin selection happens correctly.
 os.environ.setdefault("QT_QPA_PLATFORM", "xcb")
 import cv2
 import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from collections import namedtuple
 from datetime import datetime, timedelta
-from telegram_bot import TelegramNotifier, format_attendance_message, load_config, TELEGRAM_AVAILABLE
+import metrics
+from metrics import log
+from profiler import PROFILER, install_signal_toggle
+from temporal_voting import TemporalVoter
+from identity_cache import IdentityCache
+from face_detectors import load_detector, BACKENDS
+from startup_cache import StartupReport, cached_recognizer
+from train_lbph import load_recognition_config
+from presence import PresenceEngine
+import capture
+
+CSV_WRITE_SECONDS = metrics.histogram("attendance_csv_write_seconds", "Latency of attendance CSV appends")
+TELEGRAM_SEND_SECONDS = metrics.histogram("attendance_telegram_send_seconds", "Latency of Telegram sends")
+TELEGRAM_FAILURES = metrics.counter("attendance_telegram_failures_total", "Failed Telegram sends")
+FRAMES = metrics.counter("attendance_frames_total", "Frames processed")
+PREDICTIONS = metrics.counter("attendance_predictions_total", "recognizer.predict calls")
+FPS = metrics.gauge("attendance_fps", "Smoothed frames per second")
+FACES_IN_VIEW = metrics.gauge("attendance_faces_in_view", "Faces in the current frame")
+
+# Fine-grained stages, timed only while profiling is switched on
+P_CVTCOLOR = PROFILER.stage("cvtColor")
+P_CLAHE = PROFILER.stage("clahe")
+P_BILATERAL = PROFILER.stage("bilateralFilter")
+P_PREDICT = PROFILER.stage("predict")
+P_DRAW = PROFILER.stage("putText/rectangle")
+P_IMSHOW = PROFILER.stage("imshow")
+
+# Per-stage timers (reused every frame)
+T_CAPTURE = metrics.stage_timer("capture")
+T_PREPROCESS = metrics.stage_timer("preprocess")
+T_DETECT = metrics.stage_timer("detect")
+T_RECOGNIZE = metrics.stage_timer("recognize")
+T_DRAW = metrics.stage_timer("draw")
+T_DISPLAY = metrics.stage_timer("display")
+
+# Output of the analysis stage for one frame. prediction is None on frames
+# that were not recognized, else a Prediction of the largest face.
+FrameAnalysis = namedtuple("FrameAnalysis", "frame_id frame faces prediction")
+# cached is True when the IdentityCache answered instead of predict.
+Prediction = namedtuple("Prediction", "box name confidence blurry cached", defaults=(False,))
+
+def count_mark(action):
+    metrics.counter("attendance_marks_total", "Attendance events written", {"action": action}).inc()
 
 # Load label mapping
 def load_labels(path="labels.json"):
@@ -16,39 +63,138 @@ def load_labels(path="labels.json"):
         id_to_label = json.load(f)
     return id_to_label
 
+def _newer(path, than):
+    return os.path.exists(path) and (
+        not os.path.exists(than) or os.path.getmtime(path) >= os.path.getmtime(than))
+
+def load_recognizer(model_path="trainer.yml", compact_path="trainer_compact.yml",
+                    binary_path="trainer.bin", shortlist=0, use_cache=True):
+    """Load the LBPH model, preferring up-to-date compact or binary forms.
+
+    Either form is loaded from a base64 copy in the startup cache (see
+    startup_cache.py) unless use_cache is False; either way the result is
+    the OpenCV LBPH recognizer, so matching does not depend on how the
+    model was stored or installed. With
+    shortlist > 0 the model is wrapped in a two-tier CascadeRecognizer
+    (see cascade_matcher.py) that fully matches only the shortlist closest
+    people.
+    """
+    path = compact_path if _newer(compact_path, model_path) else model_path
+    recognizer = None
+    if _newer(binary_path, path):
+        from model_binary import ModelFormatError, load_lbph_recognizer
+        try:
+            recognizer = cached_recognizer(binary_path) if use_cache else None
+            if recognizer is not None:
+                print(f"[OK] Loaded LBPH model from {binary_path} (startup cache).")
+            else:
+                recognizer = load_lbph_recognizer(binary_path)
+                print(f"[OK] Loaded LBPH model from {binary_path}.")
+        except ModelFormatError as e:
+            print(f"[ERROR] {e}")
+            if not os.path.exists(path):
+                return None
+            print(f"[WARNING] Falling back to {path}.")
+    if recognizer is None:
+        recognizer = cached_recognizer(path) if use_cache else None
+        if recognizer is not None:
+            print(f"[OK] Loaded LBPH model from {path} (startup cache).")
+        else:
+            recognizer = cv2.face.LBPHFaceRecognizer_create()
+            recognizer.read(path)
+            print(f"[OK] Loaded LBPH model from {path}.")
+
+    if shortlist > 0:
+        from cascade_matcher import CascadeRecognizer, SHORTLIST_MIN_FACTOR
+        cascade = CascadeRecognizer.from_recognizer(recognizer, shortlist)
+        if cascade is recognizer:
+            print(f"[OK] Two-tier matching off: it needs more than "
+                  f"{SHORTLIST_MIN_FACTOR * shortlist} people for --shortlist {shortlist}.")
+        else:
+            recognizer = cascade
+            print(f"[OK] Two-tier matching: full match against the {shortlist} closest people.")
+    return recognizer
+
 class AttendanceTracker:
-    def __init__(self, enable_telegram=True):
+    """Entry/Exit status, CSV log and notifications.
+
+    Who is in view and the cooldown between marks are kept by a
+    PresenceEngine (presence.py). cooldown_minutes and grace_seconds
+    override the "presence" section of attendance_config.json; clock
+    replaces time.monotonic (e.g. a presence.ManualClock). wall_clock gives
+    the date and time written to the log (backfill.py uses video time), and
+    log_dir is where the per-day CSV files go.
+    """
+
+    def __init__(self, enable_telegram=True, cooldown_minutes=None, grace_seconds=None,
+                 clock=time.monotonic, wall_clock=datetime.now, log_dir="attendance"):
         self.user_status = {}  # {name: "Entry"/"Exit"}
-        self.currently_visible = {}  # {name: frame_count} - track who is currently in view
-        self.exit_grace_frames = 60  # ~2 seconds at 30fps before marking exit
+        self.wall_clock = wall_clock
+        self.log_dir = log_dir
+        self.presence = PresenceEngine.from_config(clock=clock, cooldown_minutes=cooldown_minutes,
+                                                   grace_seconds=grace_seconds)
         self.load_today_status()
         
         # Initialize Telegram
         self.telegram = None
-        if enable_telegram and TELEGRAM_AVAILABLE:
-            config = load_config()
-            if config and config.get("enabled", False):
-                try:
-                    # Support both 'bot_token' and 'token' key names
-                    token = config.get("bot_token") or config.get("token")
-                    chat_id = config.get("chat_id")
-                    
-                    if token and chat_id:
-                        self.telegram = TelegramNotifier(token, chat_id)
-                        print("[OK] Telegram notifications enabled")
-                    else:
-                        print("[WARNING] Telegram config missing token or chat_id")
-                except Exception as e:
-                    print(f"[WARNING] Failed to initialize Telegram: {e}")
-            else:
-                print("[WARNING] Telegram not enabled in config or config not found")
-        elif enable_telegram and not TELEGRAM_AVAILABLE:
+        self.notifications = None
+        if enable_telegram:
+            self._init_telegram()
+
+    def _init_telegram(self):
+        # Imported only here: notifications are optional, and backfills and
+        # load tests never use them
+        from telegram_bot import TelegramNotifier, load_config, TELEGRAM_AVAILABLE
+        from notification_queue import NotificationAggregator
+        if not TELEGRAM_AVAILABLE:
             print("[WARNING] python-telegram-bot not installed. Telegram notifications disabled.")
+            return
+        config = load_config()
+        if config and config.get("enabled", False):
+            try:
+                # Support both 'bot_token' and 'token' key names
+                token = config.get("bot_token") or config.get("token")
+                # 'chat_ids' lists several targets; 'chat_id' is a single one
+                chat_ids = config.get("chat_ids") or [config.get("chat_id")]
+                chat_ids = [c for c in chat_ids if c]
+                
+                if token and chat_ids:
+                    self.telegram = TelegramNotifier(token, chat_ids[0])
+                    self.notifications = NotificationAggregator(
+                        self._send_telegram, chat_ids,
+                        window=config.get("digest_window", 10.0),
+                        rate_per_minute=config.get("rate_per_minute", 20),
+                        burst=config.get("burst", 3)).start()
+                    print(f"[OK] Telegram notifications enabled ({len(chat_ids)} chats)")
+                else:
+                    print("[WARNING] Telegram config missing token or chat_id")
+            except Exception as e:
+                print(f"[WARNING] Failed to initialize Telegram: {e}")
+        else:
+            print("[WARNING] Telegram not enabled in config or config not found")
     
+    def _send_telegram(self, chat_id, message):
+        try:
+            with metrics.Timer(TELEGRAM_SEND_SECONDS):
+                self.telegram.send_to(chat_id, message)
+        except Exception:
+            TELEGRAM_FAILURES.inc()
+            raise
+
+    def notify(self, name, action, time_str, confidence):
+        """Queue a notification (digested and rate-limited) or send it directly"""
+        if self.notifications is not None:
+            self.notifications.add(name, action, time_str, confidence)
+        elif self.telegram:
+            from telegram_bot import format_attendance_message
+            message = format_attendance_message(name, action, time_str, confidence)
+            with metrics.Timer(TELEGRAM_SEND_SECONDS):
+                self.telegram.send_sync(message)
+
     def load_today_status(self):
         """Load today's attendance to restore status"""
-        date_str = datetime.now().strftime("%Y-%m-%d")
-        csv_path = os.path.join("attendance", f"{date_str}.csv")
+        date_str = self.wall_clock().strftime("%Y-%m-%d")
+        csv_path = os.path.join(self.log_dir, f"{date_str}.csv")
         
         if os.path.exists(csv_path):
             with open(csv_path, "r") as f:
@@ -59,29 +205,31 @@ class AttendanceTracker:
                         name, action = parts[2], parts[3]
                         self.user_status[name] = action
     
-    def update_visibility(self, name, frame_count):
-        """Update that person is currently visible"""
-        self.currently_visible[name] = frame_count
+    def update_visibility(self, name, now=None):
+        """Update that person is currently visible (now: monotonic seconds)"""
+        self.presence.seen(name, now)
     
-    def check_exits(self, frame_count):
-        """Remove people who haven't been seen recently from visibility tracking.
+    def check_exits(self, now=None):
+        """Remove people not seen within their grace period from visibility tracking.
 
         IMPORTANT: Do NOT auto-mark exits here. Disappearance from camera does
-        not imply an Exit event. Instead, we remove them from the `currently_visible`
-        map and return the list of removed names so the caller can clear any
+        not imply an Exit event. Instead, we drop them from the presence engine
+        and return the list of removed names so the caller can clear any
         per-session state (like `marked_this_session`) if desired.
         """
-        removed = []
-        for name, last_seen in list(self.currently_visible.items()):
-            if frame_count - last_seen > self.exit_grace_frames:
-                removed.append(name)
-                del self.currently_visible[name]
-        return removed
+        return self.presence.expire(now)
     
     def mark_attendance(self, name, confidence):
-        """Mark entry or exit based on current status"""
-        os.makedirs("attendance", exist_ok=True)
-        now = datetime.now()
+        """Mark entry or exit based on current status.
+
+        Returns the action, or None while the person's cooldown runs.
+        """
+        if not self.presence.may_mark(name):
+            log.debug("cooldown", name=name, seconds_left=round(self.presence.cooldown_left(name), 1))
+            return None
+        self.presence.marked(name)
+        os.makedirs(self.log_dir, exist_ok=True)
+        now = self.wall_clock()
         date_str = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H:%M:%S")
         
@@ -92,32 +240,28 @@ class AttendanceTracker:
         else:
             action = "Exit" if current_status == "Entry" else "Entry"
         
-        print(f"[DEBUG] {name}: Current status={current_status}, Next action={action}")
+        log.debug("next_action", name=name, current=current_status, action=action)
         
-        csv_path = os.path.join("attendance", f"{date_str}.csv")
+        csv_path = os.path.join(self.log_dir, f"{date_str}.csv")
         exists = os.path.exists(csv_path)
         
-        with open(csv_path, "a") as f:
-            if not exists:
-                f.write("date,time,name,action,confidence\n")
-            f.write(f"{date_str},{time_str},{name},{action},{confidence:.2f}\n")
+        with metrics.Timer(CSV_WRITE_SECONDS):
+            with open(csv_path, "a") as f:
+                if not exists:
+                    f.write("date,time,name,action,confidence\n")
+                f.write(f"{date_str},{time_str},{name},{action},{confidence:.2f}\n")
+        count_mark(action)
         
         # Update status BEFORE sending telegram
         self.user_status[name] = action
         
         # Send Telegram notification with better error handling
-        print(f"[TELEGRAM] Attempting to send notification for {name} - {action}")
-        if self.telegram:
-            try:
-                message = format_attendance_message(name, action, time_str, confidence)
-                self.telegram.send_sync(message)
-                print(f"[TELEGRAM] Notification sent successfully for {name} - {action}")
-            except Exception as e:
-                print(f"[TELEGRAM] Failed to send notification: {e}")
-                import traceback
-                traceback.print_exc()
-        else:
-            print(f"[TELEGRAM] Telegram notifier not initialized")
+        try:
+            self.notify(name, action, time_str, confidence)
+            log.debug("telegram_queued", name=name, action=action)
+        except Exception as e:
+            TELEGRAM_FAILURES.inc()
+            log.error("telegram_failed", name=name, action=action, error=repr(e))
         
         print(f"[OK] Marked {action}: {name} at {time_str} (conf={confidence:.2f})")
         return action
@@ -127,29 +271,29 @@ class AttendanceTracker:
         if self.user_status.get(name) != "Entry":
             return None
         
-        os.makedirs("attendance", exist_ok=True)
-        now = datetime.now()
+        os.makedirs(self.log_dir, exist_ok=True)
+        now = self.wall_clock()
         date_str = now.strftime("%Y-%m-%d")
         time_str = now.strftime("%H:%M:%S")
         
         action = "Exit"
         
-        csv_path = os.path.join("attendance", f"{date_str}.csv")
+        csv_path = os.path.join(self.log_dir, f"{date_str}.csv")
         exists = os.path.exists(csv_path)
         
-        with open(csv_path, "a") as f:
-            if not exists:
-                f.write("date,time,name,action,confidence\n")
-            f.write(f"{date_str},{time_str},{name},{action},0.00\n")
+        with metrics.Timer(CSV_WRITE_SECONDS):
+            with open(csv_path, "a") as f:
+                if not exists:
+                    f.write("date,time,name,action,confidence\n")
+                f.write(f"{date_str},{time_str},{name},{action},0.00\n")
+        count_mark(action)
         
         # Update status
         self.user_status[name] = action
         
         # Send Telegram notification
-        if self.telegram:
-            message = format_attendance_message(name, action, time_str, 0)
-            self.telegram.send_sync(message)
-            print(f"[TELEGRAM] Notification sent for {name}")
+        self.notify(name, action, time_str, 0)
+        log.debug("telegram_queued", name=name, action=action)
         
         print(f"[OK] Marked {action}: {name} at {time_str} (auto-exit)")
         return action
@@ -161,9 +305,10 @@ class AttendanceTracker:
     def mark_all_exit_on_close(self):
         """Mark all users with Entry status as Exit when system closes"""
         try:
-            date_str = datetime.now().strftime("%Y-%m-%d")
-            time_str = datetime.now().strftime("%H:%M:%S")
-            csv_path = os.path.join("attendance", f"{date_str}.csv")
+            now = self.wall_clock()
+            date_str = now.strftime("%Y-%m-%d")
+            time_str = now.strftime("%H:%M:%S")
+            csv_path = os.path.join(self.log_dir, f"{date_str}.csv")
             
             if not os.path.exists(csv_path):
                 return
@@ -173,234 +318,567 @@ class AttendanceTracker:
                 for name, status in self.user_status.items():
                     if status == "Entry":
                         f.write(f"{date_str},{time_str},{name},Exit,0.00\n")
+                        count_mark("Exit")
                         print(f"[AUTO-EXIT] Marked {name} as Exit on system close")
                         
-                        # Send Telegram notification
-                        if self.telegram:
-                            message = format_attendance_message(name, "Exit", time_str, 0)
-                            self.telegram.send_sync(message)
+                        # One digest for everyone instead of a message each
+                        self.notify(name, "Exit", time_str, 0)
             
             print("[OK] All users marked as Exit")
         except Exception as e:
             print(f"[WARNING] Failed to mark users as Exit: {e}")
+        finally:
+            # Deliver what is queued; anything left is spooled for the next start
+            if self.notifications is not None:
+                self.notifications.close()
     
-def main():
-    # Load trained LBPH model
-    if not os.path.exists("trainer.yml"):
+class ModelHandle:
+    """Recognizer and label map, swappable while the recognition loop runs"""
+
+    def __init__(self, recognizer, id_to_label):
+        self.current = (recognizer, id_to_label)
+
+    def swap(self, recognizer, id_to_label):
+        self.current = (recognizer, id_to_label)
+
+def load_model(model_path="trainer.yml", labels_path="labels.json", shortlist=0,
+               use_cache=True):
+    """Load recognizer and labels into a ModelHandle (None if missing)"""
+    if not os.path.exists(model_path) and not os.path.exists("trainer.bin"):
         print("[ERROR] trainer.yml not found. Run train_lbph.py first.")
-        return
+        return None
 
-    recognizer = cv2.face.LBPHFaceRecognizer_create()
-    recognizer.read("trainer.yml")
-    print("[OK] Loaded LBPH model.")
+    recognizer = load_recognizer(model_path, shortlist=shortlist, use_cache=use_cache)
+    if recognizer is None:
+        return None
 
-    id_to_label = load_labels("labels.json")
+    id_to_label = load_labels(labels_path)
     if id_to_label is None:
-        return
+        return None
+    return ModelHandle(recognizer, id_to_label)
 
-    cascade_path = "haarcascade_frontalface_default.xml"
-    face_cascade = cv2.CascadeClassifier(cascade_path)
+def open_camera(index=0):
+    """Open and configure the camera as a capture.Camera (None if it cannot be opened).
 
-    cap = cv2.VideoCapture(0)
-    if not cap.isOpened():
-        print("[ERROR] Could not open camera.")
-        return
-    
-    # Improve camera settings for better image quality
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-    cap.set(cv2.CAP_PROP_FPS, 30)
-    cap.set(cv2.CAP_PROP_AUTOFOCUS, 1)
+    index may also be the path of a recorded video, which is replayed as-is.
+    """
+    cap = capture.open_camera(index, 640, 480, 30)
+    if cap is None:
+        if isinstance(index, str) and not index.isdigit():
+            print(f"[ERROR] Could not open video {index}.")
+        else:
+            print("[ERROR] Could not open camera.")
+        return None
+    print(f"[OK] Camera: {cap.describe()}")
+    return cap
+
+def preprocess(frame, clahe):
+    """Grayscale, CLAHE and bilateral filter"""
+    with P_CVTCOLOR:
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+    return enhance(gray, clahe)
 
-    print("[OK] Attendance system running. Press 'q' to quit.")
+def enhance(gray, clahe):
+    """CLAHE and bilateral filter on a grayscale frame"""
+    # Apply CLAHE for better contrast (fast operation)
+    with P_CLAHE:
+        gray_eq = clahe.apply(gray)
     
-    tracker = AttendanceTracker(enable_telegram=True)
-
-    window_name = "Attendance"
-    cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
-
-    threshold = 65  #  Increased threshold for more lenient matching
-    current_person = {"name": "Unknown", "confidence": 0, "stable_count": 0}
-    required_stable_frames = 8  # Reduced from 10 for faster detection
-    frame_count = 0
-    frames_without_face = 0
-    reset_threshold = 30
-    marked_this_session = {}
+    # Simple bilateral filter (faster than NlMeans, still reduces noise)
+    with P_BILATERAL:
+        return cv2.bilateralFilter(gray_eq, 5, 50, 50)
+
+def predict_largest_face(recognizer, id_to_label, gray_eq, faces, check_blur=False,
+                         cache=None, frame_id=0):
+    """Recognize the largest (closest) face and return a Prediction.
+
+    With an IdentityCache, a face whose identity is cached is answered
+    without calling predict.
+    """
+    x, y, w, h = max(faces, key=lambda f: f[2] * f[3])
+    box = (int(x), int(y), int(w), int(h))
+    face_roi = gray_eq[y:y+h, x:x+w]
+
+    if cache is not None:
+        cached = cache.lookup(frame_id, box, face_roi)
+        if cached is not None:
+            return Prediction(box, cached[0], cached[1], False, True)
+
+    # Blur check is optional per frame for performance
+    blurry = False
+    if check_blur:
+        blurry = cv2.Laplacian(face_roi, cv2.CV_64F).var() < 50
+
+    face_roi_resized = cv2.resize(face_roi, (150, 150))
+    with P_PREDICT:
+        label_id, confidence = recognizer.predict(face_roi_resized)
+    PREDICTIONS.inc()
+    name = id_to_label.get(str(label_id), "Unknown")
+    if cache is not None:
+        cache.store(name, confidence, face_roi)
+    return Prediction(box, name, confidence, blurry)
+
+def analyze_frames(cap, detector, model, stop_event=None, ring=None, cache=None,
+                   wants_frame=None, gate=None, frame_offset=0):
+    """Capture and analyze frames on the calling thread.
+
+    cap is a capture.Camera (see open_camera). One FrameAnalysis is yielded
+    per camera frame, numbered from frame_offset + 1 (a video seeked to
+    frame_offset keeps its frame numbers, see backfill.py). Detection (detector, see
+    face_detectors.py) runs every 3rd frame (boxes are reused in between)
+    and recognition every 2nd, answered from cache (a default IdentityCache
+    if None) for faces already identified. Only those frames are decoded,
+    and only to grayscale.
+
+    The color image is decoded into ring (a private FrameRing if None) and
+    yielded as a read-only view only while wants_frame() is true (always if
+    wants_frame is None); otherwise the frame field is None.
+
+    With a capture.MotionGate, detection is skipped while no face is in
+    view and the scene has not changed.
+    """
+    own_ring = ring is None
+    if own_ring:
+        from frame_ring import FrameRing, frame_shape
+        ring = FrameRing(frame_shape(cap))
+    if cache is None:
+        cache = IdentityCache()
+    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
     faces = []  # Initialize faces list
+    frame_id = frame_offset
+
+    try:
+        while stop_event is None or not stop_event.is_set():
+            frame_id += 1
+            detect_now = frame_id % 3 == 0
+            # Recognition uses this frame's boxes, so it needs any detection first
+            recognize_now = frame_id % 2 == 0 and (detect_now or len(faces) > 0)
+            show = wants_frame is None or wants_frame()
+
+            frame = None
+            with T_CAPTURE:
+                if show:
+                    seq = ring.capture(cap)
+                    ok = seq > 0
+                else:
+                    # Nothing to show: dequeue the frame without decoding it
+                    ok = cap.grab()
+            if not ok:
+                if not getattr(cap, "is_file", False):  # a video simply ends
+                    print("[ERROR] Failed to grab frame")
+                return
+            if show:
+                frame = ring.get(seq)
+
+            prediction = None
+            if not (detect_now or recognize_now):
+                yield FrameAnalysis(frame_id, frame, faces, prediction)
+                continue
+
+            # OPTIMIZED PREPROCESSING
+            with T_PREPROCESS:
+                gray = cap.gray()
+                if gray is None:
+                    print("[ERROR] Failed to decode frame")
+                    return
+                gray_eq = enhance(gray, clahe)
+
+            # SMART DETECTION - Only run heavy detection every N frames
+            if detect_now and gate is not None and not faces:
+                detect_now = gate.moved(gray)
+            if detect_now:
+                with T_DETECT:
+                    faces = detector.detect(gray_eq)
+            # else: reuse faces from previous frame (faces list persists)
+
+            # Only recognize every other frame for better performance
+            if recognize_now and len(faces) > 0:
+                with T_RECOGNIZE:
+                    recognizer, id_to_label = model.current
+                    cache.bind(recognizer)
+                    prediction = predict_largest_face(recognizer, id_to_label, gray_eq, faces,
+                                                      check_blur=frame_id % 5 == 0,
+                                                      cache=cache, frame_id=frame_id)
+
+            yield FrameAnalysis(frame_id, frame, faces, prediction)
+    finally:
+        if own_ring:
+            ring.close()
+
+def run_recognition(cap, detector, model, tracker, stop_event=None, status=None,
+                    window_name="Attendance", show_window=True, frames=None, ring=None,
+                    preview=None, identity_cache=None, startup=None, keep_frames=False,
+                    gate=None, threshold=None):
+    """Recognition loop.
+
+    Runs until 'q' is pressed, the camera (or video) ends or stop_event is
+    set. The caller owns the camera. If a status dict is given it is updated
+    every frame with the current person, status text, confidence and FPS.
+    With show_window=False no GUI is used. Pressing 'p' (or SIGUSR1 /
+    PROFILER.request_toggle()) starts and stops profiling.
+
+    frames is an iterable of FrameAnalysis; by default frames are captured
+    into ring and analyzed serially with analyze_frames(). Frames are
+    read-only views into the ring, so the overlay is drawn on a separate
+    canvas, and only when there is a window or a preview client to show it.
+    Without either, analyze_frames() does not decode color frames at all,
+    unless keep_frames is set (other processes read the ring).
+
+    preview is an optional PreviewServer (see preview_server.py) that
+    receives annotated frames at its own, reduced rate. identity_cache (an
+    IdentityCache) and gate (a capture.MotionGate) are passed on to
+    analyze_frames().
+    startup is an optional StartupReport, printed at the first recognized
+    frame.
+
+    threshold is the largest LBPH distance accepted as a match (default:
+    the "recognition" section of attendance_config.json, see calibrate.py).
+    Presence is timed by the tracker's clock, so a replay that sets the
+    clock per frame (backfill.py) runs on video time.
+    """
+    if frames is None:
+        wants_frame = lambda: (show_window or keep_frames
+                               or (preview is not None and preview.wants_frame()))
+        frames = analyze_frames(cap, detector, model, stop_event, ring, identity_cache,
+                                wants_frame, gate)
+    if show_window:
+        cv2.namedWindow(window_name, cv2.WINDOW_NORMAL)
+        cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    PROFILER.attach()
+
+    if threshold is None:
+        threshold = load_recognition_config()["threshold"]
+    # Faces are followed as tracks; a track unseen for 30 frames is dropped
+    voter = TemporalVoter(threshold=threshold, max_missed=30)
+    marked_this_session = {}
+    fps = 0.0
+    last_frame_time = time.monotonic()
     
     # Notification system
     notification = {"text": "", "time": None, "duration": 3}
+    canvas = None
+    first_frame = None
 
-    while True:
-        ret, frame = cap.read()
-        if not ret:
-            print("[ERROR] Failed to grab frame")
+    for frame_count, frame, faces, prediction in frames:
+        if stop_event is not None and stop_event.is_set():
             break
 
-        frame_count += 1
-        
-        # OPTIMIZED PREPROCESSING
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-        
-        # Apply CLAHE for better contrast (fast operation)
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        gray_eq = clahe.apply(gray)
-        
-        # Simple bilateral filter (faster than NlMeans, still reduces noise)
-        gray_eq = cv2.bilateralFilter(gray_eq, 5, 50, 50)
+        PROFILER.poll()
+        FRAMES.inc()
+        if first_frame is None:
+            first_frame = frame_count
+        FACES_IN_VIEW.set(len(faces))
+        now = time.monotonic()
+        fps = 0.9 * fps + 0.1 / max(now - last_frame_time, 1e-6)
+        last_frame_time = now
+        FPS.set(round(fps, 1))
 
-        # SMART DETECTION - Only run heavy detection every N frames
-        detect_this_frame = (frame_count % 3 == 0)
-        
-        if detect_this_frame:
-            # First attempt: Standard detection
-            faces = face_cascade.detectMultiScale(
-                gray_eq,
-                scaleFactor=1.05,
-                minNeighbors=4,
-                minSize=(100, 100),
-                maxSize=(400, 400)
-            )
-            
-            # If no faces found, try with relaxed parameters
-            if len(faces) == 0:
-                faces = face_cascade.detectMultiScale(
-                    gray_eq,
-                    scaleFactor=1.1,
-                    minNeighbors=3,
-                    minSize=(80, 80),
-                    maxSize=(500, 500)
-                )
-        # else: reuse faces from previous frame (faces list persists)
-
-        # Reset if no faces detected for a while
-        if len(faces) == 0:
-            frames_without_face += 1
-            if frames_without_face >= reset_threshold:
-                current_person = {"name": "Unknown", "confidence": 0, "stable_count": 0}
-        else:
-            frames_without_face = 0
+        voter.update(frame_count, faces)
 
-        name_display = current_person["name"]
-        color = (0, 255, 0) if name_display != "Unknown" else (0, 0, 255)
-        confidence_display = f"{current_person['confidence']:.1f}" if current_person['confidence'] > 0 else "-"
+        if startup is not None and not startup.printed:
+            if frame_count == first_frame:
+                startup.mark("first frame")
+            if prediction is not None:
+                startup.mark("first recognized frame")
+                startup.print()
 
-        # Only recognize every other frame for better performance
-        recognize_this_frame = (frame_count % 2 == 0)
-        
-        if recognize_this_frame and len(faces) > 0:
-            # Take the largest face (closest to camera)
-            faces_sorted = sorted(faces, key=lambda f: f[2] * f[3], reverse=True)
-            x, y, w, h = faces_sorted[0]
-            
-            face_roi = gray_eq[y:y+h, x:x+w]
-            
-            # Skip blur detection on every frame for performance
-            if frame_count % 5 == 0:  # Only check blur every 5th frame
-                laplacian_var = cv2.Laplacian(face_roi, cv2.CV_64F).var()
-                if laplacian_var < 50:
-                    cv2.putText(frame, "Face too blurry", (x, y-10),
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
-                    # Don't continue - still try to recognize
-            
-            face_roi_resized = cv2.resize(face_roi, (150, 150))
-            label_id, confidence = recognizer.predict(face_roi_resized)
+        if prediction is not None:
+            name, confidence = prediction.name, prediction.confidence
+            # A blurry prediction is flagged on screen but still used. A cached
+            # one repeats an earlier predict and is no new evidence, so it
+            # does not vote (it would fill the window and defeat the margin).
+            track, committed = None, False
+            if not prediction.cached:
+                track, committed = voter.vote(prediction.box, name, confidence)
 
-            if confidence < threshold:
-                name = id_to_label.get(str(label_id), "Unknown")
-                
-                if name == current_person["name"]:
-                    current_person["stable_count"] += 1
-                    current_person["confidence"] = confidence
+            if confidence < threshold and name != "Unknown":
+                tracker.update_visibility(name)
+
+            if committed:
+                name = track.name
+                if name not in marked_this_session:
+                    log.debug("marking", key=f"marking:{name}", name=name,
+                              votes=len(track.votes), margin=round(track.margin, 2),
+                              session=list(marked_this_session))
+                    action = tracker.mark_attendance(name, track.mean_distance(name))
+                    # None (cooldown) also counts: no retry until they leave view
+                    marked_this_session[name] = action
+                    if action:
+                        notification["text"] = f"{action} Marked: {name}"
+                        notification["time"] = datetime.now()
+                        log.debug("session_marked", key=f"session_marked:{name}",
+                                  name=name, action=action)
                 else:
-                    current_person = {"name": name, "confidence": confidence, "stable_count": 1}
-                
-                if name != "Unknown":
-                    tracker.update_visibility(name, frame_count)
-                
-                if current_person["stable_count"] >= required_stable_frames:
-                    if name not in marked_this_session:
-                        print(f"[DEBUG] Marking {name} - marked_this_session: {list(marked_this_session.keys())}")
-                        action = tracker.mark_attendance(name, confidence)
-                        if action:
-                            notification["text"] = f"{action} Marked: {name}"
-                            notification["time"] = datetime.now()
-                            marked_this_session[name] = action
-                            print(f"[DEBUG] Added {name} to marked_this_session with action {action}")
-                    else:
-                        print(f"[DEBUG] {name} already in marked_this_session with action {marked_this_session[name]}")
-                    current_person["stable_count"] = required_stable_frames
-            else:
-                if current_person["stable_count"] > 0:
-                    current_person["stable_count"] -= 1
-                if current_person["stable_count"] == 0:
-                    current_person = {"name": "Unknown", "confidence": 0, "stable_count": 0}
+                    log.debug("already_marked", key=f"already_marked:{name}",
+                              name=name, action=marked_this_session[name])
         
         # Check for exits
-        exited_people = tracker.check_exits(frame_count)
+        exited_people = tracker.check_exits()
         for name in exited_people:
             if name in marked_this_session:
-                print(f"[DEBUG] Removing {name} from marked_this_session (was {marked_this_session[name]})")
+                log.debug("session_cleared", name=name, action=marked_this_session[name])
                 marked_this_session.pop(name, None)
-            if current_person["name"] == name:
-                current_person = {"name": "Unknown", "confidence": 0, "stable_count": 0}
-                print(f"[DEBUG] Reset current_person for {name}")
-            print(f"[INFO] {name} left camera view - ready for status toggle on return")
+            voter.forget(name)
+            log.info("left_view", key=f"left_view:{name}", name=name)
 
-        # Simplified drawing
-        for (x, y, w, h) in faces:
-            cv2.rectangle(frame, (x, y), (x + w, y + h), color, 3)
+        # The largest face's committed identity, or the name it is leaning towards
+        track = voter.primary()
+        name_display = "Unknown"
+        if track is not None:
+            name_display = track.name or track.leader or "Unknown"
+        color = (0, 255, 0) if name_display != "Unknown" else (0, 0, 255)
+        confidence = track.mean_distance(name_display) if name_display != "Unknown" else 0
+        confidence_display = f"{confidence:.1f}" if confidence > 0 else "-"
 
         # Status display
         if name_display != "Unknown":
-            status = tracker.get_status(name_display)
-            status_text = f"Status: {status if status else 'Not Present'}"
-            if current_person["stable_count"] < required_stable_frames:
-                status_text = f"Detecting... ({current_person['stable_count']}/{required_stable_frames})"
+            user_status = tracker.get_status(name_display)
+            status_text = f"Status: {user_status if user_status else 'Not Present'}"
+            if track.name != name_display:
+                status_text = f"Detecting... ({voter.progress(track):.0%})"
         else:
             status_text = "Status: Waiting for face..."
 
-        # Simplified guidance (only when no faces)
-        if len(faces) == 0 and frame_count % 30 == 0:  # Update message every 30 frames
-            cv2.putText(frame, "No face detected", 
-                       (50, frame.shape[0]//2),
-                       cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
-
-        # Top banner
-        cv2.rectangle(frame, (0, 0), (frame.shape[1], 80), (0, 0, 0), -1)
-        cv2.putText(frame, f"Person: {name_display}", (20, 50),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
-
-        # Bottom status
-        cv2.rectangle(frame, (0, frame.shape[0]-80), (frame.shape[1], frame.shape[0]), (0, 0, 0), -1)
-        cv2.putText(frame, f"{status_text}   Confidence: {confidence_display}", 
-                    (20, frame.shape[0] - 30),
-                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, color, 3)
-        
-        # Show notification
-        if notification["time"]:
-            elapsed = (datetime.now() - notification["time"]).total_seconds()
-            if elapsed < notification["duration"]:
-                cv2.rectangle(frame, (frame.shape[1]//4, 100), 
-                            (3*frame.shape[1]//4, 200), (0, 200, 0), -1)
-                cv2.putText(frame, notification["text"], 
-                           (frame.shape[1]//4 + 20, 160),
-                           cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+        send_preview = preview is not None and preview.wants_frame()
+        if frame is not None and (show_window or send_preview):
+            # Simplified drawing
+            T_DRAW.begin()
+            P_DRAW.begin()
+            if canvas is None or canvas.shape != frame.shape:
+                canvas = frame.copy()
             else:
-                notification["time"] = None
+                canvas[...] = frame
+
+            if prediction is not None and prediction.blurry:
+                x, y = prediction.box[:2]
+                cv2.putText(canvas, "Face too blurry", (x, y-10),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 0, 255), 2)
+
+            for (x, y, w, h) in faces:
+                cv2.rectangle(canvas, (x, y), (x + w, y + h), color, 3)
+
+            # Simplified guidance (only when no faces)
+            if len(faces) == 0 and frame_count % 30 == 0:  # Update message every 30 frames
+                cv2.putText(canvas, "No face detected", 
+                           (50, canvas.shape[0]//2),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.8, (0, 0, 255), 2)
+
+            # Top banner
+            cv2.rectangle(canvas, (0, 0), (canvas.shape[1], 80), (0, 0, 0), -1)
+            cv2.putText(canvas, f"Person: {name_display}", (20, 50),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+
+            # Bottom status
+            cv2.rectangle(canvas, (0, canvas.shape[0]-80), (canvas.shape[1], canvas.shape[0]), (0, 0, 0), -1)
+            cv2.putText(canvas, f"{status_text}   Confidence: {confidence_display}", 
+                        (20, canvas.shape[0] - 30),
+                        cv2.FONT_HERSHEY_SIMPLEX, 1.2, color, 3)
+            
+            # Show notification
+            if notification["time"]:
+                elapsed = (datetime.now() - notification["time"]).total_seconds()
+                if elapsed < notification["duration"]:
+                    cv2.rectangle(canvas, (canvas.shape[1]//4, 100), 
+                                (3*canvas.shape[1]//4, 200), (0, 200, 0), -1)
+                    cv2.putText(canvas, notification["text"], 
+                               (canvas.shape[1]//4 + 20, 160),
+                               cv2.FONT_HERSHEY_SIMPLEX, 1.5, (255, 255, 255), 3)
+                else:
+                    notification["time"] = None
+
+            P_DRAW.end()
+            T_DRAW.end()
+            if send_preview:
+                preview.submit(canvas)
+
+        if status is not None:
+            status.update({
+                "person": name_display,
+                "status": status_text,
+                "confidence": round(confidence, 1),
+                "frame_count": frame_count,
+                "fps": round(fps, 1),
+            })
 
-        cv2.imshow(window_name, frame)
+        key = -1
+        if show_window and canvas is not None:
+            with T_DISPLAY, P_IMSHOW:
+                cv2.imshow(window_name, canvas)
+                key = cv2.waitKey(1) & 0xFF
 
-        if cv2.waitKey(1) & 0xFF == ord('q'):
+        if key == ord('q'):
             break
+        if key == ord('p'):
+            PROFILER.request_toggle()
+
+    if PROFILER.enabled:
+        PROFILER.stop()
+    if show_window:
+        cv2.destroyWindow(window_name)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Face recognition attendance system")
+    parser.add_argument("--metrics-port", type=int,
+                        help="serve Prometheus metrics on 127.0.0.1:PORT/metrics")
+    parser.add_argument("--metrics-file",
+                        help="periodically write Prometheus metrics to this file")
+    parser.add_argument("--source", default="0",
+                        help="camera index or path of a recorded video to replay")
+    parser.add_argument("--headless", action="store_true",
+                        help="run without a window")
+    parser.add_argument("--detector", choices=BACKENDS,
+                        help="face detector backend (default: attendance_config.json, else haar)")
+    parser.add_argument("--detector-model", metavar="PATH",
+                        help="cascade XML or DNN model file for the detector")
+    parser.add_argument("--workers", type=int, default=0,
+                        help="run detection/recognition in N worker processes")
+    parser.add_argument("--server", metavar="ADDRESS",
+                        help="edge mode: recognize faces on a recognition_server.py at "
+                             "host:port or a Unix socket path instead of a local model")
+    parser.add_argument("--motion-gate", action="store_true",
+                        help="skip face detection while the scene is empty and unchanged")
+    parser.add_argument("--no-zones", action="store_true",
+                        help="search the whole frame even if detection zones are configured")
+    parser.add_argument("--preview-port", type=int,
+                        help="serve an MJPEG preview and /status JSON on this port")
+    parser.add_argument("--preview-host", default="127.0.0.1",
+                        help="address for the preview server (0.0.0.0 for all interfaces)")
+    parser.add_argument("--preview-fps", type=float, default=5.0,
+                        help="maximum preview frame rate")
+    parser.add_argument("--preview-quality", type=int, default=70,
+                        help="preview JPEG quality (0-100)")
+    parser.add_argument("--shortlist", type=int, default=0, metavar="K",
+                        help="two-tier matching: coarse shortlist of K people, then full match")
+    parser.add_argument("--identity-ttl", type=float, default=10.0, metavar="SECONDS",
+                        help="reuse a confirmed face identity for up to SECONDS before "
+                             "re-running predict (0 disables the cache)")
+    parser.add_argument("--frame-ring", metavar="NAME",
+                        help="shared-memory name for the frame ring, so other processes can "
+                             "read camera frames with FrameRing.attach(NAME)")
+    parser.add_argument("--startup-report", action="store_true",
+                        help="print import/load timings at the first recognized frame")
+    parser.add_argument("--no-startup-cache", action="store_true",
+                        help="parse trainer.yml and the cascade instead of using .startup_cache/")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile from startup (toggle at runtime with 'p' or SIGUSR1)")
+    parser.add_argument("--profile-dir", default="profiles",
+                        help="where profile reports are written")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    startup = StartupReport(_STARTED)
+    startup.mark("imports")
+    args = parse_args(argv)
+    if args.metrics_port:
+        metrics.start_http_server(args.metrics_port)
+    if args.metrics_file:
+        metrics.start_textfile_writer(args.metrics_file)
+    PROFILER.output_dir = args.profile_dir
+    install_signal_toggle()
+
+    # The camera takes a while to open; load the model and detector meanwhile
+    use_cache = not args.no_startup_cache
+    with ThreadPoolExecutor(max_workers=3) as loaders:
+        camera_job = loaders.submit(startup.timed, "open camera", open_camera, args.source)
+        if args.server:
+            from recognition_server import load_remote_model
+            model_job = loaders.submit(startup.timed, "connect server", load_remote_model,
+                                       args.server)
+        else:
+            model_job = loaders.submit(startup.timed, "load model", load_model, "trainer.yml",
+                                       "labels.json", args.shortlist, use_cache)
+        detector_job = loaders.submit(startup.timed, "load detector", load_detector,
+                                      args.detector, args.detector_model, use_cache=use_cache)
+        model, detector, cap = model_job.result(), detector_job.result(), camera_job.result()
+    if model is None or detector is None or cap is None:
+        if cap is not None:
+            cap.release()
+        return
+    if not args.no_zones:
+        from zones import apply_zones
+        detector = apply_zones(detector, args.source)
+
+    print("[OK] Attendance system running. Press 'q' to quit, 'p' to toggle profiling.")
+    
+    tracker = startup.timed("attendance tracker", AttendanceTracker, enable_telegram=True)
+    if args.profile:
+        PROFILER.request_toggle()
+    from frame_ring import FrameRing, frame_shape
+    ring = FrameRing(frame_shape(cap), slots=max(8, 2 * args.workers + 1),
+                     name=args.frame_ring)
+    pool = None
+    frames = None
+    if args.workers > 0 and args.server:
+        print("[WARNING] --workers is ignored with --server (recognition runs on the server).")
+    elif args.workers > 0:
+        from parallel_recognition import ParallelRecognizer
+        pool = ParallelRecognizer(args.workers, ring=ring, shortlist=args.shortlist,
+                                  detector=(detector.name, detector.path),
+                                  zones=getattr(detector, "zones", None)).start()
+        frames = pool.frames(cap)
+        print(f"[OK] Using {args.workers} recognition worker processes.")
+
+    preview = None
+    if args.preview_port:
+        from preview_server import PreviewServer
+        preview = PreviewServer(args.preview_host, args.preview_port,
+                                args.preview_fps, args.preview_quality).start()
+
+    watcher = None
+    if not args.server:
+        # Pick up models installed by model_store.py sync (or retraining) while running
+        from model_store import ModelWatcher, describe_version
+
+        def report_version():
+            version = describe_version()
+            print(f"[OK] Model version: {version}")
+            if preview is not None:
+                preview.status["model_version"] = version
+
+        def reload_model():
+            new_model = load_model("trainer.yml", "labels.json", args.shortlist, use_cache)
+            if new_model is not None:
+                model.swap(*new_model.current)
+                if pool is not None:
+                    pool.reload_model()
+                report_version()
+
+        report_version()
+        watcher = ModelWatcher(reload_model).start()
+
+    try:
+        run_recognition(cap, detector, model, tracker, show_window=not args.headless,
+                        frames=frames, ring=ring, preview=preview,
+                        identity_cache=IdentityCache(ttl=args.identity_ttl),
+                        status=preview.status if preview else None,
+                        startup=startup if args.startup_report else None,
+                        keep_frames=args.frame_ring is not None,
+                        gate=capture.MotionGate() if args.motion_gate else None)
+    except KeyboardInterrupt:
+        if PROFILER.enabled:
+            PROFILER.stop()
+
+    if args.startup_report and not startup.printed:
+        startup.print()  # nobody was recognized
+    print(f"[OK] Camera: {cap.summary()}")
 
     # Mark all users as Exit before closing
     print("Closing system...")
     tracker.mark_all_exit_on_close()
     
+    if watcher is not None:
+        watcher.stop()
+    if preview is not None:
+        preview.close()
+    if pool is not None:
+        pool.close()
+    ring.close()
     cap.release()
-    cv2.destroyAllWindows()
+    if not args.headless:
+        # Headless OpenCV builds have no GUI functions
+        cv2.destroyAllWindows()
+    if args.metrics_file:
+        metrics.write_textfile(args.metrics_file)
     print("Exiting attendance system.")
 
 if __name__ == "__main__":
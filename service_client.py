@@ -0,0 +1,66 @@
+import os
+import sys
+import json
+import socket
+import subprocess
+
+# Client for attendance_service.py. Deliberately free of cv2 imports so the
+# Tk menus stay fast to start.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.path.join(BASE_DIR, "attendance_service.sock")
+
+class ServiceUnavailable(Exception):
+    pass
+
+def send_command(cmd, socket_path=SOCKET_PATH, timeout=2.0, **params):
+    """Send one command to the service and return its reply as a dict"""
+    request = dict(params, cmd=cmd)
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall((json.dumps(request) + "\n").encode())
+            reply = sock.makefile("r").readline()
+    except OSError as e:
+        raise ServiceUnavailable(str(e))
+
+    if not reply:
+        raise ServiceUnavailable("Service closed the connection")
+    return json.loads(reply)
+
+def service_available(socket_path=SOCKET_PATH):
+    """True if a service is listening on the socket"""
+    try:
+        send_command("status", socket_path, timeout=0.5)
+        return True
+    except ServiceUnavailable:
+        return False
+
+def spawn_service():
+    """Start the service in the background if it is not already running"""
+    if service_available():
+        return None
+
+    script = os.path.join(BASE_DIR, "attendance_service.py")
+    venv_script = os.path.join(BASE_DIR, "run_with_venv.sh")
+    if os.path.exists(venv_script):
+        args = ["bash", venv_script, script]
+    else:
+        args = [sys.executable, script]
+    return subprocess.Popen(args, cwd=BASE_DIR, start_new_session=True)
+
+def main():
+    if len(sys.argv) < 2:
+        print("Usage: python service_client.py <status|start|stop|train|enroll NAME|shutdown>")
+        return
+
+    cmd = sys.argv[1]
+    params = {"name": sys.argv[2]} if cmd == "enroll" and len(sys.argv) > 2 else {}
+    try:
+        print(json.dumps(send_command(cmd, **params), indent=2))
+    except ServiceUnavailable as e:
+        print(f"[ERROR] Attendance service not available: {e}")
+
+if __name__ == "__main__":
+    main()
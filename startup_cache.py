@@ -0,0 +1,163 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+# Startup cache and timing.
+#
+# Parsing the inputs dominates startup on a Pi: trainer.yml is YAML that
+# recognizer.read() parses number by number, and the Haar cascade is 930 KB
+# of indented XML. The first start after either file changes writes a
+# pre-parsed copy to CACHE_DIR, named by the source file's content hash:
+#
+#   model-<hash>.yml     the model (trainer.yml, or trainer.bin as installed
+#                        by model_store.py) with its histograms stored as
+#                        base64 raw data; recognizer.read() decodes them
+#                        instead of parsing every number, and the result is
+#                        the same OpenCV LBPH recognizer
+#   cascade-<hash>.xml   the cascade without comments and indentation, with
+#                        floats shortened to the 9 digits float32 needs;
+#                        about half the size, so it parses in about half the time
+#
+# A changed source gets a new hash, so a stale copy is never used. The hash
+# is recomputed only when the file's size or mtime changes (remembered in
+# digests.json), so a warm start reads no more than a few stat() results.
+#
+# StartupReport records how long each startup step took, including steps
+# run in parallel threads, for --startup-report.
+
+CACHE_DIR = ".startup_cache"
+
+def _digest_memo_path(cache_dir):
+    return os.path.join(cache_dir, "digests.json")
+
+def file_digest(path, cache_dir=CACHE_DIR):
+    """Content hash of path, recomputed only if its size or mtime changed"""
+    st = os.stat(path)
+    key = os.path.abspath(path)
+    memo_path = _digest_memo_path(cache_dir)
+    try:
+        with open(memo_path, "r") as f:
+            memo = json.load(f)
+    except (OSError, ValueError):
+        memo = {}
+    entry = memo.get(key)
+    if entry and entry["size"] == st.st_size and entry["mtime_ns"] == st.st_mtime_ns:
+        return entry["digest"]
+
+    h = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    digest = h.hexdigest()
+    memo[key] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "digest": digest}
+    _write_atomic(memo_path, json.dumps(memo, indent=2).encode())
+    return digest
+
+def _write_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Unique temporary name: worker processes may fill the cache concurrently
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def _remove_stale(cache_dir, prefix, keep):
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefix) and name != keep:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+
+def minify_cascade(xml):
+    """Cascade XML without comments, indentation or excess float digits"""
+    xml = re.sub(r"<!--.*?-->", "", xml, flags=re.S)
+    xml = re.sub(r">\s+<", "><", xml)
+    xml = re.sub(r"\s+", " ", xml)
+    # 9 significant digits round-trip any float32 exactly
+    return re.sub(r"-?\d+\.\d+e[+-]\d+", lambda m: "%.9g" % float(m.group()), xml)
+
+def cached_cascade(path, cache_dir=CACHE_DIR):
+    """Path of the minified copy of a cascade file (path itself on any error)"""
+    try:
+        # Per-source prefix so caches of different cascades do not evict each other
+        prefix = "cascade-" + os.path.splitext(os.path.basename(path))[0] + "-"
+        name = f"{prefix}{file_digest(path, cache_dir)}.xml"
+        cached = os.path.join(cache_dir, name)
+        if not os.path.exists(cached):
+            with open(path, "r") as f:
+                _write_atomic(cached, minify_cascade(f.read()).encode())
+            _remove_stale(cache_dir, prefix, name)
+        return cached
+    except OSError as e:
+        print(f"[WARNING] Cascade cache unavailable ({e}); parsing {path}")
+        return path
+
+def cached_recognizer(path, cache_dir=CACHE_DIR):
+    """OpenCV LBPH recognizer for a trainer.yml or trainer.bin, read from a
+    cached base64 copy.
+
+    Returns None if the cache cannot be used; the caller then loads path
+    itself. A corrupt binary model raises model_binary.ModelFormatError.
+    """
+    import cv2
+    from compact_model import write_lbph_model
+    try:
+        # trainer.yml and trainer.bin get separate prefixes so they do not evict each other
+        prefix = "model-" + os.path.basename(path).replace(".", "-") + "-"
+        name = f"{prefix}{file_digest(path, cache_dir)}.yml"
+        cached = os.path.join(cache_dir, name)
+        if not os.path.exists(cached):
+            print(f"[OK] Building startup cache for {path} (once per model change)...")
+            if path.endswith(".bin"):
+                from model_binary import load_binary_model
+                params, histograms, labels = load_binary_model(path)
+            else:
+                from compact_model import load_model_histograms
+                params, histograms, labels = load_model_histograms(path)
+            # FileStorage picks the format from the extension, so keep .yml last
+            tmp_path = f"{cached}.{os.getpid()}.tmp.yml"
+            write_lbph_model(tmp_path, params, histograms, labels, base64=True)
+            os.replace(tmp_path, cached)
+            _remove_stale(cache_dir, prefix, name)
+        recognizer = cv2.face.LBPHFaceRecognizer_create()
+        recognizer.read(cached)
+        return recognizer
+    except (OSError, cv2.error) as e:
+        print(f"[WARNING] Model cache unavailable ({e})")
+        return None
+
+class StartupReport:
+    """Wall-clock timings of startup steps, relative to start"""
+
+    def __init__(self, start=None):
+        self.start = time.perf_counter() if start is None else start
+        self.steps = []    # (name, began, ended) in seconds since start
+        self.lock = threading.Lock()
+        self.printed = False
+
+    def mark(self, name):
+        """Record a milestone reached now"""
+        now = time.perf_counter() - self.start
+        with self.lock:
+            self.steps.append((name, now, now))
+
+    def timed(self, name, fn, *args, **kwargs):
+        """Call fn and record its duration (safe to use from threads)"""
+        began = time.perf_counter() - self.start
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self.lock:
+                self.steps.append((name, began, time.perf_counter() - self.start))
+
+    def print(self):
+        self.printed = True
+        print("Startup report (seconds since start)")
+        print(f"  {'step':<26} {'start':>7} {'end':>7} {'took':>7}")
+        for name, began, ended in sorted(self.steps, key=lambda s: (s[2], s[1])):
+            took = f"{ended - began:>7.3f}" if ended > began else f"{'':>7}"
+            print(f"  {name:<26} {began:>7.3f} {ended:>7.3f} {took}")
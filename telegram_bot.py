@@ -1,15 +1,12 @@
-try:
-    from telegram import Bot
-    TELEGRAM_AVAILABLE = True
-except ImportError:
-    TELEGRAM_AVAILABLE = False
-    Bot = None
-
-import asyncio
+import importlib.util
 import json
 import os
 import sys
 
+# python-telegram-bot and its HTTP stack are slow to import, so only check
+# here that the package is installed; it is imported when a notifier is made.
+TELEGRAM_AVAILABLE = importlib.util.find_spec("telegram") is not None
+
 def load_config():
     """Load Telegram bot configuration"""
     config_path = "telegram_config.json"
@@ -28,12 +25,14 @@ class TelegramNotifier:
     def __init__(self, token, chat_id):
         if not TELEGRAM_AVAILABLE:
             raise ImportError("Telegram module not available")
+        from telegram import Bot
         self.bot = Bot(token=token)
         self.chat_id = chat_id
         self._loop = None
     
     def _get_or_create_loop(self):
         """Get existing event loop or create a new one"""
+        import asyncio
         try:
             # Try to get the running loop
             loop = asyncio.get_running_loop()
@@ -48,51 +47,53 @@ class TelegramNotifier:
     def send_sync(self, message):
         """Send message synchronously - SIMPLIFIED VERSION"""
         try:
-            # Force use of subprocess to avoid event loop conflicts
-            import subprocess
-            import tempfile
-            
-            # Create a simple Python script to send the message
-            script = f'''
+            self.send_to(self.chat_id, message)
+            print(f"[TELEGRAM] Message sent successfully")
+        except Exception as e:
+            print(f"[TELEGRAM ERROR] Failed to send message: {e}")
+
+    def send_to(self, chat_id, message):
+        """Send message to chat_id; raises RuntimeError if the send fails"""
+        # Force use of subprocess to avoid event loop conflicts
+        import subprocess
+        import tempfile
+
+        # Create a simple Python script to send the message
+        script = f'''
 import asyncio
 from telegram import Bot
 
 async def send():
-    bot = Bot(token="{self.bot.token}")
-    await bot.send_message(chat_id="{self.chat_id}", text="""{message}""")
+    bot = Bot(token={self.bot.token!r})
+    await bot.send_message(chat_id={str(chat_id)!r}, text={message!r})
 
 asyncio.run(send())
 '''
-            
-            # Write script to temp file
-            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
-                f.write(script)
-                script_path = f.name
-            
+
+        # Write script to temp file
+        with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False) as f:
+            f.write(script)
+            script_path = f.name
+
+        try:
+            # Run the script in a subprocess with timeout
             try:
-                # Run the script in a subprocess with timeout
                 result = subprocess.run(
                     [sys.executable, script_path],
                     capture_output=True,
                     text=True,
                     timeout=10
                 )
-                
-                if result.returncode == 0:
-                    print(f"[TELEGRAM] Message sent successfully")
-                else:
-                    print(f"[TELEGRAM] Send failed: {result.stderr}")
-            finally:
-                # Clean up temp file
-                try:
-                    os.unlink(script_path)
-                except:
-                    pass
-                    
-        except Exception as e:
-            print(f"[TELEGRAM ERROR] Failed to send message: {e}")
-            import traceback
-            traceback.print_exc()
+            except subprocess.TimeoutExpired:
+                raise RuntimeError("Telegram send timed out")
+            if result.returncode != 0:
+                raise RuntimeError(f"Send failed: {result.stderr.strip()}")
+        finally:
+            # Clean up temp file
+            try:
+                os.unlink(script_path)
+            except OSError:
+                pass
 
 def send_attendance_notification(name, action, time, confidence):
     """Send attendance notification via Telegram"""
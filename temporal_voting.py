@@ -0,0 +1,171 @@
+from collections import deque
+
+# Temporal fusion of recognizer predictions per face track.
+#
+# Faces are followed across frames by box overlap. Each prediction on a
+# track is a vote weighted by how far its LBPH distance is below the
+# threshold: from 1 for a perfect match down to 0.5 just below the
+# threshold, so a clear match counts up to twice as much as a marginal one,
+# and rejected predictions vote for "Unknown". Votes are kept for a sliding
+# window of predictions. A track commits to an identity as soon as the best
+# name has enough evidence and its share of the window's votes exceeds the
+# runner-up's by the commit margin. With the defaults that is one or two
+# accepted predictions, whatever the threshold, instead of a fixed run of
+# eight identical ones, and a single stray prediction cannot flip a
+# committed track.
+
+UNKNOWN = "Unknown"
+
+def iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = min(ax + aw, bx + bw) - max(ax, bx)
+    ih = min(ay + ah, by + bh) - max(ay, by)
+    if iw <= 0 or ih <= 0:
+        return 0.0
+    inter = iw * ih
+    return inter / float(aw * ah + bw * bh - inter)
+
+class Track:
+    """One face followed across frames, with its recent votes"""
+
+    def __init__(self, track_id, box, frame_id, window):
+        self.id = track_id
+        self.box = tuple(box)
+        self.first_seen = frame_id
+        self.last_seen = frame_id
+        self.votes = deque(maxlen=window)  # (name, weight, distance)
+        self.name = None                   # committed identity
+        self.leader = None
+        self.margin = 0.0
+        self.evidence = 0.0
+
+    def scores(self):
+        """Summed vote weight per name"""
+        totals = {}
+        for name, weight, _ in self.votes:
+            totals[name] = totals.get(name, 0.0) + weight
+        return totals
+
+    def mean_distance(self, name):
+        distances = [d for n, _, d in self.votes if n == name]
+        return sum(distances) / len(distances) if distances else 0.0
+
+class TemporalVoter:
+    """Per-track confidence-weighted voting over a sliding window.
+
+    threshold      LBPH distance above which a prediction is rejected
+    window         number of predictions remembered per track
+    commit_margin  required lead of the best name's vote share over the next
+    min_evidence   summed weight the best name needs before committing
+    unknown_weight weight of a rejected prediction's vote for "Unknown"
+    """
+
+    def __init__(self, threshold=65, window=10, commit_margin=0.5, min_evidence=1.0,
+                 unknown_weight=0.25, match_iou=0.3, max_missed=30):
+        self.threshold = threshold
+        self.window = window
+        self.commit_margin = commit_margin
+        self.min_evidence = min_evidence
+        self.unknown_weight = unknown_weight
+        self.match_iou = match_iou
+        self.max_missed = max_missed
+        self.tracks = {}
+        self.next_id = 1
+
+    def weight(self, distance):
+        """Vote weight of an accepted prediction: 1 for a perfect match, 0.5 at the threshold.
+
+        The floor keeps every accepted distance able to reach min_evidence
+        within the window, whatever threshold calibration picked.
+        """
+        return 0.5 + 0.5 * max(0.0, (self.threshold - distance) / self.threshold)
+
+    def update(self, frame_id, faces):
+        """Match this frame's face boxes to tracks.
+
+        Unmatched faces start new tracks. Returns the tracks that have not
+        been seen for max_missed frames; they are dropped.
+        """
+        unmatched = set(self.tracks)
+        for box in sorted(faces, key=lambda f: f[2] * f[3], reverse=True):
+            track = self._match(box, unmatched)
+            if track is None:
+                track = Track(self.next_id, box, frame_id, self.window)
+                self.tracks[track.id] = track
+                self.next_id += 1
+            else:
+                unmatched.discard(track.id)
+                track.box = tuple(box)
+            track.last_seen = frame_id
+
+        lost = [t for t in self.tracks.values() if frame_id - t.last_seen >= self.max_missed]
+        for track in lost:
+            del self.tracks[track.id]
+        return lost
+
+    def _match(self, box, candidates):
+        best, best_iou = None, self.match_iou
+        for track_id in candidates:
+            overlap = iou(box, self.tracks[track_id].box)
+            if overlap >= best_iou:
+                best, best_iou = self.tracks[track_id], overlap
+        return best
+
+    def vote(self, box, name, distance):
+        """Add a prediction for the face at box.
+
+        Returns (track, committed) where committed is True if this vote made
+        the track commit to a (new) identity, available as track.name.
+        """
+        track = self._match(box, self.tracks)
+        if track is None:
+            return None, False
+
+        if distance < self.threshold:
+            track.votes.append((name, self.weight(distance), distance))
+        else:
+            track.votes.append((UNKNOWN, self.unknown_weight, distance))
+
+        scores = self.scores_ranked(track)
+        total = sum(s for _, s in scores) or 1.0
+        leader, lead_score = scores[0]
+        runner_up = scores[1][1] if len(scores) > 1 else 0.0
+        track.leader = leader
+        track.evidence = lead_score
+        track.margin = (lead_score - runner_up) / total
+
+        if (leader != UNKNOWN and leader != track.name
+                and lead_score >= self.min_evidence and track.margin >= self.commit_margin):
+            track.name = leader
+            return track, True
+        return track, False
+
+    def scores_ranked(self, track):
+        return sorted(track.scores().items(), key=lambda kv: kv[1], reverse=True)
+
+    def progress(self, track):
+        """How close an uncommitted track is to committing (0..1)"""
+        if track is None or track.leader in (None, UNKNOWN):
+            return 0.0
+        return min(1.0, track.evidence / self.min_evidence,
+                   max(track.margin, 0.0) / self.commit_margin)
+
+    def primary(self):
+        """The track of the largest face currently in view"""
+        if not self.tracks:
+            return None
+        return max(self.tracks.values(), key=lambda t: (t.box[2] * t.box[3], -t.id))
+
+    def forget(self, name):
+        """Clear the identity and votes of tracks committed to name"""
+        for track in self.tracks.values():
+            if track.name == name:
+                track.name = None
+                track.votes.clear()
+                track.leader = None
+                track.margin = track.evidence = 0.0
+
+    def reset(self):
+        self.tracks.clear()
@@ -0,0 +1,114 @@
+import json
+
+import pytest
+
+from presence import ManualClock, PresenceEngine
+
+# PresenceEngine and the tracker's cooldown, on a ManualClock.
+#
+#   python -m pytest -q test_presence.py
+
+def make_engine(**kwargs):
+    clock = ManualClock()
+    kwargs.setdefault("grace_seconds", 2.0)
+    kwargs.setdefault("cooldown_minutes", 0.5)
+    return PresenceEngine(clock=clock, **kwargs), clock
+
+def test_expires_exactly_at_grace():
+    engine, clock = make_engine()
+    assert engine.seen("Alice") is True
+    clock.set(1.999)
+    assert engine.expire() == []
+    assert engine.visible("Alice")
+    clock.set(2.0)
+    assert engine.expire() == ["Alice"]
+    assert not engine.visible("Alice")
+    assert engine.next_expiry() is None
+
+def test_seen_again_repushes_stale_entry():
+    engine, clock = make_engine()
+    engine.seen("Alice")
+    clock.set(1.5)
+    assert engine.seen("Alice") is False      # same visit, no new heap entry
+    assert len(engine._expiries) == 1
+    clock.set(2.0)
+    # The entry for 2.0 is stale: pushed back to 1.5 + 2.0
+    assert engine.expire() == []
+    assert engine.next_expiry() == 3.5
+    assert len(engine._expiries) == 1
+    clock.set(3.5)
+    assert engine.expire() == ["Alice"]
+
+def test_new_visit_after_expiry():
+    engine, clock = make_engine()
+    engine.seen("Alice")
+    clock.set(2.0)
+    engine.expire()
+    clock.set(5.0)
+    assert engine.seen("Alice") is True
+    assert engine.since["Alice"] == 5.0
+
+def test_per_person_overrides():
+    people = {"Bob": {"grace_seconds": 5.0, "cooldown_minutes": 2}}
+    engine, clock = make_engine(people=people)
+    engine.seen("Alice")
+    engine.seen("Bob")
+    clock.set(2.0)
+    assert engine.expire() == ["Alice"]
+    clock.set(4.999)
+    assert engine.expire() == []
+    clock.set(5.0)
+    assert engine.expire() == ["Bob"]
+
+    assert engine.cooldown("Alice") == 30.0
+    assert engine.cooldown("Bob") == 120.0
+    engine.marked("Alice")
+    engine.marked("Bob")
+    clock.advance(30.0)
+    assert engine.may_mark("Alice")
+    assert not engine.may_mark("Bob")
+
+def test_overrides_from_config(tmp_path):
+    path = tmp_path / "attendance_config.json"
+    path.write_text(json.dumps({"presence": {
+        "grace_seconds": 3.0,
+        "people": {"Bob": {"cooldown_minutes": 0}}}}))
+    engine = PresenceEngine.from_config(str(path), clock=ManualClock())
+    assert engine.grace("Alice") == 3.0
+    assert engine.cooldown("Alice") == 30.0    # default cooldown_minutes
+    assert engine.cooldown("Bob") == 0.0
+    engine = PresenceEngine.from_config(str(path), clock=ManualClock(), grace_seconds=1.0)
+    assert engine.grace("Alice") == 1.0        # keyword arguments win
+
+def test_cooldown_boundary():
+    engine, clock = make_engine()
+    assert engine.may_mark("Alice")
+    assert engine.cooldown_left("Alice") == 0.0
+    engine.marked("Alice")
+    clock.set(29.5)
+    assert engine.cooldown_left("Alice") == pytest.approx(0.5)
+    assert not engine.may_mark("Alice")
+    clock.set(30.0)
+    assert engine.cooldown_left("Alice") == 0.0
+    assert engine.may_mark("Alice")
+
+def test_clock_cannot_go_back():
+    clock = ManualClock(10.0)
+    with pytest.raises(ValueError):
+        clock.set(9.0)
+
+def test_tracker_refuses_marks_during_cooldown(tmp_path, monkeypatch):
+    pytest.importorskip("cv2")    # recognize_attendance needs OpenCV
+    monkeypatch.chdir(tmp_path)
+    from recognize_attendance import AttendanceTracker
+    clock = ManualClock()
+    tracker = AttendanceTracker(enable_telegram=False, cooldown_minutes=1, clock=clock)
+    assert tracker.mark_attendance("Alice", 40.0) == "Entry"
+    clock.set(59.0)
+    assert tracker.mark_attendance("Alice", 40.0) is None
+    assert tracker.get_status("Alice") == "Entry"
+    clock.set(60.0)
+    assert tracker.mark_attendance("Alice", 40.0) == "Exit"
+
+    lines = next((tmp_path / "attendance").iterdir()).read_text().splitlines()
+    assert [line.split(",")[3] for line in lines[1:]] == ["Entry", "Exit"]
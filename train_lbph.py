@@ -1,7 +1,22 @@
 import os
+import sys
 import cv2
 import numpy as np
 import json
+from config_file import CONFIG_PATH
+
+# LBPH parameters and the recognition distance threshold. calibrate.py
+# measures better values for a dataset and stores them in the "recognition"
+# section of attendance_config.json.
+RECOGNITION_DEFAULTS = {"radius": 2, "neighbors": 8, "grid_x": 8, "grid_y": 8, "threshold": 65.0}
+
+def load_recognition_config(path=CONFIG_PATH):
+    """RECOGNITION_DEFAULTS updated from attendance_config.json"""
+    config = dict(RECOGNITION_DEFAULTS)
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            config.update(json.load(f).get("recognition", {}))
+    return config
 
 def augment_image(img):
     """Enhanced augmentation for better accuracy"""
@@ -22,7 +37,14 @@ def augment_image(img):
     
     return augmented
 
-def get_images_and_labels(dataset_dir="dataset"):
+class TrainingCancelled(Exception):
+    pass
+
+def _report(progress, stage, **info):
+    if progress is not None:
+        progress(stage, **info)
+
+def get_images_and_labels(dataset_dir="dataset", progress=None):
     image_paths = [os.path.join(dataset_dir, f) for f in os.listdir(dataset_dir)
                    if f.lower().endswith((".jpg", ".png", ".jpeg"))]
 
@@ -31,7 +53,10 @@ def get_images_and_labels(dataset_dir="dataset"):
     label_to_id = {}
     next_id = 0
 
-    for path in image_paths:
+    for n, path in enumerate(image_paths, 1):
+        if n % 50 == 0:
+            _report(progress, "loaded", done=n, total=len(image_paths))
+
         # Example filename: name_1.jpg
         filename = os.path.basename(path)
         if "_" not in filename:
@@ -55,43 +80,114 @@ def get_images_and_labels(dataset_dir="dataset"):
             face_samples.append(aug_img)
             ids.append(id_)
 
+    _report(progress, "loaded", done=len(image_paths), total=len(image_paths))
+    _report(progress, "augmented", samples=len(face_samples))
     return face_samples, np.array(ids), label_to_id
 
-def main():
-    dataset_dir = "dataset"
-    if not os.path.exists(dataset_dir):
-        print("Dataset folder not found. Run collect_faces.py first.")
-        return
-
-    faces, ids, label_to_id = get_images_and_labels(dataset_dir)
+def _tmp_path(path):
+    """Temporary name in the same directory, keeping the extension for FileStorage"""
+    root, ext = os.path.splitext(path)
+    return f"{root}.tmp{ext}"
+
+def train_model(dataset_dir="dataset", model_path="trainer.yml", labels_path="labels.json",
+                progress=None, cancel=None, chunk_size=300):
+    """Train the LBPH model and write it atomically.
+
+    progress(stage, **info) is called as images are loaded and augmented,
+    as histograms are computed (in chunks via recognizer.update) and when
+    the model is written. cancel() is polled between chunks; returning True
+    raises TrainingCancelled and leaves the existing model untouched.
+    Returns (number of samples, number of people).
+    """
+    faces, ids, label_to_id = get_images_and_labels(dataset_dir, progress)
     if len(faces) == 0:
-        print("No faces found in dataset. Collect some first.")
-        return
+        return 0, 0
 
-    print(f"Found {len(faces)} face images belonging to {len(label_to_id)} people.")
-    
-    # Optimized LBPH for Raspberry Pi
+    # Optimized LBPH for Raspberry Pi (radius 2, 8 neighbors, 8x8 grid unless calibrated)
+    config = load_recognition_config()
     recognizer = cv2.face.LBPHFaceRecognizer_create(
-        radius=2,        # Better accuracy
-        neighbors=8,     # Standard LBP
-        grid_x=8,
-        grid_y=8
+        radius=int(config["radius"]),
+        neighbors=int(config["neighbors"]),
+        grid_x=int(config["grid_x"]),
+        grid_y=int(config["grid_y"])
     )
-    
-    print("Training... (this may take 1-2 minutes)")
-    recognizer.train(faces, ids)
 
-    # Save model
-    recognizer.write("trainer.yml")
-    print("Saved trained model to trainer.yml")
+    # train() on the first chunk, update() appends the rest
+    for start in range(0, len(faces), chunk_size):
+        if cancel is not None and cancel():
+            raise TrainingCancelled()
+        chunk = slice(start, start + chunk_size)
+        if start == 0:
+            recognizer.train(faces[chunk], ids[chunk])
+        else:
+            recognizer.update(faces[chunk], ids[chunk])
+        _report(progress, "histograms", done=min(start + chunk_size, len(faces)), total=len(faces))
+
+    if cancel is not None and cancel():
+        raise TrainingCancelled()
+
+    # Write both files next to the originals, then swap them in
+    tmp_model = _tmp_path(model_path)
+    tmp_labels = _tmp_path(labels_path)
+    recognizer.write(tmp_model)
 
     # Save label mapping (id -> name)
     id_to_label = {str(v): k for k, v in label_to_id.items()}
-    with open("labels.json", "w") as f:
+    with open(tmp_labels, "w") as f:
         json.dump(id_to_label, f)
 
+    os.replace(tmp_model, model_path)
+    os.replace(tmp_labels, labels_path)
+    _report(progress, "written", path=model_path)
+    return len(faces), len(label_to_id)
+
+def print_progress(stage, **info):
+    if stage == "histograms":
+        print(f"Computed histograms: {info['done']}/{info['total']}")
+    elif stage == "augmented":
+        print(f"Augmented into {info['samples']} samples")
+
+def run_training(dataset_dir="dataset", compact=None):
+    """Train trainer.yml/labels.json from dataset_dir, then compact and publish.
+
+    compact is the number of prototypes per person for trainer_compact.yml
+    (None removes a stale compact model). Returns (samples, people).
+    """
+    print("Training... (this may take 1-2 minutes)")
+    samples, people = train_model(dataset_dir, "trainer.yml", "labels.json", print_progress)
+    if samples == 0:
+        print("No faces found in dataset. Collect some first.")
+        return samples, people
+
+    print(f"Trained on {samples} face images belonging to {people} people.")
+    print("Saved trained model to trainer.yml")
     print("Saved labels to labels.json")
+
+    # Optional compaction: keeps K prototypes per person
+    if compact is not None:
+        from compact_model import compact_model, COMPACT_MODEL_PATH
+        compact_model("trainer.yml", COMPACT_MODEL_PATH, compact)
+    elif os.path.exists("trainer_compact.yml"):
+        # A stale compact model would shadow the new one
+        os.remove("trainer_compact.yml")
+
+    # Publish for the kiosks once a model store has been set up
+    from model_store import STORE_DIR, publish
+    if os.path.isdir(STORE_DIR):
+        publish(STORE_DIR)
+
     print("Training complete.")
+    return samples, people
+
+def main():
+    dataset_dir = "dataset"
+    if not os.path.exists(dataset_dir):
+        print("Dataset folder not found. Run collect_faces.py first.")
+        return
+
+    # --compact K keeps K prototypes per person
+    compact = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[1] == "--compact" else None
+    run_training(dataset_dir, compact)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,171 @@
+import os
+import time
+import multiprocessing as mp
+
+# Runs train_lbph.train_model() in a separate, low-priority process and
+# streams its progress back over a pipe. The model files are replaced
+# atomically at the end, so anything using the old model keeps working
+# until then. This module does not import cv2 so the Tk menu can use it.
+#
+# "spawn" keeps the worker independent of the threads and GUI state of the
+# process that starts it (the Tk menu or the attendance service).
+#
+# Only one thread may read a job's pipe: the one calling poll() or wait().
+# cancel() may be called from any thread; it only sets the cancel event and
+# a deadline, and that reading thread terminates the worker once the
+# deadline has passed.
+_mp = mp.get_context("spawn")
+
+# Fraction of the progress bar covered by each stage
+STAGE_SPAN = {
+    "loaded": (0.0, 0.3),
+    "augmented": (0.3, 0.3),
+    "histograms": (0.3, 0.95),
+    "written": (1.0, 1.0),
+    "done": (1.0, 1.0),
+}
+
+def _worker(conn, cancel_event, dataset_dir, model_path, labels_path, niceness):
+    try:
+        os.nice(niceness)
+    except OSError:
+        pass
+
+    def progress(stage, **info):
+        conn.send(dict(info, stage=stage))
+
+    try:
+        from train_lbph import train_model, TrainingCancelled
+    except ImportError as e:
+        conn.send({"stage": "error", "error": str(e)})
+        conn.close()
+        return
+
+    try:
+        samples, people = train_model(dataset_dir, model_path, labels_path,
+                                      progress=progress, cancel=cancel_event.is_set)
+        if samples == 0:
+            conn.send({"stage": "error", "error": "No faces found in dataset"})
+        else:
+            conn.send({"stage": "done", "samples": samples, "people": people})
+    except TrainingCancelled:
+        conn.send({"stage": "cancelled"})
+    except Exception as e:
+        conn.send({"stage": "error", "error": str(e)})
+    finally:
+        conn.close()
+
+class TrainingJob:
+    """A training run in a background process"""
+
+    def __init__(self, dataset_dir="dataset", model_path="trainer.yml",
+                 labels_path="labels.json", niceness=10):
+        self.args = (dataset_dir, model_path, labels_path, niceness)
+        self.process = None
+        self.conn = None
+        self.cancel_event = None
+        self.cancel_deadline = None
+        self.last_event = None
+
+    def start(self):
+        self.conn, child_conn = _mp.Pipe(duplex=False)
+        self.cancel_event = _mp.Event()
+        self.process = _mp.Process(target=_worker, args=(child_conn, self.cancel_event) + self.args,
+                                  daemon=True)
+        self.process.start()
+        child_conn.close()
+        return self
+
+    def poll(self):
+        """Return progress events received since the last call"""
+        events = []
+        try:
+            while self.conn.poll():
+                events.append(self.conn.recv())
+        except (EOFError, OSError):
+            pass
+
+        if events:
+            self.last_event = events[-1]
+        if not self.finished():
+            if (self.cancel_deadline is not None and time.monotonic() >= self.cancel_deadline
+                    and self.process.is_alive()):
+                # The worker ignored the cancel event
+                self.process.terminate()
+                self.process.join()
+            if not events and not self.process.is_alive():
+                if self.cancel_deadline is not None:
+                    self.last_event = {"stage": "cancelled"}
+                else:
+                    # Worker died without reporting (killed, crashed in native code)
+                    self.last_event = {"stage": "error",
+                                       "error": f"exit code {self.process.exitcode}"}
+                events.append(self.last_event)
+        return events
+
+    def finished(self):
+        return self.last_event is not None and self.last_event["stage"] in ("done", "error", "cancelled")
+
+    def cancel(self, timeout=5.0):
+        """Ask the worker to stop; it is terminated if still running after timeout.
+
+        Returns at once. The thread reading the job (poll() or wait())
+        sees the outcome.
+        """
+        if self.process is None or self.cancel_deadline is not None:
+            return
+        self.cancel_deadline = time.monotonic() + timeout
+        self.cancel_event.set()
+
+    def wait(self, callback=None, interval=0.2):
+        """Block until the job finishes, passing each event to callback"""
+        while not self.finished():
+            if self.conn.poll(interval):
+                for event in self.poll():
+                    if callback is not None:
+                        callback(event)
+            elif not self.process.is_alive():
+                for event in self.poll():
+                    if callback is not None:
+                        callback(event)
+        self.process.join()
+        return self.last_event
+
+def describe_progress(event):
+    """Return (text, fraction complete) for a progress event"""
+    if event is None:
+        return "Starting training...", 0.0
+
+    stage = event["stage"]
+    start, end = STAGE_SPAN.get(stage, (0.0, 0.0))
+    fraction = start
+    if "total" in event and event["total"]:
+        fraction = start + (end - start) * event["done"] / event["total"]
+
+    if stage == "loaded":
+        text = f"Loading images: {event['done']}/{event['total']}"
+    elif stage == "augmented":
+        text = f"Augmented into {event['samples']} samples"
+    elif stage == "histograms":
+        text = f"Computing histograms: {event['done']}/{event['total']}"
+    elif stage == "written":
+        text = "Model written"
+    elif stage == "done":
+        text = f"Training complete: {event['samples']} samples, {event['people']} people"
+    elif stage == "cancelled":
+        text = "Training cancelled"
+    else:
+        text = f"Training failed: {event.get('error')}"
+    return text, fraction
+
+def main():
+    job = TrainingJob().start()
+    try:
+        last = job.wait(lambda e: print(describe_progress(e)[0]))
+    except KeyboardInterrupt:
+        job.cancel()
+        last = job.wait()
+    print(describe_progress(last)[0])
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+import metrics
+from config_file import CONFIG_PATH
+
+# Detection zones: the parts of a camera's view where faces are looked for.
+#
+# Zones are rectangles or polygons in frame pixels, per camera, in the
+# "zones" section of attendance_config.json. The key is the camera index or
+# video path as given to --source; "default" applies to every other camera:
+#
+#   "zones": {
+#     "0": [{"name": "door", "rect": [200, 60, 260, 360]}],
+#     "default": [{"polygon": [[100, 0], [540, 0], [600, 480], [40, 480]]}]
+#   }
+#
+# ZonedDetector wraps any detector from face_detectors.py and keeps its
+# detect(gray) -> boxes contract. The detector only sees the bounding
+# rectangle of all zones (a view into the frame, nothing is copied), so its
+# cost scales with that area. Boxes come back in frame coordinates, and a
+# face whose center lies outside every zone is dropped before it can reach
+# recognition. Zones are clipped to the frame.
+#
+#   python zones.py calibrate [--source 0]
+#
+# shows the zones, the detection crop and which faces are kept (green) or
+# dropped (red) on the live picture, with the detection time on the crop
+# and on the full frame. --snapshot PATH writes one such frame and exits,
+# for kiosks without a screen.
+
+ZONE_DISCARDED = metrics.counter("attendance_zone_discarded_total",
+                                 "Detected faces dropped because their center was outside every zone")
+
+class Zone:
+    """A polygon in frame pixels"""
+
+    def __init__(self, points, name=""):
+        if len(points) < 3:
+            raise ValueError(f"Zone {name or points!r} needs at least 3 points")
+        self.points = [(float(x), float(y)) for x, y in points]
+        self.name = name
+
+    @classmethod
+    def from_config(cls, entry):
+        """Zone from {"rect": [x, y, w, h]} or {"polygon": [[x, y], ...]}"""
+        name = entry.get("name", "")
+        if "rect" in entry:
+            x, y, w, h = entry["rect"]
+            return cls([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], name)
+        if "polygon" in entry:
+            return cls(entry["polygon"], name)
+        raise ValueError(f"Zone {entry!r} needs a 'rect' or a 'polygon'")
+
+    def bounds(self):
+        """(x0, y0, x1, y1) of the zone"""
+        xs = [x for x, _ in self.points]
+        ys = [y for _, y in self.points]
+        return min(xs), min(ys), max(xs), max(ys)
+
+    def contains(self, x, y):
+        """Point-in-polygon by ray casting"""
+        inside = False
+        points = self.points
+        x1, y1 = points[-1]
+        for x2, y2 in points:
+            if (y1 > y) != (y2 > y) and x < x1 + (y - y1) * (x2 - x1) / (y2 - y1):
+                inside = not inside
+            x1, y1 = x2, y2
+        return inside
+
+def load_zones(camera, path=CONFIG_PATH):
+    """Zones of a camera (its own entry, else "default"; [] if none).
+
+    Raises ValueError for a malformed zone.
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, "r") as f:
+        config = json.load(f).get("zones", {})
+    entries = config.get(str(camera), config.get("default", []))
+    return [Zone.from_config(entry) for entry in entries]
+
+class ZonedDetector:
+    """A face detector restricted to zones; same detect(gray) contract"""
+
+    def __init__(self, detector, zones):
+        self.detector = detector
+        self.zones = list(zones)
+        self.name = detector.name
+        self.path = detector.path
+        self._crop = None   # (frame size, crop rectangle)
+
+    def crop(self, width, height):
+        """(x0, y0, x1, y1) of the detection crop for a frame size"""
+        if self._crop is None or self._crop[0] != (width, height):
+            bounds = [z.bounds() for z in self.zones]
+            x0 = max(0, int(min(b[0] for b in bounds)))
+            y0 = max(0, int(min(b[1] for b in bounds)))
+            x1 = min(width, int(max(b[2] for b in bounds)) + 1)
+            y1 = min(height, int(max(b[3] for b in bounds)) + 1)
+            self._crop = ((width, height), (x0, y0, max(x0, x1), max(y0, y1)))
+        return self._crop[1]
+
+    def area_share(self, width, height):
+        x0, y0, x1, y1 = self.crop(width, height)
+        return (x1 - x0) * (y1 - y0) / float(width * height)
+
+    def inside(self, box):
+        x, y, w, h = box
+        cx, cy = x + w / 2.0, y + h / 2.0
+        return any(zone.contains(cx, cy) for zone in self.zones)
+
+    def detect_all(self, gray):
+        """(kept, dropped) boxes in frame coordinates"""
+        h, w = gray.shape[:2]
+        x0, y0, x1, y1 = self.crop(w, h)
+        if x1 <= x0 or y1 <= y0:
+            return [], []
+        kept, dropped = [], []
+        for x, y, bw, bh in self.detector.detect(gray[y0:y1, x0:x1]):
+            box = (x + x0, y + y0, bw, bh)
+            (kept if self.inside(box) else dropped).append(box)
+        if dropped:
+            ZONE_DISCARDED.inc(len(dropped))
+        return kept, dropped
+
+    def detect(self, gray):
+        return self.detect_all(gray)[0]
+
+def apply_zones(detector, camera, path=CONFIG_PATH):
+    """detector wrapped in the camera's zones, or unchanged if it has none"""
+    if detector is None:
+        return None
+    try:
+        zones = load_zones(camera, path)
+    except (ValueError, TypeError, KeyError) as e:
+        print(f"[WARNING] Ignoring detection zones: {e}")
+        return detector
+    if not zones:
+        return detector
+    names = ", ".join(z.name or f"#{i + 1}" for i, z in enumerate(zones))
+    print(f"[OK] Detection zones for camera {camera}: {names}")
+    return ZonedDetector(detector, zones)
+
+def draw_zones(canvas, detector, kept=(), dropped=()):
+    """Zones (yellow), detection crop (blue) and kept/dropped faces on canvas"""
+    import cv2
+    import numpy as np
+    h, w = canvas.shape[:2]
+    for zone in detector.zones:
+        points = np.array(zone.points, np.int32).reshape(-1, 1, 2)
+        cv2.polylines(canvas, [points], True, (0, 255, 255), 2)
+        if zone.name:
+            x, y = points[0][0]
+            cv2.putText(canvas, zone.name, (int(x) + 5, int(y) + 20),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+    x0, y0, x1, y1 = detector.crop(w, h)
+    cv2.rectangle(canvas, (x0, y0), (x1 - 1, y1 - 1), (255, 128, 0), 1)
+    for boxes, color in ((kept, (0, 255, 0)), (dropped, (0, 0, 255))):
+        for x, y, bw, bh in boxes:
+            cv2.rectangle(canvas, (x, y), (x + bw, y + bh), color, 2)
+            cv2.circle(canvas, (x + bw // 2, y + bh // 2), 3, color, -1)
+    return canvas
+
+def calibrate(source="0", camera=None, backend=None, model=None, snapshot=None):
+    """Live overlay of the zones; with snapshot, write one frame there and return"""
+    import cv2
+    from face_detectors import load_detector
+    from capture import open_camera
+
+    camera = source if camera is None else camera
+    detector = load_detector(backend, model)
+    if detector is None:
+        return False
+    zoned = apply_zones(detector, camera)
+    if zoned is detector:
+        print(f"[ERROR] No zones for camera {camera} in {CONFIG_PATH} (see zones.py)")
+        return False
+    cap = open_camera(source)
+    if cap is None:
+        print(f"[ERROR] Could not open {source}")
+        return False
+
+    window = "Detection zones"
+    full_ms = zoned_ms = 0.0
+    try:
+        while cap.grab():
+            gray, frame = cap.gray(), cap.bgr()
+            if gray is None or frame is None:
+                break
+            start = time.perf_counter()
+            detector.detect(gray)
+            full_ms = 0.9 * full_ms + 0.1 * (time.perf_counter() - start) * 1000
+            start = time.perf_counter()
+            kept, dropped = zoned.detect_all(gray)
+            zoned_ms = 0.9 * zoned_ms + 0.1 * (time.perf_counter() - start) * 1000
+
+            canvas = draw_zones(frame.copy(), zoned, kept, dropped)
+            h, w = canvas.shape[:2]
+            cv2.putText(canvas, f"crop {zoned.area_share(w, h):.0%} of frame  "
+                                f"detect {zoned_ms:.1f} ms (full frame {full_ms:.1f} ms)",
+                        (10, h - 15), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 2)
+            if snapshot:
+                cv2.imwrite(snapshot, canvas)
+                print(f"[OK] Saved {snapshot}: {len(kept)} faces kept, {len(dropped)} dropped")
+                return True
+            cv2.imshow(window, canvas)
+            key = cv2.waitKey(1) & 0xFF
+            if key == ord('q'):
+                break
+            if key == ord('s'):
+                cv2.imwrite("zones_calibration.jpg", canvas)
+                print("[OK] Saved zones_calibration.jpg")
+    finally:
+        cap.release()
+        if not snapshot:
+            cv2.destroyAllWindows()
+    print(f"Detection: {zoned_ms:.1f} ms on the zones, {full_ms:.1f} ms on the full frame")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(description="Detection zones")
+    sub = parser.add_subparsers(dest="command", required=True)
+    cal = sub.add_parser("calibrate", help="show the zones and detections on the live picture")
+    cal.add_argument("--source", default="0", help="camera index or video path")
+    cal.add_argument("--camera", help="zones entry to use (default: --source)")
+    cal.add_argument("--detector", help="detector backend (default: attendance_config.json)")
+    cal.add_argument("--detector-model", metavar="PATH")
+    cal.add_argument("--snapshot", metavar="PATH",
+                     help="write one annotated frame to PATH instead of opening a window")
+    args = parser.parse_args()
+
+    if args.command == "calibrate":
+        if not calibrate(args.source, args.camera, args.detector, args.detector_model,
+                         args.snapshot):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()